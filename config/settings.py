@@ -32,6 +32,7 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "inventory.middleware.AuditBufferMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -63,6 +64,8 @@ DATABASES = {
         conn_max_age=600,
     )
 }
+if DATABASES["default"]["ENGINE"] == "django.db.backends.postgresql":
+    INSTALLED_APPS.append("django.contrib.postgres")
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -110,6 +113,34 @@ REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
+    "DEFAULT_PAGINATION_CLASS": "inventory.pagination.KeysetPagination",
+    "PAGE_SIZE": int(os.getenv("API_PAGE_SIZE", "100")),
 }
 
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.getenv("CACHE_LOCATION", "pharm-tracking"),
+    }
+}
+PROCESS_LOCAL_CACHE_BACKENDS = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+CACHE_IS_SHARED = CACHES["default"]["BACKEND"] not in PROCESS_LOCAL_CACHE_BACKENDS
+# Memberships revoked by another process only reach a process-local cache when the entry expires.
+OFFICE_ACCESS_CACHE_TIMEOUT = int(os.getenv("OFFICE_ACCESS_CACHE_TIMEOUT", "86400" if CACHE_IS_SHARED else "60"))
+REPORT_CACHE_TIMEOUT = int(os.getenv("REPORT_CACHE_TIMEOUT", "900"))
+
 EXPIRY_DAYS_DEFAULT = int(os.getenv("EXPIRY_DAYS_DEFAULT", "60"))
+FORECAST_HORIZON_DAYS = int(os.getenv("FORECAST_HORIZON_DAYS", "90"))
+FORECAST_LOOKBACK_DAYS = int(os.getenv("FORECAST_LOOKBACK_DAYS", "90"))
+MEDICATION_SEARCH_SIMILARITY = float(os.getenv("MEDICATION_SEARCH_SIMILARITY", "0.5"))
+
+AUDIT_BUFFER_SIZE = int(os.getenv("AUDIT_BUFFER_SIZE", "100"))
+AUDIT_BUFFER_MAX_AGE = float(os.getenv("AUDIT_BUFFER_MAX_AGE", "2"))
+AUDIT_BACKGROUND_WRITER = os.getenv("AUDIT_BACKGROUND_WRITER", "false").lower() == "true"
+AUDIT_LOG_DELTAS = os.getenv("AUDIT_LOG_DELTAS", "true").lower() == "true"
+AUDIT_LOG_FULL_SNAPSHOT_EVERY = int(os.getenv("AUDIT_LOG_FULL_SNAPSHOT_EVERY", "10"))
+AUDIT_LOG_RETENTION_DAYS = int(os.getenv("AUDIT_LOG_RETENTION_DAYS", "365"))
+AUDIT_LOG_ARCHIVE_DIR = os.getenv("AUDIT_LOG_ARCHIVE_DIR", str(BASE_DIR / "audit_archive"))
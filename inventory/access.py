@@ -0,0 +1,79 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404
+from django.utils.functional import cached_property
+
+from . import caching
+from .models import Office
+from .services import get_user_offices
+
+CACHE_NAME = caching.track("office_access")
+GLOBAL_VERSION_KEY = "office-access:version"
+
+
+def user_version_key(user_id):
+    return f"office-access:version:{user_id}"
+
+
+def cache_key(user_id):
+    global_version, user_version = caching.get_versions([GLOBAL_VERSION_KEY, user_version_key(user_id)])
+    return f"office-access:{user_id}:{global_version}:{user_version}"
+
+
+def invalidate_office_access(user_id=None):
+    caching.bump_versions([user_version_key(user_id)] if user_id is not None else [GLOBAL_VERSION_KEY])
+
+
+class OfficeAccess:
+    def __init__(self, user):
+        self.user = user
+        self.is_admin = user.is_authenticated and user.role == user.Role.ADMIN
+
+    @cached_property
+    def office_ids(self):
+        if not self.user.is_authenticated:
+            return frozenset()
+        key = cache_key(self.user.pk)
+        office_ids = cache.get(key)
+        if office_ids is not None:
+            caching.record_hit(CACHE_NAME)
+            return office_ids
+        caching.record_miss(CACHE_NAME)
+        office_ids = frozenset(get_user_offices(self.user).values_list("pk", flat=True))
+        cache.set(key, office_ids, settings.OFFICE_ACCESS_CACHE_TIMEOUT)
+        return office_ids
+
+    @property
+    def scope(self):
+        if self.is_admin:
+            return self.offices()
+        return sorted(self.office_ids)
+
+    def offices(self):
+        if self.is_admin:
+            return Office.objects.filter(is_active=True)
+        return Office.objects.filter(pk__in=self.office_ids)
+
+    def can_access(self, office):
+        if self.is_admin and isinstance(office, Office):
+            return office.is_active
+        try:
+            return int(getattr(office, "pk", office)) in self.office_ids
+        except (TypeError, ValueError):
+            return False
+
+    def get_office(self, pk):
+        if not (self.is_admin or self.can_access(pk)):
+            raise Http404("Office not found")
+        try:
+            return self.offices().get(pk=pk)
+        except (Office.DoesNotExist, TypeError, ValueError) as exc:
+            raise Http404("Office not found") from exc
+
+
+def get_access(request):
+    request = getattr(request, "_request", request)
+    access = getattr(request, "_office_access", None)
+    if access is None or access.user is not request.user:
+        access = request._office_access = OfficeAccess(request.user)
+    return access
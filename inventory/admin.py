@@ -1,7 +1,9 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 
-from .models import AuditLog, Lot, Medication, Office, OfficeMedication, OfficeMembership, User
+from .forms import MedicationForm
+from .models import AuditLog, DigestRun, Lot, Medication, Office, OfficeMedication, OfficeMembership, User
+from .search import ndc_prefix
 
 
 @admin.register(User)
@@ -32,16 +34,21 @@ class OfficeMembershipAdmin(admin.ModelAdmin):
 
 @admin.register(Medication)
 class MedicationAdmin(admin.ModelAdmin):
-    list_display = ("generic_name", "ndc", "is_active")
-    search_fields = ("generic_name", "ndc")
+    form = MedicationForm
+    list_display = ("generic_name", "strength", "ndc", "is_active")
+    search_fields = ("^generic_name", "^strength", "^ndc_normalized")
     list_filter = ("is_active",)
 
+    def get_search_results(self, request, queryset, search_term):
+        return super().get_search_results(request, queryset, ndc_prefix(search_term.strip()) or search_term)
+
 
 @admin.register(OfficeMedication)
 class OfficeMedicationAdmin(admin.ModelAdmin):
     list_display = ("office", "medication", "reorder_threshold", "is_active")
     search_fields = ("office__name", "medication__generic_name")
     list_filter = ("office", "is_active")
+    autocomplete_fields = ("office", "medication")
 
 
 @admin.register(Lot)
@@ -57,3 +64,9 @@ class AuditLogAdmin(admin.ModelAdmin):
     search_fields = ("entity_type", "entity_id", "actor__email")
     list_filter = ("action", "created_at")
     readonly_fields = ("snapshot_json",)
+
+
+@admin.register(DigestRun)
+class DigestRunAdmin(admin.ModelAdmin):
+    list_display = ("as_of", "days", "is_incremental", "sent", "failed", "started_at", "finished_at")
+    list_filter = ("is_incremental", "days")
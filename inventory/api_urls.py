@@ -11,7 +11,19 @@ urlpatterns = [
     path("", include(router.urls)),
     path("offices/<int:pk>/stock/", api_views.OfficeMedicationListView.as_view(), name="api-office-stock"),
     path("offices/<int:pk>/lots/", api_views.OfficeLotListView.as_view(), name="api-office-lots"),
+    path("office-medications/<int:pk>/dispense/", api_views.DispenseView.as_view(), name="api-dispense"),
+    path("recalls/", api_views.RecallSearchView.as_view(), name="api-recalls"),
+    path("recalls/quarantine/", api_views.RecallQuarantineView.as_view(), name="api-recall-quarantine"),
     path("reports/expiring/", api_views.ExpiringReportView.as_view(), name="api-report-expiring"),
     path("reports/expired/", api_views.ExpiredReportView.as_view(), name="api-report-expired"),
     path("reports/inventory/", api_views.InventoryReportView.as_view(), name="api-report-inventory"),
+    path("reports/reorder/", api_views.ReorderReportView.as_view(), name="api-report-reorder"),
+    path("reports/forecast/", api_views.ForecastReportView.as_view(), name="api-report-forecast"),
+    path("reports/transfers/", api_views.TransferReportView.as_view(), name="api-report-transfers"),
+    path("metrics/cache/", api_views.CacheStatsView.as_view(), name="api-cache-stats"),
+    path(
+        "audit/<str:entity_type>/<str:entity_id>/",
+        api_views.EntityHistoryView.as_view(),
+        name="api-entity-history",
+    ),
 ]
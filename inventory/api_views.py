@@ -1,95 +1,310 @@
-from rest_framework import generics, permissions, viewsets
+from django.conf import settings
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework import generics, permissions, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
-from .models import Lot, Medication, Office, OfficeMedication
+from . import caching
+from .access import get_access
+from .dispensing import InsufficientStock, dispense
+from .forecasting import forecast_expiry_waste
+from .models import AuditLog, Lot, Medication, Office, OfficeMedication
+from .recalls import quarantine_lots, recall_rows, recalled_lots
+from .renderers import FastJSONRenderer
 from .serializers import (
+    AuditLogSerializer,
+    DispenseSerializer,
     LotSerializer,
     MedicationSerializer,
     OfficeMedicationSerializer,
     OfficeSerializer,
+    RecallSerializer,
     ReportLotSerializer,
 )
-from .services import get_user_offices, inventory_summary, lots_expired, lots_expiring_within
+from .search import search_medications
+from .services import (
+    MAX_BUCKET_DAYS,
+    expiry_buckets,
+    expiry_histogram,
+    inventory_summary,
+    lots_expired,
+    lots_expiring_within,
+    reorder_report,
+)
+from .transfers import recommend_transfers
+
+
+class IsAdminRole(permissions.BasePermission):
+    def has_permission(self, request, view):
+        return request.user.is_authenticated and request.user.role == request.user.Role.ADMIN
+
+
+class ConditionalReportMixin:
+    report_name = None
+
+    def conditional_response(self, office_ids, build):
+        url = self.request.build_absolute_uri()
+        validator, last_modified = caching.report_validators(self.report_name, office_ids, url=url)
+        etag = quote_etag(validator)
+        response = get_conditional_response(self.request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = build(caching.report_key(self.report_name, office_ids, url=url, etag=validator))
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(last_modified)
+        return response
+
+
+class ValuesRowsListMixin:
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+
+    def row_data(self, queryset):
+        serializer_class = self.get_serializer_class()
+        queryset = serializer_class.values(queryset)
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return serializer_class.rows(queryset)
+        return self.get_paginated_response(serializer_class.rows(page)).data
+
+    def list(self, request, *args, **kwargs):
+        return Response(self.row_data(self.filter_queryset(self.get_queryset())))
+
+
+class PaginatedReportMixin(ValuesRowsListMixin, ConditionalReportMixin):
+    def paginated_response(self, queryset, office_ids):
+        def build(key):
+            return Response(caching.cached_value(key, lambda: self.row_data(queryset)))
+
+        return self.conditional_response(office_ids, build)
 
 
 class OfficeViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = OfficeSerializer
     permission_classes = [permissions.IsAuthenticated]
+    keyset_ordering = ("name", "id")
 
     def get_queryset(self):
-        return get_user_offices(self.request.user)
+        return get_access(self.request).offices()
 
 
 class MedicationViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = MedicationSerializer
     permission_classes = [permissions.IsAuthenticated]
     queryset = Medication.objects.filter(is_active=True)
+    keyset_ordering = ("generic_name", "id")
+
+    @action(detail=False)
+    def search(self, request):
+        try:
+            limit = int(request.query_params.get("limit", 20))
+        except ValueError:
+            raise ValidationError("limit must be a whole number.")
+        if not 1 <= limit <= 50:
+            raise ValidationError("limit must be between 1 and 50.")
+        return Response(search_medications(request.query_params.get("q", ""), limit))
 
 
 class OfficeMedicationListView(generics.ListAPIView):
     serializer_class = OfficeMedicationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    keyset_ordering = ("medication__generic_name", "id")
 
     def get_queryset(self):
         office = generics.get_object_or_404(Office, pk=self.kwargs["pk"], is_active=True)
-        offices = get_user_offices(self.request.user)
-        if self.request.user.role != self.request.user.Role.ADMIN and not offices.filter(pk=office.pk).exists():
+        if not get_access(self.request).can_access(office):
             return OfficeMedication.objects.none()
         return OfficeMedication.objects.filter(office=office, is_active=True).select_related("medication")
 
 
-class OfficeLotListView(generics.ListAPIView):
+class OfficeLotListView(ValuesRowsListMixin, ConditionalReportMixin, generics.ListAPIView):
     serializer_class = LotSerializer
     permission_classes = [permissions.IsAuthenticated]
+    report_name = "api-office-lots"
+
+    def get(self, request, *args, **kwargs):
+        self.office = generics.get_object_or_404(Office, pk=self.kwargs["pk"], is_active=True)
+        if not get_access(request).can_access(self.office):
+            return self.list(request, *args, **kwargs)
+        return self.conditional_response([self.office.pk], lambda key: self.list(request, *args, **kwargs))
 
     def get_queryset(self):
-        office = generics.get_object_or_404(Office, pk=self.kwargs["pk"], is_active=True)
-        offices = get_user_offices(self.request.user)
-        if self.request.user.role != self.request.user.Role.ADMIN and not offices.filter(pk=office.pk).exists():
+        if not get_access(self.request).can_access(self.office):
             return Lot.objects.none()
-        return Lot.objects.filter(office_medication__office=office, is_active=True).select_related(
-            "office_medication__medication"
-        )
+        return Lot.objects.filter(office_medication__office=self.office, is_active=True)
 
 
-class ExpiringReportView(generics.GenericAPIView):
+class ExpiringReportView(PaginatedReportMixin, generics.GenericAPIView):
     serializer_class = ReportLotSerializer
     permission_classes = [permissions.IsAuthenticated]
+    report_name = "api-expiring"
 
     def get(self, request, *args, **kwargs):
         days = int(request.GET.get("days", 60))
         office_id = request.GET.get("office_id")
         office = None
-        offices = get_user_offices(request.user)
+        access = get_access(request)
         if office_id:
             office = generics.get_object_or_404(Office, pk=office_id, is_active=True)
-        if office and request.user.role != request.user.Role.ADMIN and not offices.filter(pk=office.pk).exists():
+        if office and not access.can_access(office):
             office = None
-        lots = lots_expiring_within(days, office=office or offices)
-        serializer = self.get_serializer(lots, many=True)
-        return Response(serializer.data)
+        lots = lots_expiring_within(days, office=office or access.scope)
+        return self.paginated_response(lots, {office.pk} if office else access.office_ids)
 
 
-class ExpiredReportView(generics.GenericAPIView):
+class ExpiredReportView(PaginatedReportMixin, generics.GenericAPIView):
     serializer_class = ReportLotSerializer
     permission_classes = [permissions.IsAuthenticated]
+    report_name = "api-expired"
 
     def get(self, request, *args, **kwargs):
         office_id = request.GET.get("office_id")
         office = None
-        offices = get_user_offices(request.user)
+        access = get_access(request)
         if office_id:
             office = generics.get_object_or_404(Office, pk=office_id, is_active=True)
-        if office and request.user.role != request.user.Role.ADMIN and not offices.filter(pk=office.pk).exists():
+        if office and not access.can_access(office):
             office = None
-        lots = lots_expired(office=office or offices)
-        serializer = self.get_serializer(lots, many=True)
-        return Response(serializer.data)
+        lots = lots_expired(office=office or access.scope)
+        return self.paginated_response(lots, {office.pk} if office else access.office_ids)
 
 
 class InventoryReportView(generics.GenericAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
+    max_buckets = 12
+
+    def get(self, request, *args, **kwargs):
+        access = get_access(request)
+        if "buckets" not in request.query_params:
+            summary = caching.cached_report(
+                "api-inventory", access.office_ids, lambda: dict(inventory_summary(access.scope))
+            )
+            return Response(summary)
+
+        try:
+            buckets = sorted({int(value) for value in request.query_params["buckets"].split(",") if value.strip()})
+            labels = [label for label, _ in expiry_buckets(buckets)]
+        except ValueError:
+            raise ValidationError(
+                {"buckets": f"Use a comma-separated list of day counts up to {MAX_BUCKET_DAYS}, e.g. 30,60,90."}
+            )
+        if len(buckets) > self.max_buckets:
+            raise ValidationError({"buckets": f"At most {self.max_buckets} buckets are allowed."})
+        results = caching.cached_report(
+            "api-inventory-histogram",
+            access.office_ids,
+            lambda: expiry_histogram(access.scope, buckets),
+            buckets=buckets,
+        )
+        return Response({"buckets": labels, "results": results})
+
+
+class DispenseView(generics.GenericAPIView):
+    serializer_class = DispenseSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        office_med = generics.get_object_or_404(
+            OfficeMedication.objects.select_related("office"), pk=self.kwargs["pk"], is_active=True
+        )
+        if not get_access(request).can_access(office_med.office):
+            raise NotFound()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            result = dispense(office_med, serializer.validated_data["qty"], actor=request.user)
+        except InsufficientStock as exc:
+            return Response(
+                {"detail": str(exc), "requested": exc.requested, "available": exc.available},
+                status=status.HTTP_409_CONFLICT,
+            )
+        return Response(result)
+
+
+class RecallSearchView(generics.GenericAPIView):
+    serializer_class = RecallSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        criteria = serializer.validated_data
+        lots = recalled_lots(get_access(request).scope, **criteria)
+        return Response({**criteria, "results": recall_rows(lots)})
+
+
+class RecallQuarantineView(generics.GenericAPIView):
+    serializer_class = RecallSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        criteria = serializer.validated_data
+        lots = recalled_lots(get_access(request).scope, **criteria)
+        return Response({**criteria, **quarantine_lots(lots, actor=request.user, criteria=criteria)})
+
+
+class ReorderReportView(generics.GenericAPIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        access = get_access(request)
+        return Response(caching.cached_report("api-reorder", access.office_ids, lambda: reorder_report(access.scope)))
+
+
+class ForecastReportView(generics.GenericAPIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        access = get_access(request)
+        try:
+            horizon = int(request.query_params.get("horizon", settings.FORECAST_HORIZON_DAYS))
+            lookback = int(request.query_params.get("lookback", settings.FORECAST_LOOKBACK_DAYS))
+        except ValueError:
+            raise ValidationError("horizon and lookback must be whole numbers of days.")
+        if not (1 <= horizon <= 365 and 1 <= lookback <= 365):
+            raise ValidationError("horizon and lookback must be between 1 and 365 days.")
+        forecast = caching.cached_report(
+            "api-forecast",
+            access.office_ids,
+            lambda: forecast_expiry_waste(access.scope, horizon, lookback),
+            horizon=horizon,
+            lookback=lookback,
+        )
+        return Response(forecast)
+
+
+class TransferReportView(generics.GenericAPIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        access = get_access(request)
+        try:
+            days = int(request.query_params.get("days", settings.EXPIRY_DAYS_DEFAULT))
+        except ValueError:
+            raise ValidationError("days must be a whole number.")
+        if not 1 <= days <= 365:
+            raise ValidationError("days must be between 1 and 365.")
+        return Response(recommend_transfers(days, None if access.is_admin else access.office_ids))
+
+
+class EntityHistoryView(generics.ListAPIView):
+    serializer_class = AuditLogSerializer
+    permission_classes = [IsAdminRole]
+    keyset_ordering = ("-created_at", "-id")
+
+    def get_queryset(self):
+        return AuditLog.objects.for_entity(self.kwargs["entity_type"], self.kwargs["entity_id"]).select_related(
+            "actor"
+        )
+
+
+class CacheStatsView(APIView):
+    permission_classes = [IsAdminRole]
+
     def get(self, request, *args, **kwargs):
-        summary = inventory_summary(get_user_offices(request.user))
-        return Response({office: rows for office, rows in summary.items()})
+        return Response(caching.stats())
@@ -0,0 +1,259 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.db.models import Max, Q
+
+logger = logging.getLogger(__name__)
+
+_current_buffer = ContextVar("audit_buffer", default=None)
+_missing = object()
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def write_entries(entries, attempts=3):
+    from .models import AuditLog
+
+    for attempt in range(attempts):
+        assign_versions(entries)
+        try:
+            with transaction.atomic():
+                AuditLog.objects.bulk_create(entries, batch_size=500)
+            return
+        except IntegrityError:
+            # Another process wrote a version of one of these entities first; the
+            # unique (entity, version) constraint rejected the batch, so renumber it.
+            if attempt == attempts - 1:
+                raise
+            for entry in entries:
+                entry.pk = None
+                entry._state.adding = True
+
+
+def assign_versions(entries):
+    """Number versioned entries after the latest stored version of their entity.
+
+    Updates are diffed against the record as the stored history rebuilds it, so writes
+    that bypassed AuditLog.log still show up in the next delta. Every
+    AUDIT_LOG_FULL_SNAPSHOT_EVERY versions, and whenever that history can't be rebuilt,
+    the full snapshot is stored instead.
+    """
+    from .models import AuditLog
+
+    versioned = [entry for entry in entries if entry.versioned]
+    if not versioned:
+        return
+    latest = {
+        (row["entity_type"], row["entity_id"]): row["latest"]
+        for row in AuditLog.objects.filter(
+            entity_type__in={entry.entity_type for entry in versioned},
+            entity_id__in={entry.entity_id for entry in versioned},
+            version__gt=0,
+        )
+        .order_by()
+        .values("entity_type", "entity_id")
+        .annotate(latest=Max("version"))
+    }
+    every = settings.AUDIT_LOG_FULL_SNAPSHOT_EVERY
+    states = stored_states(
+        {(entry.entity_type, entry.entity_id) for entry in versioned if entry.allow_delta}, latest, every
+    )
+    for entry in versioned:
+        key = (entry.entity_type, entry.entity_id)
+        entry.version = latest[key] = latest.get(key, 0) + 1
+        state = states.get(key)
+        if entry.allow_delta and state is not None and (entry.version - 1) % every != 0:
+            delta = {name: value for name, value in entry.full_json.items() if state.get(name, _missing) != value}
+            entry.snapshot_json, entry.is_delta = delta, True
+            states[key] = {**state, **delta}
+        else:
+            entry.snapshot_json, entry.is_delta = entry.full_json, False
+            states[key] = dict(entry.full_json)
+
+
+def stored_states(keys, latest, every):
+    """Rebuild the latest stored state of each (entity_type, entity_id) in one query.
+
+    A full snapshot is written at least every ``every`` versions, so only that window
+    of each chain is read. Chains without a full snapshot in it are left out.
+    """
+    from .models import AuditLog
+
+    keys = [key for key in keys if latest.get(key)]
+    if not keys:
+        return {}
+    window = Q()
+    for entity_type, entity_id in keys:
+        window |= Q(entity_type=entity_type, entity_id=entity_id, version__gt=latest[(entity_type, entity_id)] - every)
+    chains = defaultdict(list)
+    rows = AuditLog.objects.filter(window).order_by("-version").values_list(
+        "entity_type", "entity_id", "is_delta", "snapshot_json"
+    )
+    for entity_type, entity_id, is_delta, snapshot in rows:
+        chains[(entity_type, entity_id)].append((is_delta, snapshot))
+    states = {}
+    for key, chain in chains.items():
+        for depth, (is_delta, _) in enumerate(chain):
+            if not is_delta:
+                state = {}
+                for _, snapshot in reversed(chain[: depth + 1]):
+                    state.update(snapshot)
+                states[key] = state
+                break
+    return states
+
+
+class AuditBuffer:
+    def __init__(self, max_size=None, max_age=None, writer=None):
+        self.max_size = max_size or settings.AUDIT_BUFFER_SIZE
+        self.max_age = settings.AUDIT_BUFFER_MAX_AGE if max_age is None else max_age
+        self.writer = writer
+        self.entries = []
+        self.started_at = None
+        self.closed = False
+        self.depth = len(connection.atomic_blocks)
+
+    def add(self, entry):
+        if self.closed:
+            dispatch([entry], self.writer)
+            return
+        if not self.entries:
+            self.started_at = time.monotonic()
+        self.entries.append(entry)
+        if len(self.entries) >= self.max_size or time.monotonic() - self.started_at >= self.max_age:
+            self.flush()
+
+    def defer(self, entry):
+        # Entries logged inside a transaction opened within this buffer's scope only
+        # join the buffer once that transaction commits; Django drops the callback
+        # (and so the entry) when the transaction or its savepoint rolls back.
+        transaction.on_commit(lambda: self.add(entry))
+
+    def flush(self):
+        entries, self.entries = self.entries, []
+        if entries:
+            dispatch(entries, self.writer)
+
+    def close(self):
+        self.flush()
+        self.closed = True
+
+
+class AuditWriter(threading.Thread):
+    def __init__(self, max_size=None, max_age=None):
+        super().__init__(name="audit-writer", daemon=True)
+        self.max_size = max_size or settings.AUDIT_BUFFER_SIZE
+        self.max_age = settings.AUDIT_BUFFER_MAX_AGE if max_age is None else max_age
+        self.queue = queue.Queue()
+
+    def submit(self, entries):
+        self.queue.put(list(entries))
+
+    def drain(self):
+        self.queue.join()
+
+    def stop(self, timeout=None):
+        self.queue.put(None)
+        self.join(timeout)
+
+    def run(self):
+        stopping = False
+        while not stopping:
+            batch = self.queue.get()
+            if batch is None:
+                self.queue.task_done()
+                break
+            received = 1
+            deadline = time.monotonic() + self.max_age
+            while len(batch) < self.max_size:
+                try:
+                    more = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                received += 1
+                if more is None:
+                    stopping = True
+                    break
+                batch.extend(more)
+            try:
+                write_entries(batch)
+            except Exception:
+                logger.exception("Failed to write %s audit log entries", len(batch))
+            finally:
+                close_old_connections()
+                for _ in range(received):
+                    self.queue.task_done()
+
+
+def get_writer():
+    global _writer
+    if not settings.AUDIT_BACKGROUND_WRITER:
+        return None
+    with _writer_lock:
+        if _writer is None or not _writer.is_alive():
+            _writer = AuditWriter()
+            _writer.start()
+            atexit.register(_writer.stop, 5)
+    return _writer
+
+
+def dispatch(entries, writer=None):
+    if writer is None:
+        write_entries(entries)
+    elif connection.in_atomic_block:
+        transaction.on_commit(lambda: writer.submit(entries))
+    else:
+        writer.submit(entries)
+
+
+def record(entry):
+    buffer = _current_buffer.get()
+    if buffer is not None:
+        if len(connection.atomic_blocks) > buffer.depth:
+            buffer.defer(entry)
+        else:
+            buffer.add(entry)
+        return entry
+    dispatch([entry], get_writer())
+    return entry
+
+
+def reconstruct(entity_type, entity_id, version=None):
+    from .models import AuditLog
+
+    history = AuditLog.objects.for_entity(entity_type, entity_id).filter(version__gt=0)
+    if version is not None:
+        history = history.filter(version__lte=version)
+    chain = []
+    for entry in history.order_by("-version", "-id").values("is_delta", "snapshot_json").iterator():
+        chain.append(entry["snapshot_json"])
+        if not entry["is_delta"]:
+            break
+    else:
+        return None
+    state = {}
+    for snapshot in reversed(chain):
+        state.update(snapshot)
+    return state
+
+
+@contextmanager
+def buffered(max_size=None, max_age=None):
+    if _current_buffer.get() is not None:
+        yield _current_buffer.get()
+        return
+    buffer = AuditBuffer(max_size=max_size, max_age=max_age, writer=get_writer())
+    token = _current_buffer.set(buffer)
+    try:
+        yield buffer
+    finally:
+        _current_buffer.reset(token)
+        buffer.close()
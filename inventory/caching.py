@@ -0,0 +1,146 @@
+import hashlib
+import json
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+
+STATS_PREFIX = "cache-stats"
+TRACKED = set()
+REPORTS = "reports"
+_missing = object()
+
+
+def track(name):
+    TRACKED.add(name)
+    return name
+
+
+def _incr(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def record_hit(name):
+    _incr(f"{STATS_PREFIX}:{name}:hits")
+
+
+def record_miss(name):
+    _incr(f"{STATS_PREFIX}:{name}:misses")
+
+
+def stats():
+    keys = {(name, outcome): f"{STATS_PREFIX}:{name}:{outcome}" for name in TRACKED for outcome in ("hits", "misses")}
+    found = cache.get_many(keys.values())
+    result = {name: {"hits": 0, "misses": 0} for name in sorted(TRACKED)}
+    for (name, outcome), key in keys.items():
+        result[name][outcome] = found.get(key, 0)
+    return result
+
+
+def get_versions(keys):
+    keys = list(keys)
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            initial = time.time_ns()
+            cache.add(key, initial, timeout=None)
+            found[key] = cache.get(key, initial)
+    return [found[key] for key in keys]
+
+
+def bump_versions(keys):
+    keys = list(keys)
+
+    def bump():
+        for key in keys:
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.add(key, time.time_ns(), timeout=None)
+
+    bump()
+    transaction.on_commit(bump)
+
+
+def office_version_key(office_id):
+    return f"office-data:version:{office_id}"
+
+
+def office_versions(office_ids):
+    return get_versions(office_version_key(pk) for pk in office_ids)
+
+
+def invalidate_offices(office_ids):
+    office_ids = sorted(set(office_ids))
+    if office_ids:
+        bump_versions([office_version_key(pk) for pk in office_ids])
+
+
+def lots_state(office_ids):
+    """Row count and latest change time of the offices' lots, read from the database.
+
+    Unlike the cached office versions this also sees writes made by other
+    processes (imports, cron jobs, other web workers) on any cache backend.
+    """
+    from .models import Lot
+
+    state = Lot.objects.filter(office_medication__office_id__in=list(office_ids)).aggregate(
+        count=Count("id"),
+        lots=Max("updated_at"),
+        office_medications=Max("office_medication__updated_at"),
+        medications=Max("office_medication__medication__updated_at"),
+        offices=Max("office_medication__office__updated_at"),
+    )
+    changed = [value for name, value in state.items() if name != "count" and value is not None]
+    return state["count"], max(changed, default=None)
+
+
+def report_validators(name, office_ids, **params):
+    """ETag and Last-Modified timestamp for a report, built only from committed data.
+
+    The cached office versions are per process, so they stay out of the validators
+    and only key the cached rows (see report_key).
+    """
+    count, changed_at = lots_state(office_ids)
+    payload = json.dumps(
+        [name, sorted(office_ids), timezone.localdate().isoformat(), count, changed_at, sorted(params.items())],
+        default=str,
+    )
+    start_of_day = timezone.make_aware(datetime.combine(timezone.localdate(), datetime.min.time()))
+    last_modified = max(start_of_day, changed_at or start_of_day)
+    return hashlib.sha1(payload.encode()).hexdigest(), int(last_modified.timestamp())
+
+
+def report_key(name, office_ids, **params):
+    office_ids = sorted(office_ids)
+    payload = json.dumps(
+        [name, office_ids, office_versions(office_ids), timezone.localdate().isoformat(), sorted(params.items())],
+        default=str,
+    )
+    return f"report:{name}:{hashlib.sha1(payload.encode()).hexdigest()}"
+
+
+def cached_report(name, office_ids, compute, **params):
+    # The office versions are only bumped in this process, so the lots' own state keeps
+    # writes from other workers, imports and cron jobs from serving a stale report.
+    count, changed_at = lots_state(office_ids)
+    return cached_value(report_key(name, office_ids, lots=count, changed_at=changed_at, **params), compute)
+
+
+def cached_value(key, compute):
+    value = cache.get(key, _missing)
+    if value is not _missing:
+        record_hit(track(REPORTS))
+        return value
+    record_miss(track(REPORTS))
+    value = compute()
+    cache.set(key, value, settings.REPORT_CACHE_TIMEOUT)
+    return value
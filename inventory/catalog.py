@@ -0,0 +1,99 @@
+import csv
+from itertools import islice
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import caching
+from .models import AuditLog, Medication, Office, normalize_ndc
+from .search import invalidate_medication_index
+
+NDC_DIRECTORY = "fda_ndc"
+NDC_COLUMNS = ("ndcpackagecode", "productndc", "ndc")
+NAME_COLUMNS = ("nonproprietaryname", "generic_name", "proprietaryname")
+FORM_COLUMNS = ("dosageformname", "form")
+COMPARED_FIELDS = ("generic_name", "ndc", "strength", "form", "source", "is_active")
+UPSERT_FIELDS = [*COMPARED_FIELDS, "updated_at"]
+
+
+def _first(row, columns):
+    for column in columns:
+        value = (row.get(column) or "").strip()
+        if value:
+            return value
+    return ""
+
+
+def _clip(name, value):
+    return value[: Medication._meta.get_field(name).max_length]
+
+
+def _strength(row):
+    parts = [(row.get(column) or "").strip() for column in ("active_numerator_strength", "active_ingred_unit")]
+    return " ".join(part for part in parts if part) or (row.get("strength") or "").strip()
+
+
+def import_ndc_directory(stream, actor=None, delimiter="\t", chunk_size=1000, deactivate=True, source=""):
+    quoting = csv.QUOTE_NONE if delimiter == "\t" else csv.QUOTE_MINIMAL
+    reader = csv.DictReader(stream, delimiter=delimiter, quoting=quoting)
+    reader.fieldnames = [(name or "").strip().lower() for name in reader.fieldnames or []]
+    if not set(NDC_COLUMNS) & set(reader.fieldnames) or not set(NAME_COLUMNS) & set(reader.fieldnames):
+        raise ValueError("File must have an NDC column and a medication name column")
+
+    existing = {}
+    for ndc_normalized, pk, *values in (
+        Medication.objects.exclude(ndc_normalized=None)
+        .values_list("ndc_normalized", "pk", *COMPARED_FIELDS)
+        .iterator(chunk_size=5000)
+    ):
+        existing[ndc_normalized] = (pk, hash(tuple(values)), values[-2] == NDC_DIRECTORY and values[-1])
+    result = {"rows": 0, "created": 0, "updated": 0, "unchanged": 0, "deactivated": 0, "skipped": 0}
+    seen = set()
+
+    def changed_rows():
+        for row in reader:
+            result["rows"] += 1
+            ndc = _clip("ndc", _first(row, NDC_COLUMNS))
+            normalized = normalize_ndc(ndc)
+            name = _clip("generic_name", _first(row, NAME_COLUMNS))
+            if not normalized or not name or normalized in seen:
+                result["skipped"] += 1
+                continue
+            seen.add(normalized)
+            values = (name, ndc, _clip("strength", _strength(row)), _clip("form", _first(row, FORM_COLUMNS)))
+            values += (NDC_DIRECTORY, True)
+            current = existing.get(normalized)
+            if current is not None and current[1] == hash(values):
+                result["unchanged"] += 1
+                continue
+            result["updated" if current is not None else "created"] += 1
+            yield Medication(ndc_normalized=normalized, **dict(zip(COMPARED_FIELDS, values)))
+
+    now = timezone.now()
+    rows = changed_rows()
+    completed = False
+    try:
+        # Every chunk commits on its own so a large directory never holds one long transaction.
+        while chunk := list(islice(rows, chunk_size)):
+            with transaction.atomic():
+                Medication.objects.bulk_create(
+                    chunk, update_conflicts=True, unique_fields=["ndc_normalized"], update_fields=UPSERT_FIELDS
+                )
+        if deactivate and seen:
+            missing = [pk for ndc, (pk, _, active) in existing.items() if active and ndc not in seen]
+            with transaction.atomic():
+                for start in range(0, len(missing), chunk_size):
+                    result["deactivated"] += Medication.objects.filter(
+                        pk__in=missing[start : start + chunk_size]
+                    ).update(is_active=False, updated_at=now)
+        completed = True
+    finally:
+        if result["created"] or result["updated"] or result["deactivated"]:
+            invalidate_medication_index()
+        if result["updated"] or result["deactivated"]:
+            caching.invalidate_offices(Office.objects.values_list("pk", flat=True))
+        details = {"type": "ndc_directory", "source": source, **result}
+        if not completed:
+            details["completed"] = False
+        AuditLog.log(actor, AuditLog.Action.IMPORT, None, details)
+    return result
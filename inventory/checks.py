@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+LOCAL_ACCESS_CACHE_LIMIT = 300
+
+
+@register(Tags.caches)
+def check_office_access_cache(app_configs, **kwargs):
+    backend = settings.CACHES["default"]["BACKEND"]
+    if backend not in settings.PROCESS_LOCAL_CACHE_BACKENDS:
+        return []
+    if settings.OFFICE_ACCESS_CACHE_TIMEOUT <= LOCAL_ACCESS_CACHE_LIMIT:
+        return []
+    return [
+        Warning(
+            f"OFFICE_ACCESS_CACHE_TIMEOUT is {settings.OFFICE_ACCESS_CACHE_TIMEOUT}s on the process-local {backend}.",
+            hint=(
+                "Membership changes made by other processes are not seen until the entry expires. "
+                f"Use a shared CACHE_BACKEND such as Redis or keep the timeout at or below {LOCAL_ACCESS_CACHE_LIMIT}s."
+            ),
+            id="inventory.W001",
+        )
+    ]
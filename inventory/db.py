@@ -0,0 +1,69 @@
+from django.db.migrations import AddIndex
+from django.db.migrations.operations.base import Operation
+
+
+class AddIndexConcurrentlyOnPostgres(AddIndex):
+    atomic = False
+
+    def describe(self):
+        return "Create index %s on %s (concurrently on PostgreSQL)" % (self.index.name, self.model_name)
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != "postgresql":
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.add_index(model, self.index, concurrently=True)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != "postgresql":
+            return super().database_backwards(app_label, schema_editor, from_state, to_state)
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.remove_index(model, self.index, concurrently=True)
+
+
+class AddTrigramIndexOnPostgres(Operation):
+    atomic = False
+    reversible = True
+
+    def __init__(self, model_name, field_name, name, upper=False):
+        self.model_name = model_name
+        self.field_name = field_name
+        self.name = name
+        self.upper = upper
+
+    def deconstruct(self):
+        kwargs = {"model_name": self.model_name, "field_name": self.field_name, "name": self.name}
+        if self.upper:
+            kwargs["upper"] = True
+        return self.__class__.__qualname__, [], kwargs
+
+    def describe(self):
+        return "Create trigram index %s on %s.%s (PostgreSQL only)" % (self.name, self.model_name, self.field_name)
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != "postgresql":
+            return
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        quote = schema_editor.quote_name
+        column = quote(model._meta.get_field(self.field_name).column)
+        if self.upper:
+            column = "UPPER(%s)" % column
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        schema_editor.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS %s ON %s USING gin (%s gin_trgm_ops)"
+            % (quote(self.name), quote(model._meta.db_table), column)
+        )
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != "postgresql":
+            return
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.execute("DROP INDEX CONCURRENTLY IF EXISTS %s" % schema_editor.quote_name(self.name))
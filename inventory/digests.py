@@ -0,0 +1,165 @@
+import logging
+import smtplib
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Lot, OfficeMembership
+from .services import reorder_report
+
+logger = logging.getLogger(__name__)
+
+
+def digest_lots(days, since=None):
+    today = timezone.localdate()
+    lots = Lot.objects.active().filter(office_medication__office__is_active=True)
+    window = Q(exp_date__range=(today, today + timedelta(days=days)))
+    if since is None:
+        return lots.filter(window)
+    entered = window & Q(exp_date__gt=since.as_of + timedelta(days=days))
+    changed = window & Q(updated_at__gte=since.started_at)
+    expired = Q(exp_date__gte=since.as_of, exp_date__lt=today)
+    return lots.filter(entered | changed | expired)
+
+
+def build_digests(days, since=None, include_reorder=False):
+    User = get_user_model()
+    users = list(
+        User.objects.filter(is_active=True).exclude(email="").order_by("pk").values_list("pk", "email", "role")
+    )
+    memberships = defaultdict(set)
+    for user_id, office_id in OfficeMembership.objects.filter(
+        is_active=True, office__is_active=True, user__is_active=True
+    ).values_list("user_id", "office_id"):
+        memberships[user_id].add(office_id)
+
+    today = timezone.localdate()
+    lots = (
+        digest_lots(days, since)
+        .order_by("office_medication__office__name", "office_medication__office_id", "exp_date", "pk")
+        .values_list(
+            "office_medication__office_id",
+            "office_medication__office__name",
+            "office_medication__medication__generic_name",
+            "lot_number",
+            "qty",
+            "exp_date",
+        )
+    )
+    names, sections, counts = {}, defaultdict(list), defaultdict(int)
+    for office_id, office, med, lot_number, qty, exp_date in lots.iterator(chunk_size=2000):
+        names[office_id] = office
+        status = " (expired)" if exp_date < today else ""
+        sections[office_id].append(f" - {med} lot {lot_number or 'N/A'} qty {qty} exp {exp_date}{status}")
+        counts[office_id] += 1
+    reorder = defaultdict(list)
+    if include_reorder:
+        for row in reorder_report():
+            names[row["office_id"]] = row["office"]
+            reorder[row["office_id"]].append(
+                f" - {row['medication']}: {row['usable_qty']} usable, reorder threshold {row['reorder_threshold']}"
+            )
+    order = sorted(names, key=lambda pk: (names[pk], pk))
+    for pk, lines in reorder.items():
+        sections[pk] += ["Below reorder threshold:", *lines]
+    sections = {pk: "\n".join([f"\nOffice: {names[pk]}", *sections[pk]]) for pk in order}
+
+    if since is None:
+        heading = f"Expiring within {days} days:"
+        subject = f"Medication lots expiring in {days} days"
+    else:
+        heading = f"Lots that entered the {days}-day window, changed or expired since {since.as_of}:"
+        subject = f"Medication lot updates since {since.as_of}"
+    digests = []
+    for user_id, email, role in users:
+        office_ids = order if role == User.Role.ADMIN else [pk for pk in order if pk in memberships[user_id]]
+        if not office_ids:
+            continue
+        body = "\n".join([heading, *(sections[pk] for pk in office_ids)])
+        digests.append(
+            {
+                "user_id": user_id,
+                "email": email,
+                "offices": len(office_ids),
+                "lots": sum(counts[pk] for pk in office_ids),
+                "subject": subject,
+                "body": body,
+            }
+        )
+    return digests
+
+
+def send_digests(digests, connection=None, workers=1, retries=0, backoff=1.0):
+    if workers <= 1 or len(digests) <= 1:
+        return _send_batch(digests, connection or get_connection(), retries, backoff)
+    workers = min(workers, len(digests))
+    batches = [digests[index::workers] for index in range(workers)]
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="digest-sender") as pool:
+        sent = list(pool.map(lambda batch: _send_batch(batch, get_connection(), retries, backoff), batches))
+    results = [None] * len(digests)
+    for index, batch_results in enumerate(sent):
+        results[index::workers] = batch_results
+    return results
+
+
+def _send_batch(digests, connection, retries, backoff):
+    from_email = getattr(settings, "DEFAULT_FROM_EMAIL", "no-reply@example.com")
+    try:
+        connection.open()
+    except (smtplib.SMTPException, OSError):
+        logger.warning("Could not open the email connection", exc_info=True)
+    try:
+        return [_send_one(digest, connection, from_email, retries, backoff) for digest in digests]
+    finally:
+        connection.close()
+
+
+def _send_one(digest, connection, from_email, retries, backoff):
+    message = EmailMessage(digest["subject"], digest["body"], from_email, [digest["email"]], connection=connection)
+    started = time.monotonic()
+    attempts = 0
+    while True:
+        attempts += 1
+        try:
+            message.send()
+        except (smtplib.SMTPException, OSError) as exc:
+            error = str(exc) or exc.__class__.__name__
+            permanent = _is_permanent(exc)
+            _reset(connection)
+            if attempts > retries or permanent:
+                logger.warning("Failed to send digest to %s after %s attempts: %s", digest["email"], attempts, error)
+                break
+            time.sleep(backoff * 2 ** (attempts - 1))
+        else:
+            error = None
+            permanent = False
+            break
+    return {
+        "email": digest["email"],
+        "sent": error is None,
+        "error": error,
+        "permanent": permanent,
+        "attempts": attempts,
+        "seconds": time.monotonic() - started,
+    }
+
+
+def _is_permanent(exc):
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in exc.recipients.values())
+    return isinstance(exc, smtplib.SMTPResponseException) and exc.smtp_code >= 500
+
+
+def _reset(connection):
+    try:
+        connection.close()
+        connection.open()
+    except (smtplib.SMTPException, OSError):
+        logger.warning("Could not reopen the email connection", exc_info=True)
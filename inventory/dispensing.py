@@ -0,0 +1,99 @@
+import random
+import time
+
+from django.db import OperationalError, connection, transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from .models import AuditLog, Lot
+from .services import refresh_inventory_rollups
+
+
+class InsufficientStock(ValueError):
+    def __init__(self, requested, available):
+        super().__init__(f"Only {available} usable units available, {requested} requested")
+        self.requested = requested
+        self.available = available
+
+
+class _Contended(Exception):
+    pass
+
+
+def dispense(office_medication, qty, actor=None, attempts=8):
+    if qty < 1:
+        raise ValueError("Quantity to dispense must be at least 1")
+    office_medication_id = getattr(office_medication, "pk", office_medication)
+    if connection.in_atomic_block:
+        # A failed statement leaves the caller's transaction unusable, so only
+        # retry when each attempt runs in its own transaction.
+        attempts = 1
+    for attempt in range(attempts):
+        try:
+            return _dispense(office_medication_id, qty, actor, skip_locked=attempt < attempts - 1)
+        except (_Contended, OperationalError):
+            if attempt == attempts - 1:
+                raise
+            time.sleep(random.uniform(0, 0.005 * 2**attempt))
+
+
+def _dispense(office_medication_id, qty, actor, skip_locked):
+    today = timezone.localdate()
+    with transaction.atomic():
+        lots = list(
+            Lot.objects.active()
+            .filter(office_medication_id=office_medication_id, exp_date__gte=today, qty__gt=0)
+            .order_by("exp_date", "pk")
+            .select_for_update(skip_locked=skip_locked)
+        )
+        available = sum(lot.qty for lot in lots)
+        if available < qty:
+            if skip_locked and _locked_stock(office_medication_id, today, lots) >= qty - available:
+                raise _Contended
+            raise InsufficientStock(qty, available)
+
+        now = timezone.now()
+        remaining = qty
+        drawn = []
+        for lot in lots:
+            if not remaining:
+                break
+            take = min(lot.qty, remaining)
+            updated = Lot.objects.filter(pk=lot.pk, status=Lot.Status.ACTIVE, qty__gte=take).update(
+                qty=F("qty") - take,
+                status=Case(When(qty=take, then=Value(Lot.Status.USED_UP)), default=F("status")),
+                updated_at=now,
+            )
+            if not updated:
+                raise _Contended
+            lot.qty -= take
+            lot.status = Lot.Status.USED_UP if lot.qty == 0 else lot.status
+            lot.updated_at = now
+            remaining -= take
+            drawn.append((lot, take))
+            AuditLog.log(actor, AuditLog.Action.UPDATE, lot)
+
+        refresh_inventory_rollups([office_medication_id])
+    return {
+        "office_medication_id": office_medication_id,
+        "dispensed": qty,
+        "lots": [
+            {
+                "lot_id": lot.pk,
+                "lot_number": lot.lot_number,
+                "exp_date": lot.exp_date,
+                "dispensed": take,
+                "remaining": lot.qty,
+            }
+            for lot, take in drawn
+        ],
+    }
+
+
+def _locked_stock(office_medication_id, today, seen):
+    return sum(
+        Lot.objects.active()
+        .filter(office_medication_id=office_medication_id, exp_date__gte=today, qty__gt=0)
+        .exclude(pk__in=[lot.pk for lot in seen])
+        .values_list("qty", flat=True)
+    )
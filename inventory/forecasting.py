@@ -0,0 +1,140 @@
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db.models import CharField
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from .models import AuditLog, Lot, OfficeMedication
+from .services import _scope_to_offices
+
+
+def usage_rates(office_medication_ids, lookback_days):
+    office_medication_ids = np.asarray(sorted(office_medication_ids), dtype=np.int64)
+    rates = np.zeros(len(office_medication_ids))
+    if not len(office_medication_ids):
+        return rates
+    scoped_lots = Lot.objects.filter(office_medication_id__in=office_medication_ids.tolist())
+    known = np.asarray(list(scoped_lots.order_by("pk").values_list("pk", "office_medication_id")), dtype=np.int64)
+    known = known.reshape(-1, 2)
+    if not len(known):
+        return rates
+    since = timezone.now() - timedelta(days=lookback_days)
+    history = (
+        AuditLog.objects.filter(entity_type="Lot", version__gt=0, created_at__gte=since, snapshot_json__has_key="qty")
+        .filter(entity_id__in=scoped_lots.annotate(key=Cast("pk", CharField())).values("key"))
+        .order_by("entity_id", "version")
+        .values_list("entity_id", "snapshot_json")
+    )
+    lot_ids, quantities = [], []
+    for entity_id, snapshot in history.iterator(chunk_size=5000):
+        try:
+            lot_ids.append(int(entity_id))
+            quantities.append(float(snapshot["qty"]))
+        except (TypeError, ValueError):
+            continue
+    if not lot_ids:
+        return rates
+    lot_ids = np.asarray(lot_ids, dtype=np.int64)
+    quantities = np.asarray(quantities)
+    order = np.lexsort((np.arange(len(lot_ids)), lot_ids))
+    lot_ids, quantities = lot_ids[order], quantities[order]
+
+    same_lot = lot_ids[1:] == lot_ids[:-1]
+    used = np.clip(quantities[:-1] - quantities[1:], 0, None)[same_lot]
+    used_lots = lot_ids[1:][same_lot]
+
+    position = np.searchsorted(known[:, 0], used_lots).clip(0, len(known) - 1)
+    matched = known[position, 0] == used_lots
+    group = np.searchsorted(office_medication_ids, known[position[matched], 1])
+    return np.bincount(group, weights=used[matched], minlength=len(office_medication_ids)) / lookback_days
+
+
+def project_waste(group, quantities, days_to_expiry, rates):
+    quantities = np.asarray(quantities, dtype=float)
+    if not len(quantities):
+        return np.zeros(0), np.zeros(0)
+    group = np.asarray(group, dtype=np.int64)
+    demand = np.asarray(rates, dtype=float)[group] * np.clip(np.asarray(days_to_expiry, dtype=float), 0, None)
+
+    starts = np.flatnonzero(np.r_[True, group[1:] != group[:-1]])
+    segment = np.cumsum(np.r_[True, group[1:] != group[:-1]]) - 1
+    cumulative = np.cumsum(quantities)
+    cumulative -= np.r_[0.0, cumulative][starts][segment]
+
+    slack = demand - cumulative
+    spread = float(slack.max() - slack.min()) + 1.0
+    shifted = slack - segment * spread
+    running_min = np.minimum.accumulate(shifted) + segment * spread
+    consumed_total = cumulative + np.minimum(0.0, running_min)
+
+    previous = np.r_[0.0, consumed_total[:-1]]
+    previous[starts] = 0.0
+    used = consumed_total - previous
+    return used, quantities - used
+
+
+def forecast_expiry_waste(offices=None, horizon_days=None, lookback_days=None):
+    horizon_days = horizon_days or settings.FORECAST_HORIZON_DAYS
+    lookback_days = lookback_days or settings.FORECAST_LOOKBACK_DAYS
+    today = timezone.localdate()
+    lots = list(
+        _scope_to_offices(Lot.objects.active(), offices)
+        .filter(exp_date__range=(today, today + timedelta(days=horizon_days)))
+        .order_by("office_medication_id", "exp_date", "pk")
+        .values_list("pk", "office_medication_id", "lot_number", "qty", "exp_date")
+    )
+    result = {"horizon_days": horizon_days, "lookback_days": lookback_days, "medications": [], "lots": []}
+    if not lots:
+        return result
+
+    lot_ids, office_med_ids, lot_numbers, quantities, exp_dates = zip(*lots)
+    office_med_ids = np.asarray(office_med_ids, dtype=np.int64)
+    unique_ids, group = np.unique(office_med_ids, return_inverse=True)
+    rates = usage_rates(unique_ids.tolist(), lookback_days)
+    days_to_expiry = np.asarray([(exp_date - today).days for exp_date in exp_dates], dtype=float)
+    used, waste = project_waste(group, quantities, days_to_expiry, rates)
+    wasted = waste >= 0.5
+
+    waste_qty = np.bincount(group, weights=waste, minlength=len(unique_ids))
+    waste_lots = np.bincount(group, weights=wasted, minlength=len(unique_ids))
+    total_qty = np.bincount(group, weights=np.asarray(quantities, dtype=float), minlength=len(unique_ids))
+    names = {
+        row[0]: row[1:]
+        for row in OfficeMedication.objects.filter(pk__in=unique_ids.tolist()).values_list(
+            "pk", "office_id", "office__name", "medication_id", "medication__generic_name"
+        )
+    }
+    for index, office_med_id in enumerate(unique_ids.tolist()):
+        office_id, office, medication_id, medication = names[office_med_id]
+        result["medications"].append(
+            {
+                "office_medication_id": office_med_id,
+                "office_id": office_id,
+                "office": office,
+                "medication_id": medication_id,
+                "medication": medication,
+                "daily_usage": round(float(rates[index]), 3),
+                "expiring_qty": int(total_qty[index]),
+                "projected_waste_qty": int(round(waste_qty[index])),
+                "projected_waste_lots": int(waste_lots[index]),
+            }
+        )
+    result["medications"].sort(key=lambda row: (-row["projected_waste_qty"], row["office"], row["medication"]))
+    for index, lot_id in enumerate(lot_ids):
+        if wasted[index]:
+            result["lots"].append(
+                {
+                    "lot_id": lot_id,
+                    "office_medication_id": int(office_med_ids[index]),
+                    "office": names[int(office_med_ids[index])][1],
+                    "medication": names[int(office_med_ids[index])][3],
+                    "lot_number": lot_numbers[index],
+                    "exp_date": exp_dates[index],
+                    "qty": quantities[index],
+                    "projected_use": int(round(used[index])),
+                    "projected_waste": int(round(waste[index])),
+                }
+            )
+    return result
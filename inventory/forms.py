@@ -2,12 +2,26 @@ from datetime import date
 
 from django import forms
 from django.contrib.auth import get_user_model
+from django.template.loader import get_template
 
-from .models import Lot, Medication, Office, OfficeMedication, OfficeMembership
+from .models import Lot, Medication, Office, OfficeMedication, OfficeMembership, normalize_ndc
 
 User = get_user_model()
 
 
+class MedicationAutocomplete(forms.Widget):
+    template_name = "medications/autocomplete.html"
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        medication = Medication.objects.filter(pk=value).first() if str(value or "").isdigit() else None
+        context["widget"]["label"] = f"{medication} {medication.strength}".strip() if medication else ""
+        return context
+
+    def render(self, name, value, attrs=None, renderer=None):
+        return get_template(self.template_name).render(self.get_context(name, value, attrs))
+
+
 class OfficeForm(forms.ModelForm):
     class Meta:
         model = Office
@@ -19,11 +33,19 @@ class MedicationForm(forms.ModelForm):
         model = Medication
         fields = ["generic_name", "ndc", "strength", "form", "default_unit", "is_active"]
 
+    def clean_ndc(self):
+        ndc = self.cleaned_data.get("ndc", "")
+        normalized = normalize_ndc(ndc)
+        if normalized and Medication.objects.filter(ndc_normalized=normalized).exclude(pk=self.instance.pk).exists():
+            raise forms.ValidationError("Another medication already has this NDC.")
+        return ndc
+
 
 class OfficeMedicationForm(forms.ModelForm):
     class Meta:
         model = OfficeMedication
         fields = ["office", "medication", "reorder_threshold", "notes", "is_active"]
+        widgets = {"medication": MedicationAutocomplete()}
 
 
 class LotForm(forms.ModelForm):
@@ -50,6 +72,12 @@ class LotForm(forms.ModelForm):
         return exp_date
 
 
+class LotImportForm(forms.Form):
+    file = forms.FileField(
+        help_text="CSV columns: medication or ndc, lot_number, qty, exp_date, received_date, status"
+    )
+
+
 class UserForm(forms.ModelForm):
     class Meta:
         model = User
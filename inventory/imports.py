@@ -0,0 +1,108 @@
+import csv
+from datetime import date
+from itertools import islice
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import AuditLog, Lot, normalize_lot_number, normalize_ndc
+from .services import refresh_inventory_rollups
+
+LOT_NUMBER_MAX_LENGTH = Lot._meta.get_field("lot_number").max_length
+# PositiveIntegerField is a 32-bit column on PostgreSQL.
+MAX_QTY = 2147483647
+
+
+def office_medication_lookup(office):
+    by_name, by_ndc = {}, {}
+    for office_med in office.office_medications.filter(is_active=True).select_related("medication"):
+        by_name.setdefault(office_med.medication.generic_name.strip().lower(), office_med.pk)
+        if office_med.medication.ndc_normalized:
+            by_ndc.setdefault(office_med.medication.ndc_normalized, office_med.pk)
+    return by_name, by_ndc
+
+
+def import_lots_csv(office, stream, actor=None, batch_size=1000, source="", dry_run=False):
+    reader = csv.DictReader(stream)
+    reader.fieldnames = [(name or "").strip().lower().replace(" ", "_") for name in reader.fieldnames or []]
+    result = {"rows": 0, "created": 0, "errors": []}
+    if not {"qty", "exp_date"} <= set(reader.fieldnames) or not {"medication", "ndc"} & set(reader.fieldnames):
+        result["errors"].append((1, "CSV must have qty, exp_date and a medication or ndc column"))
+        return result
+
+    lookup = office_medication_lookup(office)
+    today = timezone.localdate()
+    touched = set()
+    rows = enumerate(reader, start=2)
+    with transaction.atomic():
+        while batch := list(islice(rows, batch_size)):
+            lots = _validate_batch(batch, lookup, today, result["errors"])
+            result["rows"] += len(batch)
+            if not dry_run:
+                Lot.objects.bulk_create(lots, batch_size=batch_size)
+            result["created"] += len(lots)
+            touched.update(lot.office_medication_id for lot in lots)
+        if dry_run:
+            return result
+        refresh_inventory_rollups(touched)
+        AuditLog.log(
+            actor,
+            AuditLog.Action.IMPORT,
+            office,
+            {
+                "type": "lots_csv",
+                "source": source,
+                "rows": result["rows"],
+                "created": result["created"],
+                "skipped": len(result["errors"]),
+            },
+        )
+    return result
+
+
+def _validate_batch(batch, lookup, today, errors):
+    by_name, by_ndc = lookup
+    statuses = set(Lot.Status.values)
+    lots = []
+    for line, row in batch:
+        name = (row.get("medication") or "").strip().lower()
+        ndc = normalize_ndc(row.get("ndc"))
+        office_med_id = by_ndc.get(ndc) if ndc else None
+        if office_med_id is None and name:
+            office_med_id = by_name.get(name)
+        if office_med_id is None:
+            errors.append((line, "Medication is not in this office's catalog"))
+            continue
+        try:
+            qty = int((row.get("qty") or "").strip())
+            exp_date = date.fromisoformat((row.get("exp_date") or "").strip())
+            received = (row.get("received_date") or "").strip()
+            received_date = date.fromisoformat(received) if received else None
+        except ValueError:
+            errors.append((line, "qty must be a whole number and dates must be YYYY-MM-DD"))
+            continue
+        status = (row.get("status") or "").strip().lower() or Lot.Status.ACTIVE
+        lot_number = (row.get("lot_number") or "").strip()
+        if qty < 0:
+            errors.append((line, "Quantity cannot be negative."))
+        elif qty > MAX_QTY:
+            errors.append((line, f"Quantity cannot be more than {MAX_QTY}."))
+        elif len(lot_number) > LOT_NUMBER_MAX_LENGTH:
+            errors.append((line, f"Lot number cannot be longer than {LOT_NUMBER_MAX_LENGTH} characters."))
+        elif exp_date < today:
+            errors.append((line, "Expiration date cannot be in the past."))
+        elif status not in statuses:
+            errors.append((line, f"Unknown status {status!r}"))
+        else:
+            lots.append(
+                Lot(
+                    office_medication_id=office_med_id,
+                    lot_number=lot_number,
+                    lot_number_normalized=normalize_lot_number(lot_number),
+                    qty=qty,
+                    exp_date=exp_date,
+                    received_date=received_date,
+                    status=status,
+                )
+            )
+    return lots
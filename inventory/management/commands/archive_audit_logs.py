@@ -0,0 +1,99 @@
+import gzip
+import json
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from ... import audit
+from ...models import AuditLog
+
+ARCHIVE_FIELDS = [
+    "id",
+    "actor_id",
+    "action",
+    "entity_type",
+    "entity_id",
+    "version",
+    "is_delta",
+    "snapshot_json",
+    "created_at",
+]
+
+
+def retained_chain_heads(cutoff):
+    """First retained entry of every record whose delta chain starts before the cutoff."""
+    first_kept = (
+        AuditLog.objects.filter(
+            entity_type=OuterRef("entity_type"), entity_id=OuterRef("entity_id"), created_at__gte=cutoff, version__gt=0
+        )
+        .order_by("version")
+        .values("pk")[:1]
+    )
+    return list(
+        AuditLog.objects.filter(created_at__gte=cutoff, version__gt=0, is_delta=True, pk=Subquery(first_kept))
+        .order_by("pk")
+        .values_list("pk", "entity_type", "entity_id", "version")
+    )
+
+
+def rebase_chains(heads):
+    """Store the full record on each chain head so its history no longer needs archived entries."""
+    with transaction.atomic():
+        for pk, entity_type, entity_id, version in heads:
+            state = audit.reconstruct(entity_type, entity_id, version)
+            if state is not None:
+                AuditLog.objects.filter(pk=pk).update(snapshot_json=state, is_delta=False)
+
+
+class Command(BaseCommand):
+    help = "Move audit log entries past the retention window into gzipped JSON-lines archives"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=settings.AUDIT_LOG_RETENTION_DAYS)
+        parser.add_argument("--chunk-size", type=int, default=5000)
+        parser.add_argument("--output-dir", default=settings.AUDIT_LOG_ARCHIVE_DIR)
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options["days"])
+        expired = AuditLog.objects.older_than(cutoff)
+        if not expired.exists():
+            self.stdout.write("No audit log entries to archive")
+            return
+        # Deltas kept after the cutoff build on entries about to be archived, so the first
+        # kept entry of each such chain is rewritten as a full snapshot beforehand.
+        heads = retained_chain_heads(cutoff)
+        if options["dry_run"]:
+            self.stdout.write(
+                f"{expired.count()} audit log entries older than {cutoff:%Y-%m-%d} would be archived "
+                f"and {len(heads)} retained deltas rewritten as full snapshots"
+            )
+            return
+        rebase_chains(heads)
+
+        output_dir = Path(options["output_dir"])
+        output_dir.mkdir(parents=True, exist_ok=True)
+        path = output_dir / f"auditlog-before-{cutoff:%Y%m%d}-{timezone.now():%Y%m%d%H%M%S}.jsonl.gz"
+        archived = 0
+        last_id = 0
+        with gzip.open(path, "wt", encoding="utf-8") as archive:
+            while True:
+                with transaction.atomic():
+                    rows = list(
+                        expired.filter(id__gt=last_id).order_by("id").values(*ARCHIVE_FIELDS)[: options["chunk_size"]]
+                    )
+                    if not rows:
+                        break
+                    for row in rows:
+                        archive.write(json.dumps(row, cls=DjangoJSONEncoder) + "\n")
+                    archive.flush()
+                    AuditLog.objects.filter(id__in=[row["id"] for row in rows]).delete()
+                last_id = rows[-1]["id"]
+                archived += len(rows)
+        self.stdout.write(self.style.SUCCESS(f"Archived {archived} audit log entries to {path}"))
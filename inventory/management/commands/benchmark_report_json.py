@@ -0,0 +1,70 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from ...models import Lot, Medication, Office, OfficeMedication
+from ...renderers import FastJSONRenderer, orjson
+from ...serializers import ReportLotSerializer
+
+
+class Command(BaseCommand):
+    help = "Compare serializer and values() rendering of the lot report payload on throwaway data"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lots", type=int, default=10000)
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            lots = self._seed(options["lots"])
+            slow, slow_body = self._best(options["repeat"], lambda: self._serializer(lots))
+            fast, fast_body = self._best(options["repeat"], lambda: self._values(lots))
+            transaction.set_rollback(True)
+
+        if slow_body != fast_body:
+            raise CommandError("Fast path output differs from the serializer output")
+        encoder = "orjson" if orjson is not None else "json (orjson not installed)"
+        self.stdout.write(f"{options['lots']} lots, {len(fast_body)} bytes")
+        self.stdout.write(f"Serializer + JSONRenderer: {slow * 1000:.1f}ms")
+        self.stdout.write(f"values() + FastJSONRenderer [{encoder}]: {fast * 1000:.1f}ms")
+        self.stdout.write(self.style.SUCCESS(f"Speedup: {slow / fast:.1f}x"))
+
+    def _seed(self, count):
+        office = Office.objects.create(name="Benchmark office")
+        meds = Medication.objects.bulk_create(Medication(generic_name=f"Benchmark med {index}") for index in range(50))
+        office_meds = OfficeMedication.objects.bulk_create(
+            OfficeMedication(office=office, medication=med) for med in meds
+        )
+        today = timezone.localdate()
+        Lot.objects.bulk_create(
+            (
+                Lot(
+                    office_medication=office_meds[index % len(office_meds)],
+                    lot_number=f"B{index}",
+                    qty=index % 100,
+                    exp_date=today + timedelta(days=index % 365),
+                )
+                for index in range(count)
+            ),
+            batch_size=1000,
+        )
+        return Lot.objects.filter(office_medication__office=office).order_by("exp_date", "id")
+
+    def _serializer(self, lots):
+        lots = lots.select_related("office_medication__office", "office_medication__medication")
+        return JSONRenderer().render(ReportLotSerializer(lots, many=True).data)
+
+    def _values(self, lots):
+        return FastJSONRenderer().render(ReportLotSerializer.rows(ReportLotSerializer.values(lots)))
+
+    def _best(self, repeat, func):
+        timings = []
+        for _ in range(max(1, repeat)):
+            started = time.perf_counter()
+            body = func()
+            timings.append(time.perf_counter() - started)
+        return min(timings), body
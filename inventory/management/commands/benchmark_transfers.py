@@ -0,0 +1,91 @@
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from ...models import Lot, Medication, Office, OfficeMedication
+from ...transfers import recommend_transfers
+
+
+class Command(BaseCommand):
+    help = "Time transfer recommendations for many offices and medications on throwaway data"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--offices", type=int, default=500)
+        parser.add_argument("--medications", type=int, default=2000)
+        parser.add_argument("--lots", type=int, default=3)
+        parser.add_argument("--days", type=int, default=60)
+        parser.add_argument("--repeat", type=int, default=3)
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            started = time.perf_counter()
+            counts = self._seed(options["offices"], options["medications"], options["lots"], options["seed"])
+            seeded = time.perf_counter() - started
+            timings = []
+            for _ in range(max(1, options["repeat"])):
+                started = time.perf_counter()
+                plan = recommend_transfers(options["days"])
+                timings.append(time.perf_counter() - started)
+            transaction.set_rollback(True)
+
+        transfers = plan["results"]
+        moved = sum(transfer["qty"] for transfer in transfers)
+        self.stdout.write(
+            f"{options['offices']} offices x {options['medications']} medications: "
+            f"{counts['office_medications']} office medications, {counts['lots']} lots "
+            f"(seeded in {seeded:.1f}s)"
+        )
+        self.stdout.write(f"{len(transfers)} transfers covering {moved} units")
+        self.stdout.write(self.style.SUCCESS(f"recommend_transfers: {min(timings) * 1000:.1f}ms"))
+
+    def _seed(self, offices, medications, lots_per_office, seed, chunk_size=5000):
+        rng = random.Random(seed)
+        today = timezone.localdate()
+        office_ids = [
+            office.pk
+            for office in Office.objects.bulk_create(Office(name=f"Benchmark office {index}") for index in range(offices))
+        ]
+        medication_ids = [
+            medication.pk
+            for medication in Medication.objects.bulk_create(
+                Medication(generic_name=f"Benchmark med {index}") for index in range(medications)
+            )
+        ]
+        counts = {"office_medications": 0, "lots": 0}
+        per_chunk = max(1, chunk_size // max(1, offices))
+        for start in range(0, len(medication_ids), per_chunk):
+            # Roughly 10% of office medications are short, 20% hold expiring surplus and the
+            # rest are catalogued without stock, so every pair still goes through the aggregate.
+            rolls = []
+            office_meds = []
+            for medication_id in medication_ids[start : start + per_chunk]:
+                for office_id in office_ids:
+                    roll = rng.random()
+                    rolls.append(roll)
+                    office_meds.append(
+                        OfficeMedication(
+                            office_id=office_id,
+                            medication_id=medication_id,
+                            reorder_threshold=rng.randint(10, 50) if roll < 0.3 else 0,
+                        )
+                    )
+            office_meds = OfficeMedication.objects.bulk_create(office_meds, batch_size=chunk_size)
+            lots = [
+                Lot(
+                    office_medication_id=office_med.pk,
+                    qty=rng.randint(20, 60),
+                    exp_date=today + timedelta(days=rng.randint(1, 120)),
+                )
+                for office_med, roll in zip(office_meds, rolls)
+                if 0.1 <= roll < 0.3
+                for _ in range(rng.randint(1, lots_per_office))
+            ]
+            Lot.objects.bulk_create(lots, batch_size=chunk_size)
+            counts["office_medications"] += len(office_meds)
+            counts["lots"] += len(lots)
+        return counts
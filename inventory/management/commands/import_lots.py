@@ -0,0 +1,46 @@
+import csv
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ...imports import import_lots_csv
+from ...models import Office
+
+
+class Command(BaseCommand):
+    help = "Bulk import lots for an office from a CSV file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--office", type=int, required=True)
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        try:
+            office = Office.objects.get(pk=options["office"], is_active=True)
+        except Office.DoesNotExist as exc:
+            raise CommandError(f"Office {options['office']} not found") from exc
+
+        started = time.monotonic()
+        try:
+            with open(options["path"], newline="", encoding="utf-8-sig") as stream:
+                result = import_lots_csv(
+                    office,
+                    stream,
+                    batch_size=options["batch_size"],
+                    source=options["path"],
+                    dry_run=options["dry_run"],
+                )
+        except (UnicodeDecodeError, csv.Error) as exc:
+            raise CommandError(f"Could not read {options['path']} as a UTF-8 CSV file: {exc}") from exc
+        elapsed = time.monotonic() - started
+
+        for line, error in result["errors"]:
+            self.stderr.write(f"Line {line}: {error}")
+        verb = "Validated" if options["dry_run"] else "Imported"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{verb} {result['created']} of {result['rows']} lots for {office} in {elapsed:.2f}s"
+            )
+        )
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ...catalog import import_ndc_directory
+
+
+class Command(BaseCommand):
+    help = "Upsert the medication catalog from an FDA NDC directory file (product.txt or package.txt)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--delimiter", default="\t")
+        parser.add_argument("--encoding", default="utf-8-sig")
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument("--keep-missing", action="store_true")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        try:
+            with open(options["path"], newline="", encoding=options["encoding"], errors="replace") as stream:
+                result = import_ndc_directory(
+                    stream,
+                    delimiter=options["delimiter"],
+                    chunk_size=options["chunk_size"],
+                    deactivate=not options["keep_missing"],
+                    source=options["path"],
+                )
+        except (OSError, ValueError) as exc:
+            raise CommandError(str(exc)) from exc
+        elapsed = max(time.monotonic() - started, 1e-6)
+
+        self.stdout.write(
+            f"{result['created']} created, {result['updated']} updated, {result['unchanged']} unchanged, "
+            f"{result['deactivated']} deactivated, {result['skipped']} skipped"
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Processed {result['rows']} rows in {elapsed:.2f}s ({result['rows'] / elapsed:.0f} rows/s)"
+            )
+        )
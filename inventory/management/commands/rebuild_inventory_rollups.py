@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from ...services import refresh_inventory_rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-office inventory rollup table"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        refreshed = refresh_inventory_rollups(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {refreshed} inventory rollups"))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from ...transfers import recommend_transfers
+
+
+class Command(BaseCommand):
+    help = "List transfers of soon-to-expire surplus lots to offices below their reorder threshold"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=None)
+
+    def handle(self, *args, **options):
+        plan = recommend_transfers(options["days"])
+        for row in plan["results"]:
+            self.stdout.write(
+                f"{row['qty']} x {row['medication']} lot {row['lot_number'] or 'N/A'} (exp {row['exp_date']}): "
+                f"{row['from_office']} -> {row['to_office']}"
+            )
+        total = sum(row["qty"] for row in plan["results"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{len(plan['results'])} transfers, {total} units expiring within {plan['days']} days"
+            )
+        )
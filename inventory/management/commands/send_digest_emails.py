@@ -1,54 +1,84 @@
-from collections import defaultdict
+import time
 
 from django.conf import settings
-from django.contrib.auth import get_user_model
-from django.core.mail import send_mail
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
 
-from ...services import lots_expiring_within
+from ...digests import build_digests, send_digests
+from ...models import DigestRun
 
 
 class Command(BaseCommand):
-    help = "Send email digests of expiring lots"
+    help = "Send each user an email digest of expiring lots in their offices"
 
     def add_arguments(self, parser):
         parser.add_argument("--days", type=int, default=settings.EXPIRY_DAYS_DEFAULT)
+        parser.add_argument(
+            "--incremental",
+            action="store_true",
+            help=(
+                "Only include lots that entered the window, changed or expired since the last run "
+                "without temporary delivery failures"
+            ),
+        )
+        parser.add_argument(
+            "--include-reorder",
+            action="store_true",
+            help="Also list medications whose usable quantity is below their reorder threshold",
+        )
+        parser.add_argument("--workers", type=int, default=1, help="Number of parallel email connections")
+        parser.add_argument("--retries", type=int, default=2, help="Retries per recipient for temporary failures")
+        parser.add_argument("--backoff", type=float, default=1.0, help="Seconds before the first retry, doubled each time")
 
     def handle(self, *args, **options):
         days = options["days"]
-        lots = lots_expiring_within(days)
-        if not lots.exists():
-            self.stdout.write("No expiring lots found")
+        since = DigestRun.watermark(days) if options["incremental"] else None
+        run = DigestRun.objects.create(
+            days=days,
+            is_incremental=since is not None,
+            as_of=timezone.localdate(),
+            started_at=timezone.now(),
+        )
+        started = time.monotonic()
+        digests = build_digests(days, since, include_reorder=options["include_reorder"])
+        if not digests:
+            self._finish(run, [])
+            self.stdout.write("No expiring lots found for any recipient")
             return
+        built = time.monotonic() - started
 
-        grouped = defaultdict(list)
-        for lot in lots:
-            office = lot.office_medication.office.name
-            grouped[office].append(lot)
-
-        lines = [f"Expiring within {days} days:"]
-        for office, entries in grouped.items():
-            lines.append(f"\nOffice: {office}")
-            for lot in entries:
-                med = lot.office_medication.medication.generic_name
-                lines.append(f" - {med} lot {lot.lot_number or 'N/A'} qty {lot.qty} exp {lot.exp_date}")
-
-        message = "\n".join(lines)
-        User = get_user_model()
-        recipients = list(
-            User.objects.filter(is_active=True)
-            .exclude(email="")
-            .values_list("email", flat=True)
+        results = send_digests(
+            digests, workers=options["workers"], retries=options["retries"], backoff=options["backoff"]
         )
-        if not recipients:
-            self.stdout.write("No recipients available")
-            return
+        self._finish(run, results)
+        elapsed = time.monotonic() - started
+        sending = max(elapsed - built, 1e-6)
+        failures = [result for result in results if not result["sent"]]
+        for result in results:
+            if result["sent"]:
+                if options["verbosity"] > 1:
+                    self.stdout.write(f"{result['email']}: sent in {result['seconds'] * 1000:.0f}ms")
+            else:
+                self.stderr.write(
+                    f"{result['email']}: {result['error']} "
+                    f"({result['attempts']} attempts, {result['seconds'] * 1000:.0f}ms)"
+                )
 
-        send_mail(
-            subject=f"Medication lots expiring in {days} days",
-            message=message,
-            from_email=getattr(settings, "DEFAULT_FROM_EMAIL", "no-reply@example.com"),
-            recipient_list=recipients,
-            fail_silently=True,
+        sent = len(results) - len(failures)
+        slowest = max(result["seconds"] for result in results)
+        retried = sum(1 for result in results if result["attempts"] > 1)
+        summary = (
+            f"Sent {sent} of {len(results)} digests in {elapsed:.2f}s "
+            f"({len(results) / sending:.1f} msg/s with {options['workers']} workers, "
+            f"built in {built:.2f}s, slowest send {slowest * 1000:.0f}ms, {retried} retried)"
         )
-        self.stdout.write(self.style.SUCCESS(f"Sent digest to {len(recipients)} recipients"))
+        if failures:
+            raise CommandError(f"{summary}; {len(failures)} failed")
+        self.stdout.write(self.style.SUCCESS(summary))
+
+    def _finish(self, run, results):
+        run.sent = sum(1 for result in results if result["sent"])
+        run.failed = len(results) - run.sent
+        run.failed_temporarily = sum(1 for result in results if not result["sent"] and not result["permanent"])
+        run.finished_at = timezone.now()
+        run.save(update_fields=["sent", "failed", "failed_temporarily", "finished_at"])
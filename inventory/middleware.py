@@ -0,0 +1,10 @@
+from .audit import buffered
+
+
+class AuditBufferMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with buffered():
+            return self.get_response(request)
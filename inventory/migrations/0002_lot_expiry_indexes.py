@@ -0,0 +1,31 @@
+from django.db import migrations, models
+
+import inventory.db
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ("inventory", "0001_initial"),
+    ]
+
+    operations = [
+        inventory.db.AddIndexConcurrentlyOnPostgres(
+            model_name="lot",
+            index=models.Index(
+                condition=models.Q(("is_active", True), ("status", "active")),
+                fields=["office_medication", "exp_date"],
+                name="lot_active_om_exp_idx",
+            ),
+        ),
+        inventory.db.AddIndexConcurrentlyOnPostgres(
+            model_name="lot",
+            index=models.Index(
+                condition=models.Q(("is_active", True), ("status", "active")),
+                fields=["exp_date"],
+                name="lot_active_exp_idx",
+            ),
+        ),
+    ]
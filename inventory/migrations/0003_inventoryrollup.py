@@ -0,0 +1,42 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0002_lot_expiry_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="InventoryRollup",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("total_qty", models.PositiveIntegerField(default=0)),
+                ("lot_count", models.PositiveIntegerField(default=0)),
+                ("soonest_exp", models.DateField(blank=True, null=True)),
+                ("expiring_30", models.PositiveIntegerField(default=0)),
+                ("expiring_60", models.PositiveIntegerField(default=0)),
+                ("expiring_90", models.PositiveIntegerField(default=0)),
+                ("expired_count", models.PositiveIntegerField(default=0)),
+                ("as_of", models.DateField()),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "medication",
+                    models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="inventory_rollups", to="inventory.medication"),
+                ),
+                (
+                    "office",
+                    models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="inventory_rollups", to="inventory.office"),
+                ),
+                (
+                    "office_medication",
+                    models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name="rollup", to="inventory.officemedication"),
+                ),
+            ],
+            options={
+                "indexes": [models.Index(fields=["office", "as_of"], name="rollup_office_as_of_idx")],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+from django.db import migrations, models
+
+import inventory.db
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ("inventory", "0003_inventoryrollup"),
+    ]
+
+    operations = [
+        inventory.db.AddIndexConcurrentlyOnPostgres(
+            model_name="auditlog",
+            index=models.Index(fields=["created_at"], name="auditlog_created_idx"),
+        ),
+        inventory.db.AddIndexConcurrentlyOnPostgres(
+            model_name="auditlog",
+            index=models.Index(fields=["entity_type", "entity_id", "-created_at"], name="auditlog_entity_idx"),
+        ),
+        inventory.db.AddIndexConcurrentlyOnPostgres(
+            model_name="auditlog",
+            index=models.Index(fields=["actor", "-created_at"], name="auditlog_actor_idx"),
+        ),
+    ]
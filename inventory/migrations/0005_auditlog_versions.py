@@ -0,0 +1,29 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0004_auditlog_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="auditlog",
+            name="version",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="auditlog",
+            name="is_delta",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddConstraint(
+            model_name="auditlog",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("version__gt", 0)),
+                fields=("entity_type", "entity_id", "version"),
+                name="auditlog_entity_version_uniq",
+            ),
+        ),
+    ]
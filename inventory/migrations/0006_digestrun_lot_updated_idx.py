@@ -0,0 +1,36 @@
+from django.db import migrations, models
+
+import inventory.db
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ("inventory", "0005_auditlog_versions"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DigestRun",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("days", models.PositiveIntegerField()),
+                ("is_incremental", models.BooleanField(default=False)),
+                ("as_of", models.DateField()),
+                ("started_at", models.DateTimeField()),
+                ("finished_at", models.DateTimeField(blank=True, null=True)),
+                ("sent", models.PositiveIntegerField(default=0)),
+                ("failed", models.PositiveIntegerField(default=0)),
+                ("failed_temporarily", models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                "ordering": ["-started_at"],
+            },
+        ),
+        inventory.db.AddIndexConcurrentlyOnPostgres(
+            model_name="lot",
+            index=models.Index(fields=["updated_at"], name="lot_updated_idx"),
+        ),
+    ]
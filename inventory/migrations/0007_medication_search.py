@@ -0,0 +1,61 @@
+import re
+
+from django.db import migrations, models
+
+import inventory.db
+
+NDC_SEGMENT_LENGTHS = {(4, 4, 2), (5, 3, 2), (5, 4, 1), (5, 4, 2), (4, 4), (5, 3), (5, 4)}
+NDC_SEGMENT_WIDTHS = (5, 4, 2)
+
+
+def normalize_ndc(value):
+    # Frozen copy of inventory.models.normalize_ndc.
+    value = (value or "").strip()
+    segments = re.split(r"[-\s]+", value)
+    if all(segment.isdigit() for segment in segments):
+        if tuple(len(segment) for segment in segments) in NDC_SEGMENT_LENGTHS:
+            return "".join(segment.zfill(width) for segment, width in zip(segments, NDC_SEGMENT_WIDTHS))
+    return "".join(ch for ch in value if ch.isdigit())
+
+
+def backfill_ndc_normalized(apps, schema_editor):
+    Medication = apps.get_model("inventory", "Medication")
+    batch = []
+    for medication in Medication.objects.exclude(ndc="").only("pk", "ndc").iterator(chunk_size=2000):
+        medication.ndc_normalized = normalize_ndc(medication.ndc)
+        batch.append(medication)
+        if len(batch) >= 2000:
+            Medication.objects.bulk_update(batch, ["ndc_normalized"])
+            batch = []
+    Medication.objects.bulk_update(batch, ["ndc_normalized"])
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ("inventory", "0006_digestrun_lot_updated_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="medication",
+            name="ndc_normalized",
+            field=models.CharField(blank=True, editable=False, max_length=50),
+        ),
+        migrations.RunPython(backfill_ndc_normalized, migrations.RunPython.noop, atomic=True),
+        inventory.db.AddIndexConcurrentlyOnPostgres(
+            model_name="medication",
+            index=models.Index(fields=["ndc_normalized"], name="medication_ndc_norm_idx"),
+        ),
+        inventory.db.AddTrigramIndexOnPostgres(
+            model_name="medication", field_name="generic_name", name="medication_name_trgm_idx", upper=True
+        ),
+        inventory.db.AddTrigramIndexOnPostgres(
+            model_name="medication", field_name="strength", name="medication_strength_trgm_idx", upper=True
+        ),
+        inventory.db.AddTrigramIndexOnPostgres(
+            model_name="medication", field_name="ndc_normalized", name="medication_ndc_trgm_idx", upper=True
+        ),
+    ]
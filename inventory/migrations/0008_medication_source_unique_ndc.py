@@ -0,0 +1,66 @@
+import re
+
+from django.db import migrations, models
+
+NDC_SEGMENT_LENGTHS = {(4, 4, 2), (5, 3, 2), (5, 4, 1), (5, 4, 2), (4, 4), (5, 3), (5, 4)}
+NDC_SEGMENT_WIDTHS = (5, 4, 2)
+
+
+def normalize_ndc(value):
+    # Frozen copy of inventory.models.normalize_ndc.
+    value = (value or "").strip()
+    segments = re.split(r"[-\s]+", value)
+    if all(segment.isdigit() for segment in segments):
+        if tuple(len(segment) for segment in segments) in NDC_SEGMENT_LENGTHS:
+            return "".join(segment.zfill(width) for segment, width in zip(segments, NDC_SEGMENT_WIDTHS))
+    return "".join(ch for ch in value if ch.isdigit())
+
+
+def check_unique_ndcs(apps, schema_editor):
+    Medication = apps.get_model("inventory", "Medication")
+    owners = {}
+    conflicts = []
+    for pk, name, ndc in Medication.objects.exclude(ndc="").order_by("pk").values_list("pk", "generic_name", "ndc"):
+        normalized = normalize_ndc(ndc)
+        if not normalized:
+            continue
+        if normalized in owners:
+            conflicts.append(f"Medication #{pk} ({name}): NDC {ndc} is already used by medication #{owners[normalized]}")
+        else:
+            owners[normalized] = pk
+    if conflicts:
+        raise RuntimeError(
+            "NDCs must be unique before this migration can run. Change or clear the NDC on these "
+            "medications and migrate again:\n  " + "\n  ".join(conflicts)
+        )
+    Medication.objects.filter(ndc_normalized="").update(ndc_normalized=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0007_medication_search"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="medication",
+            name="medication_ndc_norm_idx",
+        ),
+        migrations.AlterField(
+            model_name="medication",
+            name="ndc_normalized",
+            field=models.CharField(blank=True, editable=False, max_length=50, null=True),
+        ),
+        migrations.RunPython(check_unique_ndcs, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="medication",
+            name="ndc_normalized",
+            field=models.CharField(blank=True, editable=False, max_length=50, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name="medication",
+            name="source",
+            field=models.CharField(blank=True, max_length=50),
+        ),
+    ]
@@ -0,0 +1,56 @@
+from django.db import migrations, models
+
+import inventory.db
+
+
+def normalize_lot_number(value):
+    # Frozen copy of inventory.models.normalize_lot_number.
+    return "".join(ch for ch in (value or "").upper() if ch.isalnum())
+
+
+def backfill_lot_number_normalized(apps, schema_editor):
+    Lot = apps.get_model("inventory", "Lot")
+    batch = []
+    for lot in Lot.objects.exclude(lot_number="").only("pk", "lot_number").iterator(chunk_size=2000):
+        lot.lot_number_normalized = normalize_lot_number(lot.lot_number)
+        batch.append(lot)
+        if len(batch) >= 2000:
+            Lot.objects.bulk_update(batch, ["lot_number_normalized"])
+            batch = []
+    Lot.objects.bulk_update(batch, ["lot_number_normalized"])
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ("inventory", "0008_medication_source_unique_ndc"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="lot",
+            name="lot_number_normalized",
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+        migrations.AlterField(
+            model_name="lot",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("active", "Active"),
+                    ("discarded", "Discarded"),
+                    ("used_up", "Used Up"),
+                    ("quarantined", "Quarantined"),
+                ],
+                default="active",
+                max_length=20,
+            ),
+        ),
+        migrations.RunPython(backfill_lot_number_normalized, migrations.RunPython.noop, atomic=True),
+        inventory.db.AddIndexConcurrentlyOnPostgres(
+            model_name="lot",
+            index=models.Index(fields=["lot_number_normalized"], name="lot_number_norm_idx"),
+        ),
+    ]
@@ -1,7 +1,7 @@
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.http import Http404
 
-from .services import get_user_offices
+from .access import get_access
 
 
 class RoleRequiredMixin(LoginRequiredMixin, UserPassesTestMixin):
@@ -22,13 +22,9 @@ class OfficeScopedMixin(LoginRequiredMixin):
 
     def get_office(self):
         office_id = self.kwargs.get(self.office_kwarg) or self.request.GET.get("office_id")
-        offices = get_user_offices(self.request.user)
+        access = get_access(self.request)
         if office_id:
-            try:
-                office = offices.get(pk=office_id)
-            except offices.model.DoesNotExist as exc:  # type: ignore[attr-defined]
-                raise Http404 from exc
-            return office
-        if self.request.user.role == self.request.user.Role.ADMIN:
-            return offices.first()
+            return access.get_office(office_id)
+        if access.is_admin:
+            return access.offices().first()
         raise Http404("Office not found")
@@ -1,12 +1,15 @@
-import json
+import re
 from datetime import date, datetime, timedelta
 
+from django.conf import settings
 from django.contrib.auth.base_user import BaseUserManager
 from django.contrib.auth.models import AbstractUser
 from django.core.exceptions import ValidationError
 from django.db import models
 from django.utils import timezone
 
+from . import audit
+
 
 class UserManager(BaseUserManager):
     use_in_migrations = True
@@ -46,6 +49,12 @@ class TimestampedModel(models.Model):
     class Meta:
         abstract = True
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
 
 class User(AbstractUser):
     class Role(models.TextChoices):
@@ -91,9 +100,11 @@ class OfficeMembership(TimestampedModel):
 class Medication(TimestampedModel):
     generic_name = models.CharField(max_length=255)
     ndc = models.CharField(max_length=50, blank=True)
+    ndc_normalized = models.CharField(max_length=50, null=True, blank=True, unique=True, editable=False)
     strength = models.CharField(max_length=100, blank=True)
     form = models.CharField(max_length=100, blank=True)
     default_unit = models.CharField(max_length=50, blank=True)
+    source = models.CharField(max_length=50, blank=True)
 
     class Meta:
         ordering = ["generic_name"]
@@ -101,6 +112,13 @@ class Medication(TimestampedModel):
     def __str__(self) -> str:
         return self.generic_name
 
+    def save(self, *args, **kwargs):
+        # ndc_normalized itself is set by a pre_save handler, which also runs for loaddata.
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "ndc" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "ndc_normalized"}
+        super().save(*args, **kwargs)
+
 
 class OfficeMedication(TimestampedModel):
     office = models.ForeignKey(Office, on_delete=models.CASCADE, related_name="office_medications")
@@ -135,11 +153,13 @@ class Lot(TimestampedModel):
         ACTIVE = "active", "Active"
         DISCARDED = "discarded", "Discarded"
         USED_UP = "used_up", "Used Up"
+        QUARANTINED = "quarantined", "Quarantined"
 
     office_medication = models.ForeignKey(
         OfficeMedication, on_delete=models.CASCADE, related_name="lots"
     )
     lot_number = models.CharField(max_length=100, blank=True)
+    lot_number_normalized = models.CharField(max_length=100, blank=True, editable=False)
     qty = models.PositiveIntegerField()
     exp_date = models.DateField()
     received_date = models.DateField(null=True, blank=True)
@@ -150,6 +170,20 @@ class Lot(TimestampedModel):
 
     class Meta:
         ordering = ["exp_date"]
+        indexes = [
+            models.Index(
+                fields=["office_medication", "exp_date"],
+                name="lot_active_om_exp_idx",
+                condition=models.Q(is_active=True, status="active"),
+            ),
+            models.Index(
+                fields=["exp_date"],
+                name="lot_active_exp_idx",
+                condition=models.Q(is_active=True, status="active"),
+            ),
+            models.Index(fields=["updated_at"], name="lot_updated_idx"),
+            models.Index(fields=["lot_number_normalized"], name="lot_number_norm_idx"),
+        ]
 
     def clean(self):
         super().clean()
@@ -162,6 +196,75 @@ class Lot(TimestampedModel):
     def __str__(self) -> str:
         return f"{self.office_medication} lot {self.lot_number or 'N/A'}"
 
+    def save(self, *args, **kwargs):
+        # lot_number_normalized itself is set by a pre_save handler, which also runs for loaddata.
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "lot_number" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "lot_number_normalized"}
+        super().save(*args, **kwargs)
+
+
+class InventoryRollup(models.Model):
+    WINDOWS = (30, 60, 90)
+
+    office_medication = models.OneToOneField(
+        OfficeMedication, on_delete=models.CASCADE, related_name="rollup"
+    )
+    office = models.ForeignKey(Office, on_delete=models.CASCADE, related_name="inventory_rollups")
+    medication = models.ForeignKey(Medication, on_delete=models.CASCADE, related_name="inventory_rollups")
+    total_qty = models.PositiveIntegerField(default=0)
+    lot_count = models.PositiveIntegerField(default=0)
+    soonest_exp = models.DateField(null=True, blank=True)
+    expiring_30 = models.PositiveIntegerField(default=0)
+    expiring_60 = models.PositiveIntegerField(default=0)
+    expiring_90 = models.PositiveIntegerField(default=0)
+    expired_count = models.PositiveIntegerField(default=0)
+    as_of = models.DateField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["office", "as_of"], name="rollup_office_as_of_idx")]
+
+    def __str__(self) -> str:
+        return f"{self.office_medication} rollup ({self.as_of})"
+
+
+class DigestRun(models.Model):
+    days = models.PositiveIntegerField()
+    is_incremental = models.BooleanField(default=False)
+    as_of = models.DateField()
+    started_at = models.DateTimeField()
+    finished_at = models.DateTimeField(null=True, blank=True)
+    sent = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    failed_temporarily = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["-started_at"]
+
+    def __str__(self) -> str:
+        return f"Digest {self.as_of} ({self.days} days)"
+
+    @classmethod
+    def watermark(cls, days):
+        # Permanent failures (such as an address that no longer exists) would fail every run,
+        # so only temporary ones hold the watermark back for a resend.
+        return (
+            cls.objects.filter(days=days, finished_at__isnull=False, failed_temporarily=0)
+            .order_by("-started_at")
+            .first()
+        )
+
+
+class AuditLogQuerySet(models.QuerySet):
+    def for_entity(self, entity, entity_id=None):
+        if isinstance(entity, models.Model):
+            entity, entity_id = entity.__class__.__name__, entity.pk
+        return self.filter(entity_type=entity, entity_id=str(entity_id)).order_by("-created_at", "-id")
+
+    def older_than(self, cutoff):
+        return self.filter(created_at__lt=cutoff)
+
 
 class AuditLog(models.Model):
     class Action(models.TextChoices):
@@ -177,36 +280,90 @@ class AuditLog(models.Model):
     entity_type = models.CharField(max_length=100)
     entity_id = models.CharField(max_length=50)
     snapshot_json = models.JSONField(default=dict, blank=True)
+    version = models.PositiveIntegerField(default=0)
+    is_delta = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = AuditLogQuerySet.as_manager()
+
+    versioned = False
+    allow_delta = False
+    full_json = None
+
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["created_at"], name="auditlog_created_idx"),
+            models.Index(fields=["entity_type", "entity_id", "-created_at"], name="auditlog_entity_idx"),
+            models.Index(fields=["actor", "-created_at"], name="auditlog_actor_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["entity_type", "entity_id", "version"],
+                condition=models.Q(version__gt=0),
+                name="auditlog_entity_version_uniq",
+            ),
+        ]
 
     def __str__(self) -> str:
         return f"{self.action} {self.entity_type}:{self.entity_id}"
 
+    VERSIONED_ACTIONS = (Action.CREATE, Action.UPDATE, Action.DELETE)
+
     @classmethod
     def log(cls, actor, action, instance, extra=None):
-        data = {}
-        if instance is not None:
-            data = json.loads(json.dumps(instance_to_dict(instance)))
-        if extra:
-            data.update(extra)
-        return cls.objects.create(
+        entry = cls(
             actor=actor,
             action=action,
             entity_type=instance.__class__.__name__ if instance else "system",
             entity_id=str(instance.pk) if instance else "-",
-            snapshot_json=data,
         )
+        data = {}
+        if instance is not None:
+            data = instance_to_dict(instance)
+            if action in cls.VERSIONED_ACTIONS:
+                # Versions are assigned when the entry is written (see audit.assign_versions),
+                # which diffs updates against the last stored version of the record.
+                entry.versioned = True
+                entry.allow_delta = action == cls.Action.UPDATE and settings.AUDIT_LOG_DELTAS
+        if extra:
+            data.update(extra)
+        entry.snapshot_json = entry.full_json = data
+        return audit.record(entry)
+
+
+NDC_SEGMENT_LENGTHS = {(4, 4, 2), (5, 3, 2), (5, 4, 1), (5, 4, 2), (4, 4), (5, 3), (5, 4)}
+NDC_SEGMENT_WIDTHS = (5, 4, 2)
+
+
+def normalize_ndc(value):
+    value = (value or "").strip()
+    segments = re.split(r"[-\s]+", value)
+    if all(segment.isdigit() for segment in segments):
+        if tuple(len(segment) for segment in segments) in NDC_SEGMENT_LENGTHS:
+            return "".join(segment.zfill(width) for segment, width in zip(segments, NDC_SEGMENT_WIDTHS))
+    return "".join(ch for ch in value if ch.isdigit())
+
+
+def normalize_lot_number(value):
+    return "".join(ch for ch in (value or "").upper() if ch.isalnum())
 
 
 def instance_to_dict(instance):
+    return values_to_dict(
+        instance._meta.fields,
+        {field.attname: field.value_from_object(instance) for field in instance._meta.fields},
+    )
+
+
+def values_to_dict(fields, values):
     data = {}
-    for field in instance._meta.fields:
-        value = getattr(instance, field.name)
+    for field in fields:
+        if field.attname not in values:
+            continue
+        value = values[field.attname]
         if field.is_relation:
-            data[field.name] = value.pk if value else None
+            data[field.name] = value
         elif isinstance(value, (date, datetime)):
             data[field.name] = value.isoformat()
         else:
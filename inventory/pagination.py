@@ -0,0 +1,128 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    page_size = api_settings.PAGE_SIZE or 100
+    max_page_size = 1000
+    ordering = ("exp_date", "id")
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    paginate_query_param = "paginate"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if request.query_params.get(self.paginate_query_param, "").lower() in ("0", "false", "off"):
+            return None
+        self.request = request
+        self.ordering = tuple(getattr(view, "keyset_ordering", self.ordering))
+        self.page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+        reverse = bool(cursor and cursor["reverse"])
+
+        queryset = queryset.order_by(*(self._flip(field) if reverse else field for field in self.ordering))
+        try:
+            if cursor:
+                queryset = queryset.filter(self._seek(cursor["position"], reverse))
+            results = list(queryset[: self.page_size + 1])
+        except (ValidationError, ValueError):
+            # A cursor whose values don't fit the ordering fields (e.g. a tampered token).
+            raise NotFound(self.invalid_cursor_message)
+        has_more = len(results) > self.page_size
+        results = results[: self.page_size]
+        if reverse:
+            results.reverse()
+
+        self.has_next = has_more if not reverse else True
+        self.has_previous = bool(cursor) if not reverse else has_more
+        self.page = results
+        return results
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "previous": self.get_previous_link(), "results": data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            requested = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(requested, self.max_page_size))
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self._position(self.page[-1]), reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self._position(self.page[0]), reverse=True)
+
+    def encode_cursor(self, position, reverse):
+        payload = json.dumps({"p": position, "r": int(reverse)}, separators=(",", ":"))
+        token = urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            payload = json.loads(urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+            position = [str(value) for value in payload["p"]]
+            reverse = bool(payload.get("r"))
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        if len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return {"position": position, "reverse": reverse}
+
+    def _seek(self, position, reverse):
+        condition = Q()
+        for index, field in enumerate(self.ordering):
+            name = field.lstrip("-")
+            descending = field.startswith("-") != reverse
+            step = Q(**{f"{name}__{'lt' if descending else 'gt'}": position[index]})
+            for prior_field, prior_value in zip(self.ordering[:index], position):
+                step &= Q(**{prior_field.lstrip("-"): prior_value})
+            condition |= step
+        first = self.ordering[0]
+        bound = "lte" if first.startswith("-") != reverse else "gte"
+        return Q(**{f"{first.lstrip('-')}__{bound}": position[0]}) & condition
+
+    def _position(self, item):
+        position = []
+        for field in self.ordering:
+            name = field.lstrip("-")
+            if isinstance(item, dict):
+                value = item[name]
+            else:
+                value = item
+                for part in name.split("__"):
+                    value = getattr(value, part)
+            position.append(value.isoformat() if hasattr(value, "isoformat") else str(value))
+        return position
+
+    @staticmethod
+    def _flip(field):
+        return field[1:] if field.startswith("-") else f"-{field}"
@@ -0,0 +1,81 @@
+import re
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import audit
+from .models import AuditLog, Lot, normalize_lot_number, normalize_ndc
+from .search import NDC_QUERY
+from .services import _scope_to_offices, refresh_inventory_rollups
+
+HELD_STATUSES = (Lot.Status.ACTIVE, Lot.Status.QUARANTINED)
+LOT_SEPARATOR = re.compile(r"[,;\n]+")
+PACKAGE_NDC_DIGITS = 11
+PRODUCT_NDC_DIGITS = 9
+
+
+def recall_criteria(lot_numbers="", ndc=""):
+    if isinstance(lot_numbers, str):
+        lot_numbers = LOT_SEPARATOR.split(lot_numbers)
+    lot_numbers = sorted({normalize_lot_number(value) for value in lot_numbers} - {""})
+    ndc = (ndc or "").strip()
+    digits = normalize_ndc(ndc) if NDC_QUERY.fullmatch(ndc) else ""
+    if ndc and len(digits) < 5:
+        raise ValueError("NDC must contain at least the 5-digit labeler code and only digits, spaces or hyphens.")
+    if not lot_numbers and not digits:
+        raise ValueError("Enter at least one lot number or an NDC.")
+    return {"lot_numbers": lot_numbers, "ndc": digits}
+
+
+def recalled_lots(offices=None, lot_numbers=(), ndc=""):
+    qs = _scope_to_offices(Lot.objects.filter(is_active=True, status__in=HELD_STATUSES), offices)
+    if lot_numbers:
+        qs = qs.filter(lot_number_normalized__in=lot_numbers)
+    if ndc:
+        matches = Q(office_medication__medication__ndc_normalized__startswith=ndc)
+        if len(ndc) == PACKAGE_NDC_DIGITS:
+            # Recall notices quote package NDCs; the catalog may only hold the product code.
+            matches |= Q(office_medication__medication__ndc_normalized=ndc[:PRODUCT_NDC_DIGITS])
+        qs = qs.filter(matches)
+    return qs.order_by("office_medication__office__name", "exp_date", "pk")
+
+
+def recall_rows(lots):
+    return list(
+        lots.values(
+            "lot_number",
+            "qty",
+            "exp_date",
+            "status",
+            lot_id=F("pk"),
+            office_id=F("office_medication__office_id"),
+            office=F("office_medication__office__name"),
+            medication_id=F("office_medication__medication_id"),
+            medication=F("office_medication__medication__generic_name"),
+            ndc=F("office_medication__medication__ndc"),
+        )
+    )
+
+
+def quarantine_lots(lots, actor=None, criteria=None):
+    with transaction.atomic():
+        matched = list(lots.filter(status=Lot.Status.ACTIVE).values_list("pk", "office_medication_id"))
+        lot_ids = [pk for pk, _ in matched]
+        if not lot_ids:
+            return {"quarantined": 0, "lot_ids": []}
+        quarantined = Lot.objects.filter(pk__in=lot_ids, status=Lot.Status.ACTIVE).update(
+            status=Lot.Status.QUARANTINED, updated_at=timezone.now()
+        )
+        refresh_inventory_rollups({office_med_id for _, office_med_id in matched})
+        with audit.buffered():
+            AuditLog.log(
+                actor,
+                AuditLog.Action.UPDATE,
+                None,
+                {"type": "recall_quarantine", **(criteria or {}), "lot_ids": lot_ids, "quarantined": quarantined},
+            )
+            # The bulk update skips save(), so each lot still gets its own version for reconstruct().
+            for lot in Lot.objects.filter(pk__in=lot_ids):
+                AuditLog.log(actor, AuditLog.Action.UPDATE, lot)
+    return {"quarantined": quarantined, "lot_ids": lot_ids}
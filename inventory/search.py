@@ -0,0 +1,147 @@
+import re
+import threading
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, Q, Value, When
+from django.db.models.functions import Upper
+
+from . import caching
+from .models import Medication
+
+VERSION_KEY = "medication-search:version"
+FIELDS = ("id", "generic_name", "ndc", "strength", "form", "default_unit", "is_active")
+WORD = re.compile(r"\w+(?:\.\w+)*")
+NDC_QUERY = re.compile(r"[\d\s-]+")
+NDC_SEPARATOR = re.compile(r"[-\s]+")
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def words(value):
+    return WORD.findall((value or "").lower())
+
+
+def trigrams(word):
+    padded = f"  {word} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def ndc_prefix(query):
+    if not NDC_QUERY.fullmatch(query):
+        return ""
+    segments = NDC_SEPARATOR.split(query.strip())
+    if len(segments) >= 2 and len(segments[0]) == 4:
+        segments[0] = segments[0].zfill(5)
+    if len(segments) >= 3 and len(segments[1]) == 3:
+        segments[1] = segments[1].zfill(4)
+    return "".join(segments)
+
+
+class MedicationIndex:
+    def __init__(self, rows):
+        self.rows = {}
+        self.names = {}
+        self.tokens = []
+        self.ndcs = []
+        self.grams = defaultdict(list)
+        for row in rows:
+            pk = row["id"]
+            self.rows[pk] = {field: row[field] for field in FIELDS}
+            self.names[pk] = row["generic_name"].lower()
+            name_words = set(words(row["generic_name"]))
+            self.tokens.extend((word, pk) for word in name_words | set(words(row["strength"])))
+            if row["ndc_normalized"]:
+                self.ndcs.append((row["ndc_normalized"], pk))
+            for gram in set().union(*map(trigrams, name_words)):
+                self.grams[gram].append(pk)
+        self.tokens.sort()
+        self.ndcs.sort()
+
+    def search(self, query, limit=20):
+        terms = words(query)
+        if not terms:
+            return []
+        rank = {}
+        matched = None
+        for term in terms:
+            found = set(self._prefixed(self.tokens, term))
+            matched = found if matched is None else matched & found
+        for pk in matched:
+            rank[pk] = (0 if self.names[pk].startswith(terms[0]) else 1, 0.0)
+        digits = ndc_prefix(query)
+        if len(digits) >= 3:
+            for pk in self._prefixed(self.ndcs, digits):
+                rank.setdefault(pk, (2, 0.0))
+        query_grams = set().union(*map(trigrams, terms))
+        shared = Counter(pk for gram in query_grams for pk in self.grams.get(gram, ()))
+        for pk, count in shared.items():
+            similarity = count / len(query_grams)
+            if similarity >= settings.MEDICATION_SEARCH_SIMILARITY:
+                rank.setdefault(pk, (3, -similarity))
+        ordered = sorted(rank, key=lambda pk: (*rank[pk], self.names[pk], pk))
+        return [self.rows[pk] for pk in ordered[:limit]]
+
+    def _prefixed(self, entries, prefix):
+        for position in range(bisect_left(entries, (prefix,)), len(entries)):
+            value, pk = entries[position]
+            if not value.startswith(prefix):
+                break
+            yield pk
+
+
+def get_index():
+    global _index
+    (version,) = caching.get_versions([VERSION_KEY])
+    current = _index
+    if current is None or current[0] != version:
+        with _index_lock:
+            if _index is None or _index[0] != version:
+                rows = Medication.objects.filter(is_active=True).values(*FIELDS, "ndc_normalized")
+                _index = (version, MedicationIndex(rows.iterator(chunk_size=5000)))
+            current = _index
+    return current[1]
+
+
+def invalidate_medication_index():
+    caching.bump_versions([VERSION_KEY])
+
+
+def search_medications(query, limit=20):
+    query = (query or "").strip()
+    if not words(query):
+        return []
+    if connection.vendor == "postgresql":
+        return _search_postgres(query, limit)
+    return get_index().search(query, limit)
+
+
+def _search_postgres(query, limit):
+    from django.contrib.postgres.search import TrigramWordSimilarity
+
+    terms = [term.upper() for term in words(query)]
+    every_term = Q()
+    for term in terms:
+        every_term &= Q(name_upper__contains=term) | Q(strength_upper__contains=term)
+    match = every_term | Q(name_upper__trigram_word_similar=query.upper())
+    digits = ndc_prefix(query)
+    by_ndc = Q(ndc_normalized__istartswith=digits) if len(digits) >= 3 else Q(pk__in=[])
+    return list(
+        Medication.objects.filter(is_active=True)
+        .annotate(name_upper=Upper("generic_name"), strength_upper=Upper("strength"))
+        .filter(match | by_ndc)
+        .annotate(
+            tier=Case(
+                When(name_upper__startswith=terms[0], then=Value(0)),
+                When(every_term, then=Value(1)),
+                When(by_ndc, then=Value(2)),
+                default=Value(3),
+            ),
+            similarity=TrigramWordSimilarity(query.upper(), "name_upper"),
+        )
+        .order_by("tier", "-similarity", "generic_name", "id")
+        .values(*FIELDS)[:limit]
+    )
@@ -1,6 +1,25 @@
 from rest_framework import serializers
 
-from .models import Lot, Medication, Office, OfficeMedication
+from .models import AuditLog, Lot, Medication, Office, OfficeMedication
+from .recalls import recall_criteria
+
+
+class ValuesRowsMixin:
+    @classmethod
+    def value_lookups(cls):
+        return {
+            name: name if field.source == "*" else field.source.replace(".", "__")
+            for name, field in cls().fields.items()
+        }
+
+    @classmethod
+    def values(cls, queryset):
+        return queryset.values(*cls.value_lookups().values())
+
+    @classmethod
+    def rows(cls, values):
+        names = list(cls.value_lookups())
+        return [dict(zip(names, row.values())) for row in values]
 
 
 class OfficeSerializer(serializers.ModelSerializer):
@@ -30,7 +49,7 @@ class OfficeMedicationSerializer(serializers.ModelSerializer):
         ]
 
 
-class LotSerializer(serializers.ModelSerializer):
+class LotSerializer(ValuesRowsMixin, serializers.ModelSerializer):
     medication = serializers.CharField(source="office_medication.medication.generic_name", read_only=True)
 
     class Meta:
@@ -48,10 +67,33 @@ class LotSerializer(serializers.ModelSerializer):
         ]
 
 
-class ReportLotSerializer(serializers.ModelSerializer):
+class ReportLotSerializer(ValuesRowsMixin, serializers.ModelSerializer):
     medication = serializers.CharField(source="office_medication.medication.generic_name")
     office = serializers.CharField(source="office_medication.office.name")
 
     class Meta:
         model = Lot
         fields = ["id", "medication", "office", "qty", "exp_date", "status"]
+
+
+class DispenseSerializer(serializers.Serializer):
+    qty = serializers.IntegerField(min_value=1)
+
+
+class RecallSerializer(serializers.Serializer):
+    lot_numbers = serializers.CharField(required=False, allow_blank=True, default="")
+    ndc = serializers.CharField(required=False, allow_blank=True, default="")
+
+    def validate(self, attrs):
+        try:
+            return recall_criteria(attrs["lot_numbers"], attrs["ndc"])
+        except ValueError as exc:
+            raise serializers.ValidationError(str(exc)) from exc
+
+
+class AuditLogSerializer(serializers.ModelSerializer):
+    actor = serializers.CharField(source="actor.email", default=None, read_only=True)
+
+    class Meta:
+        model = AuditLog
+        fields = ["id", "actor", "action", "entity_type", "entity_id", "snapshot_json", "created_at"]
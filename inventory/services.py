@@ -1,26 +1,35 @@
 from collections import defaultdict
 from datetime import timedelta
+from itertools import islice
 
 from django.conf import settings
-from django.db.models import Min, Sum
+from django.db.models import Count, Exists, F, Min, OuterRef, Q, Sum
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 
-from .models import Lot, Office
+from . import caching
+from .models import InventoryRollup, Lot, Office, OfficeMedication, OfficeMembership
+
+MAX_BUCKET_DAYS = 3650
 
 
 def get_user_offices(user):
     if user.role == user.Role.ADMIN:
         return Office.objects.filter(is_active=True)
-    return Office.objects.filter(memberships__user=user, memberships__is_active=True, is_active=True).distinct()
+    memberships = OfficeMembership.objects.filter(office=OuterRef("pk"), user=user, is_active=True)
+    return Office.objects.filter(Exists(memberships), is_active=True)
+
+
+def _scope_to_offices(qs, offices):
+    if offices is None:
+        return qs
+    if isinstance(offices, Office):
+        return qs.filter(office_medication__office=offices)
+    return qs.filter(office_medication__office__in=offices)
 
 
 def lots_expiring_within(days, office=None):
-    qs = Lot.objects.active()
-    if office is not None:
-        if isinstance(office, Office):
-            qs = qs.filter(office_medication__office=office)
-        else:
-            qs = qs.filter(office_medication__office__in=office)
+    qs = _scope_to_offices(Lot.objects.active(), office)
     today = timezone.localdate()
     return qs.filter(exp_date__range=(today, today + timedelta(days=days))).select_related(
         "office_medication__office", "office_medication__medication"
@@ -28,12 +37,7 @@ def lots_expiring_within(days, office=None):
 
 
 def lots_expired(office=None):
-    qs = Lot.objects.active()
-    if office is not None:
-        if isinstance(office, Office):
-            qs = qs.filter(office_medication__office=office)
-        else:
-            qs = qs.filter(office_medication__office__in=office)
+    qs = _scope_to_offices(Lot.objects.active(), office)
     today = timezone.localdate()
     return qs.filter(exp_date__lt=today).select_related(
         "office_medication__office", "office_medication__medication"
@@ -41,20 +45,22 @@ def lots_expired(office=None):
 
 
 def inventory_summary(offices=None):
-    qs = Lot.objects.active()
-    if offices is not None:
-        if isinstance(offices, Office):
-            qs = qs.filter(office_medication__office=offices)
-        else:
-            qs = qs.filter(office_medication__office__in=offices)
-    qs = (
-        qs.values("office_medication__office__name", "office_medication__medication__generic_name")
-        .annotate(total_qty=Sum("qty"), soonest_exp=Min("exp_date"))
-        .order_by("office_medication__office__name", "office_medication__medication__generic_name")
+    rows = (
+        _scoped_rollups(offices)
+        .filter(lot_count__gt=0)
+        .values("office__name", "medication__generic_name", "total_qty", "soonest_exp")
+        .order_by("office__name", "medication__generic_name")
     )
     summary = defaultdict(list)
-    for row in qs:
-        summary[row["office_medication__office__name"]].append(row)
+    for row in rows:
+        summary[row["office__name"]].append(
+            {
+                "office_medication__office__name": row["office__name"],
+                "office_medication__medication__generic_name": row["medication__generic_name"],
+                "total_qty": row["total_qty"],
+                "soonest_exp": row["soonest_exp"],
+            }
+        )
     return summary
 
 
@@ -67,5 +73,192 @@ def next_expiring_lots(days_list=None, offices=None):
     return data
 
 
+def expiry_overview(days_list=None, offices=None):
+    if days_list is None:
+        days_list = list(InventoryRollup.WINDOWS)
+    unsupported = set(days_list) - set(InventoryRollup.WINDOWS)
+    if unsupported:
+        raise ValueError(f"Unsupported expiry windows: {sorted(unsupported)}")
+    aggregates = {f"within_{days}": Sum(f"expiring_{days}") for days in days_list}
+    rows = (
+        _scoped_rollups(offices)
+        .filter(lot_count__gt=0)
+        .values("office_id", "office__name")
+        .annotate(expired=Sum("expired_count"), **aggregates)
+        .order_by("office__name")
+    )
+    overview = {"windows": {days: 0 for days in days_list}, "expired": 0, "attention_offices": []}
+    for row in rows:
+        overview["expired"] += row["expired"]
+        flagged = False
+        for days in days_list:
+            count = row[f"within_{days}"]
+            overview["windows"][days] += count
+            flagged = flagged or count > 0
+        if flagged:
+            overview["attention_offices"].append({"id": row["office_id"], "name": row["office__name"]})
+    return overview
+
+
+def expiry_buckets(buckets=None):
+    buckets = sorted(set(buckets or InventoryRollup.WINDOWS))
+    if not buckets or buckets[0] < 1 or buckets[-1] > MAX_BUCKET_DAYS:
+        raise ValueError(f"Expiry buckets must be between 1 and {MAX_BUCKET_DAYS} days")
+    today = timezone.localdate()
+    ranges = [("expired", Q(exp_date__lt=today))]
+    start = 0
+    for days in buckets:
+        window = (today + timedelta(days=start), today + timedelta(days=days))
+        ranges.append((f"{start}-{days}", Q(exp_date__range=window)))
+        start = days + 1
+    ranges.append((f"{start}+", Q(exp_date__gte=today + timedelta(days=start))))
+    return ranges
+
+
+def expiry_histogram(offices=None, buckets=None):
+    ranges = expiry_buckets(buckets)
+    aggregates = {}
+    for index, (_, condition) in enumerate(ranges):
+        aggregates[f"qty_{index}"] = Sum("qty", filter=condition)
+        aggregates[f"lots_{index}"] = Count("id", filter=condition)
+    rows = (
+        _scope_to_offices(Lot.objects.active(), offices)
+        .values(
+            "office_medication_id",
+            "office_medication__office_id",
+            "office_medication__office__name",
+            "office_medication__medication_id",
+            "office_medication__medication__generic_name",
+        )
+        .annotate(total_qty=Sum("qty"), lot_count=Count("id"), **aggregates)
+        .order_by(
+            "office_medication__office__name",
+            "office_medication__office_id",
+            "office_medication__medication__generic_name",
+        )
+    )
+    return [
+        {
+            "office_medication_id": row["office_medication_id"],
+            "office_id": row["office_medication__office_id"],
+            "office": row["office_medication__office__name"],
+            "medication_id": row["office_medication__medication_id"],
+            "medication": row["office_medication__medication__generic_name"],
+            "total_qty": row["total_qty"],
+            "lot_count": row["lot_count"],
+            "buckets": {
+                label: {"qty": row[f"qty_{index}"] or 0, "lots": row[f"lots_{index}"]}
+                for index, (label, _) in enumerate(ranges)
+            },
+        }
+        for row in rows
+    ]
+
+
+def reorder_report(offices=None):
+    today = timezone.localdate()
+    usable = Q(lots__is_active=True, lots__status=Lot.Status.ACTIVE, lots__exp_date__gte=today)
+    qs = OfficeMedication.objects.filter(is_active=True, office__is_active=True, reorder_threshold__isnull=False)
+    if offices is not None:
+        qs = qs.filter(office=offices) if isinstance(offices, Office) else qs.filter(office__in=offices)
+    rows = (
+        qs.values("pk", "office_id", "office__name", "medication_id", "medication__generic_name", "reorder_threshold")
+        .annotate(usable_qty=Coalesce(Sum("lots__qty", filter=usable), 0))
+        .filter(usable_qty__lt=F("reorder_threshold"))
+        .order_by("office__name", "office_id", "medication__generic_name")
+    )
+    return [
+        {
+            "office_medication_id": row["pk"],
+            "office_id": row["office_id"],
+            "office": row["office__name"],
+            "medication_id": row["medication_id"],
+            "medication": row["medication__generic_name"],
+            "reorder_threshold": row["reorder_threshold"],
+            "usable_qty": row["usable_qty"],
+            "shortfall": row["reorder_threshold"] - row["usable_qty"],
+        }
+        for row in rows
+    ]
+
+
+def _scoped_rollups(offices):
+    qs = InventoryRollup.objects.all()
+    office_meds = OfficeMedication.objects.all()
+    if offices is not None:
+        if isinstance(offices, Office):
+            qs = qs.filter(office=offices)
+            office_meds = office_meds.filter(office=offices)
+        else:
+            qs = qs.filter(office__in=offices)
+            office_meds = office_meds.filter(office__in=offices)
+    # Rows from a previous day are stale, and lots loaded with loaddata never created theirs.
+    outdated = list(
+        office_meds.filter(Q(rollup__isnull=True) | Q(rollup__as_of__lt=timezone.localdate())).values_list(
+            "pk", flat=True
+        )
+    )
+    if outdated:
+        refresh_inventory_rollups(outdated)
+    return qs
+
+
+def refresh_inventory_rollups(office_medication_ids=None, batch_size=1000):
+    today = timezone.localdate()
+    office_meds = OfficeMedication.objects.order_by("pk")
+    if office_medication_ids is not None:
+        office_meds = office_meds.filter(pk__in=list(office_medication_ids))
+    rows = office_meds.values_list("pk", "office_id", "medication_id").iterator(chunk_size=batch_size)
+    refreshed = 0
+    office_ids = set()
+    while chunk := list(islice(rows, batch_size)):
+        _refresh_rollup_chunk(chunk, today)
+        refreshed += len(chunk)
+        office_ids.update(office_id for _, office_id, _ in chunk)
+    caching.invalidate_offices(office_ids)
+    return refreshed
+
+
+def _refresh_rollup_chunk(office_meds, today):
+    windows = {
+        f"expiring_{days}": Count("id", filter=Q(exp_date__range=(today, today + timedelta(days=days))))
+        for days in InventoryRollup.WINDOWS
+    }
+    stats = {
+        row["office_medication_id"]: row
+        for row in Lot.objects.active()
+        .filter(office_medication_id__in=[pk for pk, _, _ in office_meds])
+        .values("office_medication_id")
+        .annotate(
+            total_qty=Sum("qty"),
+            lot_count=Count("id"),
+            soonest_exp=Min("exp_date"),
+            expired_count=Count("id", filter=Q(exp_date__lt=today)),
+            **windows,
+        )
+        .order_by()
+    }
+    counters = ["total_qty", "lot_count", "expired_count", *windows]
+    rollups = []
+    for pk, office_id, medication_id in office_meds:
+        row = stats.get(pk, {})
+        rollups.append(
+            InventoryRollup(
+                office_medication_id=pk,
+                office_id=office_id,
+                medication_id=medication_id,
+                soonest_exp=row.get("soonest_exp"),
+                as_of=today,
+                **{name: row.get(name) or 0 for name in counters},
+            )
+        )
+    InventoryRollup.objects.bulk_create(
+        rollups,
+        update_conflicts=True,
+        unique_fields=["office_medication"],
+        update_fields=["office", "medication", "soonest_exp", "as_of", "updated_at", *counters],
+    )
+
+
 def default_expiry_days():
     return getattr(settings, "EXPIRY_DAYS_DEFAULT", 60)
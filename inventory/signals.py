@@ -1,9 +1,104 @@
 from django.contrib.auth.signals import user_logged_in
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 
-from .models import AuditLog
+from .access import invalidate_office_access
+from .caching import invalidate_offices
+from .models import (
+    AuditLog,
+    Lot,
+    Medication,
+    Office,
+    OfficeMedication,
+    OfficeMembership,
+    User,
+    normalize_lot_number,
+    normalize_ndc,
+)
+from .search import invalidate_medication_index
+from .services import refresh_inventory_rollups
 
 
 @receiver(user_logged_in)
 def log_user_login(sender, request, user, **kwargs):
     AuditLog.log(user, AuditLog.Action.LOGIN, user)
+
+
+@receiver(pre_save, sender=Lot)
+def normalize_lot_number_on_save(sender, instance, **kwargs):
+    instance.lot_number_normalized = normalize_lot_number(instance.lot_number)
+
+
+@receiver(pre_save, sender=Medication)
+def normalize_ndc_on_save(sender, instance, **kwargs):
+    instance.ndc_normalized = normalize_ndc(instance.ndc) or None
+
+
+def _touched_office_medications(lot):
+    touched = {lot.office_medication_id}
+    loaded = getattr(lot, "_loaded_values", {}).get("office_medication_id")
+    if loaded is not None:
+        touched.add(loaded)
+    return touched
+
+
+@receiver(post_save, sender=Lot)
+def refresh_rollup_on_lot_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    refresh_inventory_rollups(_touched_office_medications(instance))
+
+
+@receiver(post_delete, sender=Lot)
+def refresh_rollup_on_lot_delete(sender, instance, origin=None, **kwargs):
+    origin_model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    if origin_model is not Lot:
+        return
+    refresh_inventory_rollups(_touched_office_medications(instance))
+
+
+@receiver(post_save, sender=OfficeMedication)
+def refresh_rollup_on_office_medication_save(sender, instance, created=False, raw=False, **kwargs):
+    if raw or created:
+        return
+    # The rollup copies office_id and medication_id, so moving an office medication
+    # has to rewrite it; the office it left also loses those lots from its reports.
+    refresh_inventory_rollups([instance.pk])
+    loaded = getattr(instance, "_loaded_values", {}).get("office_id")
+    if loaded is not None and loaded != instance.office_id:
+        invalidate_offices([loaded])
+
+
+@receiver([post_save, post_delete], sender=OfficeMembership)
+def invalidate_access_on_membership_change(sender, instance, **kwargs):
+    invalidate_office_access(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=Office)
+def invalidate_access_on_office_change(sender, instance, **kwargs):
+    invalidate_office_access()
+    invalidate_offices([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=OfficeMedication)
+def invalidate_reports_on_office_medication_change(sender, instance, **kwargs):
+    invalidate_offices([instance.office_id])
+
+
+@receiver(post_save, sender=Medication)
+def invalidate_reports_on_medication_change(sender, instance, created=False, **kwargs):
+    if not created:
+        invalidate_offices(instance.office_medications.values_list("office_id", flat=True))
+
+
+@receiver([post_save, post_delete], sender=Medication)
+def invalidate_search_on_medication_change(sender, instance, **kwargs):
+    invalidate_medication_index()
+
+
+@receiver(post_save, sender=User)
+def invalidate_access_on_role_change(sender, instance, created=False, update_fields=None, **kwargs):
+    if created or (update_fields is not None and "role" not in update_fields):
+        return
+    invalidate_office_access(instance.pk)
@@ -0,0 +1,18 @@
+import pytest
+from django.core.cache import cache
+
+from inventory.models import User
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture
+def role_admin_client(client):
+    admin = User.objects.create_user(email="admin@example.com", password="pass", role=User.Role.ADMIN)
+    client.force_login(admin)
+    return client
@@ -0,0 +1,125 @@
+import pytest
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from inventory import caching, checks
+from inventory.access import get_access
+from inventory.models import Office, OfficeMembership, User
+
+
+@pytest.fixture
+def staff():
+    user = User.objects.create_user(email="staff@example.com", password="pass")
+    for index in range(3):
+        office = Office.objects.create(name=f"Office {index}")
+        OfficeMembership.objects.create(user=user, office=office, is_active=index != 2)
+    Office.objects.create(name="Other")
+    return user
+
+
+def membership_queries(queries):
+    return [query for query in queries if "inventory_officemembership" in query["sql"]]
+
+
+@pytest.mark.django_db
+def test_office_access_is_computed_once_per_request(staff, django_assert_num_queries):
+    request = RequestFactory().get("/")
+    request.user = staff
+    member_ids = set(staff.memberships.filter(is_active=True).values_list("office_id", flat=True))
+    other = Office.objects.get(name="Other")
+
+    with django_assert_num_queries(1):
+        access = get_access(request)
+        assert access.office_ids == member_ids
+        assert get_access(request) is access
+        assert all(access.can_access(pk) for pk in member_ids)
+        assert not access.can_access(other)
+        assert not access.can_access("not-a-number")
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("url_name", ["reports", "offices", "lot-create"])
+def test_views_check_office_access_with_a_single_query(client, staff, url_name):
+    office = staff.memberships.filter(is_active=True).first().office
+    client.force_login(staff)
+    url = reverse(url_name, args=[office.pk]) if url_name == "lot-create" else reverse(url_name)
+
+    with CaptureQueriesContext(connection) as ctx:
+        response = client.post(url, {}) if url_name == "lot-create" else client.get(url, {"office_id": office.pk})
+
+    assert response.status_code in (200, 302)
+    assert len(membership_queries(ctx.captured_queries)) == 1
+
+
+@pytest.mark.django_db
+def test_hidden_office_is_not_found(client, staff):
+    other = Office.objects.get(name="Other")
+    client.force_login(staff)
+
+    assert client.get(reverse("office-detail", args=[other.pk])).status_code in (302, 403, 404)
+    assert client.get(reverse("api-office-lots", args=[other.pk])).json()["results"] == []
+
+
+def visible_ids(user):
+    request = RequestFactory().get("/")
+    request.user = user
+    return get_access(request).office_ids
+
+
+@pytest.mark.django_db
+def test_office_ids_are_cached_between_requests(staff, django_assert_num_queries):
+    first = visible_ids(staff)
+
+    with django_assert_num_queries(0):
+        assert visible_ids(staff) == first
+
+    assert caching.stats()["office_access"] == {"hits": 1, "misses": 1}
+
+
+@pytest.mark.django_db
+def test_membership_office_and_role_changes_invalidate_cache(staff):
+    other = Office.objects.get(name="Other")
+    before = visible_ids(staff)
+
+    membership = OfficeMembership.objects.create(user=staff, office=other)
+    assert visible_ids(staff) == before | {other.pk}
+
+    membership.delete()
+    assert visible_ids(staff) == before
+
+    closed = Office.objects.get(pk=min(before))
+    closed.is_active = False
+    closed.save()
+    assert visible_ids(staff) == before - {closed.pk}
+
+    staff.role = User.Role.ADMIN
+    staff.save()
+    assert visible_ids(staff) == set(Office.objects.filter(is_active=True).values_list("pk", flat=True))
+
+
+@pytest.mark.django_db
+def test_cache_stats_endpoint_is_admin_only(client, staff):
+    client.force_login(staff)
+    assert client.get(reverse("api-cache-stats")).status_code == 403
+
+    admin = User.objects.create_user(email="admin@example.com", password="pass", role=User.Role.ADMIN)
+    client.force_login(admin)
+    response = client.get(reverse("api-cache-stats"))
+
+    assert response.status_code == 200
+    assert set(response.json()["office_access"]) == {"hits", "misses"}
+
+
+def test_long_access_cache_on_process_local_backend_warns(settings):
+    settings.CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    settings.OFFICE_ACCESS_CACHE_TIMEOUT = 86400
+    assert [message.id for message in checks.check_office_access_cache(None)] == ["inventory.W001"]
+
+    settings.OFFICE_ACCESS_CACHE_TIMEOUT = 60
+    assert checks.check_office_access_cache(None) == []
+
+    settings.CACHES = {"default": {"BACKEND": "django.core.cache.backends.redis.RedisCache"}}
+    settings.OFFICE_ACCESS_CACHE_TIMEOUT = 86400
+    assert checks.check_office_access_cache(None) == []
@@ -0,0 +1,298 @@
+import datetime
+import gzip
+import io
+import json
+
+import pytest
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from inventory import audit
+from inventory.models import AuditLog, Lot, Medication, Office, OfficeMedication, User
+from inventory.recalls import quarantine_lots
+
+
+def audit_inserts(ctx):
+    return [q for q in ctx.captured_queries if q["sql"].startswith('INSERT INTO "inventory_auditlog"')]
+
+
+@pytest.mark.django_db
+def test_unbuffered_log_writes_immediately():
+    office = Office.objects.create(name="Office")
+    entry = AuditLog.log(None, AuditLog.Action.CREATE, office)
+    assert entry.pk is not None
+
+
+@pytest.mark.django_db
+def test_buffered_entries_are_written_in_one_insert():
+    offices = [Office.objects.create(name=f"Office {index}") for index in range(20)]
+
+    with CaptureQueriesContext(connection) as ctx:
+        with audit.buffered(max_size=100, max_age=60):
+            for office in offices:
+                AuditLog.log(None, AuditLog.Action.UPDATE, office)
+            assert not AuditLog.objects.exists()
+
+    assert len(audit_inserts(ctx)) == 1
+    assert AuditLog.objects.count() == 20
+
+
+@pytest.mark.django_db
+def test_buffer_flushes_when_size_threshold_is_reached():
+    office = Office.objects.create(name="Office")
+
+    with audit.buffered(max_size=5, max_age=60):
+        for _ in range(12):
+            AuditLog.log(None, AuditLog.Action.UPDATE, office)
+        assert AuditLog.objects.count() == 10
+
+    assert AuditLog.objects.count() == 12
+
+
+@pytest.mark.django_db
+def test_buffer_flushes_when_age_threshold_is_reached():
+    office = Office.objects.create(name="Office")
+
+    with audit.buffered(max_size=100, max_age=0):
+        AuditLog.log(None, AuditLog.Action.UPDATE, office)
+        assert AuditLog.objects.count() == 1
+
+
+@pytest.mark.django_db
+def test_buffered_entries_are_dropped_when_their_transaction_rolls_back():
+    office = Office.objects.create(name="Office")
+
+    with audit.buffered(max_size=100, max_age=60):
+        with pytest.raises(RuntimeError):
+            with transaction.atomic():
+                office.name = "Renamed"
+                office.save()
+                AuditLog.log(None, AuditLog.Action.UPDATE, office)
+                raise RuntimeError
+
+    office.refresh_from_db()
+    assert office.name == "Office"
+    assert not AuditLog.objects.exists()
+
+
+@pytest.mark.django_db
+def test_buffered_entries_join_the_buffer_when_their_transaction_commits(django_capture_on_commit_callbacks):
+    office = Office.objects.create(name="Office")
+
+    with audit.buffered(max_size=100, max_age=60) as buffer:
+        with django_capture_on_commit_callbacks(execute=True):
+            with transaction.atomic():
+                AuditLog.log(None, AuditLog.Action.UPDATE, office)
+            assert not buffer.entries
+        assert len(buffer.entries) == 1
+
+    assert AuditLog.objects.count() == 1
+
+
+@pytest.mark.django_db
+def test_buffered_entries_for_committed_writes_survive_an_exception():
+    with pytest.raises(RuntimeError):
+        with audit.buffered(max_size=100, max_age=60):
+            office = Office.objects.create(name="Office")
+            AuditLog.log(None, AuditLog.Action.CREATE, office)
+            with transaction.atomic():
+                AuditLog.log(None, AuditLog.Action.UPDATE, office)
+                raise RuntimeError
+
+    assert list(AuditLog.objects.values_list("action", flat=True)) == [AuditLog.Action.CREATE]
+
+
+@pytest.mark.django_db
+def test_login_request_is_buffered_by_middleware(client):
+    User.objects.create_user(email="staff@example.com", password="pass")
+
+    client.post(reverse("login"), {"username": "staff@example.com", "password": "pass"})
+
+    assert AuditLog.objects.filter(action=AuditLog.Action.LOGIN).count() == 1
+
+
+@pytest.mark.django_db(transaction=True)
+def test_background_writer_batches_submissions():
+    office = Office.objects.create(name="Office")
+    writer = audit.AuditWriter(max_size=50, max_age=0.2)
+    writer.start()
+    try:
+        buffer = audit.AuditBuffer(max_size=3, max_age=60, writer=writer)
+        for _ in range(10):
+            buffer.add(AuditLog(action=AuditLog.Action.UPDATE, entity_type="Office", entity_id=str(office.pk)))
+        buffer.flush()
+        writer.drain()
+    finally:
+        writer.stop(timeout=5)
+
+    assert AuditLog.objects.count() == 10
+    assert not writer.is_alive()
+
+
+@pytest.mark.django_db
+def test_entity_history_uses_entity_index():
+    office = Office.objects.create(name="Office")
+    AuditLog.log(None, AuditLog.Action.CREATE, office)
+    AuditLog.log(None, AuditLog.Action.UPDATE, office)
+
+    history = AuditLog.objects.for_entity(office)
+
+    assert [entry.action for entry in history] == [AuditLog.Action.UPDATE, AuditLog.Action.CREATE]
+    assert "auditlog_entity_idx" in history.explain()
+
+
+@pytest.mark.django_db
+def test_archive_command_moves_old_entries_to_gzip(tmp_path, settings):
+    settings.AUDIT_LOG_DELTAS = False
+    office = Office.objects.create(name="Office")
+    for _ in range(7):
+        AuditLog.log(None, AuditLog.Action.UPDATE, office)
+    recent = AuditLog.log(None, AuditLog.Action.UPDATE, office)
+    AuditLog.objects.exclude(pk=recent.pk).update(created_at=timezone.now() - datetime.timedelta(days=400))
+
+    call_command("archive_audit_logs", days=365, chunk_size=3, output_dir=str(tmp_path), stdout=io.StringIO())
+
+    assert list(AuditLog.objects.values_list("pk", flat=True)) == [recent.pk]
+    (archive,) = tmp_path.glob("*.jsonl.gz")
+    with gzip.open(archive, "rt") as handle:
+        rows = [json.loads(line) for line in handle]
+    assert len(rows) == 7
+    assert rows[0]["entity_type"] == "Office"
+
+
+@pytest.mark.django_db
+def test_entity_history_api_is_admin_only(client):
+    office = Office.objects.create(name="Office")
+    AuditLog.log(None, AuditLog.Action.CREATE, office)
+    url = reverse("api-entity-history", args=["Office", office.pk])
+
+    client.force_login(User.objects.create_user(email="staff@example.com", password="pass"))
+    assert client.get(url).status_code == 403
+
+    client.force_login(User.objects.create_user(email="admin@example.com", password="pass", role=User.Role.ADMIN))
+    payload = client.get(url).json()
+    assert [row["action"] for row in payload["results"]] == ["create"]
+
+
+@pytest.fixture
+def lot():
+    office = Office.objects.create(name="Office")
+    med = Medication.objects.create(generic_name="Med")
+    office_med = OfficeMedication.objects.create(office=office, medication=med)
+    lot = Lot.objects.create(office_medication=office_med, lot_number="A1", qty=50, exp_date=datetime.date(2031, 1, 1))
+    AuditLog.log(None, AuditLog.Action.CREATE, lot)
+    return lot
+
+
+def update_qty(lot_id, qty):
+    lot = Lot.objects.get(pk=lot_id)
+    lot.qty = qty
+    lot.save()
+    AuditLog.log(None, AuditLog.Action.UPDATE, lot)
+
+
+@pytest.mark.django_db
+def test_updates_store_only_changed_fields(lot):
+    update_qty(lot.pk, 40)
+
+    entry = AuditLog.objects.for_entity(lot).first()
+    assert entry.is_delta
+    assert entry.version == 2
+    assert set(entry.snapshot_json) == {"qty", "updated_at"}
+    assert entry.snapshot_json["qty"] == 40
+
+
+@pytest.mark.django_db
+def test_full_snapshot_is_written_every_n_versions(lot, settings):
+    settings.AUDIT_LOG_FULL_SNAPSHOT_EVERY = 3
+    for qty in (45, 40, 35, 30):
+        update_qty(lot.pk, qty)
+
+    chain = list(AuditLog.objects.for_entity(lot).order_by("version").values_list("version", "is_delta"))
+    assert chain == [(1, False), (2, True), (3, True), (4, False), (5, True)]
+
+
+@pytest.mark.django_db
+def test_reconstruct_rebuilds_every_version(lot, settings):
+    settings.AUDIT_LOG_FULL_SNAPSHOT_EVERY = 3
+    for qty in (45, 40, 35, 30):
+        update_qty(lot.pk, qty)
+
+    states = [audit.reconstruct("Lot", lot.pk, version) for version in range(1, 6)]
+
+    assert [state["qty"] for state in states] == [50, 45, 40, 35, 30]
+    assert all(state["lot_number"] == "A1" for state in states)
+    assert audit.reconstruct("Lot", lot.pk) == states[-1]
+
+
+@pytest.mark.django_db
+def test_versions_account_for_buffered_entries(lot):
+    with audit.buffered(max_size=100, max_age=60):
+        update_qty(lot.pk, 45)
+        update_qty(lot.pk, 40)
+
+    assert sorted(AuditLog.objects.for_entity(lot).values_list("version", flat=True)) == [1, 2, 3]
+
+
+@pytest.mark.django_db
+def test_archive_rewrites_the_first_retained_delta_as_a_full_snapshot(lot, tmp_path):
+    Lot.objects.filter(pk=lot.pk).update(lot_number="B")
+    AuditLog.log(None, AuditLog.Action.UPDATE, Lot.objects.get(pk=lot.pk))
+    update_qty(lot.pk, 40)
+    create, renumbered = AuditLog.objects.for_entity(lot).order_by("version")[:2]
+    AuditLog.objects.filter(pk__in=[create.pk, renumbered.pk]).update(
+        created_at=timezone.now() - datetime.timedelta(days=400)
+    )
+
+    call_command("archive_audit_logs", days=365, output_dir=str(tmp_path), stdout=io.StringIO())
+
+    (kept,) = AuditLog.objects.for_entity(lot)
+    assert (kept.version, kept.is_delta) == (3, False)
+    assert (kept.snapshot_json["lot_number"], kept.snapshot_json["qty"]) == ("B", 40)
+    assert audit.reconstruct("Lot", lot.pk)["lot_number"] == "B"
+    (archive,) = tmp_path.glob("*.jsonl.gz")
+    with gzip.open(archive, "rt") as handle:
+        assert sorted(json.loads(line)["version"] for line in handle) == [1, 2]
+
+
+@pytest.mark.django_db
+def test_deltas_build_on_the_stored_history_not_the_loaded_record(lot):
+    quarantine_lots(Lot.objects.filter(pk=lot.pk))
+    update_qty(lot.pk, 45)
+
+    assert audit.reconstruct("Lot", lot.pk)["status"] == Lot.Status.QUARANTINED
+    Lot.objects.filter(pk=lot.pk).update(qty=30)
+    update_qty(lot.pk, 35)
+    state = audit.reconstruct("Lot", lot.pk)
+    assert (state["status"], state["qty"]) == (Lot.Status.QUARANTINED, 35)
+
+
+@pytest.mark.django_db
+def test_buffered_versions_are_assigned_with_one_query_per_flush(lot):
+    with CaptureQueriesContext(connection) as ctx:
+        with audit.buffered(max_size=100, max_age=60):
+            for qty in (45, 40, 35):
+                update_qty(lot.pk, qty)
+
+    assert len([q for q in ctx.captured_queries if "MAX(" in q["sql"]]) == 1
+    assert sorted(AuditLog.objects.for_entity(lot).values_list("version", flat=True)) == [1, 2, 3, 4]
+
+
+@pytest.mark.django_db
+def test_versions_are_renumbered_when_another_writer_takes_them(lot, monkeypatch):
+    assign_versions = audit.assign_versions
+    raced = []
+
+    def racing_assign_versions(entries):
+        assign_versions(entries)
+        if not raced:
+            raced.append(AuditLog.objects.create(entity_type="Lot", entity_id=str(lot.pk), version=entries[0].version))
+
+    monkeypatch.setattr(audit, "assign_versions", racing_assign_versions)
+    update_qty(lot.pk, 45)
+
+    assert sorted(AuditLog.objects.for_entity(lot).values_list("version", flat=True)) == [1, 2, 3]
+    assert AuditLog.objects.for_entity(lot).first().snapshot_json["qty"] == 45
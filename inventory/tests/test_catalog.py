@@ -0,0 +1,147 @@
+import importlib
+import io
+import time
+
+import pytest
+from django.apps import apps
+from django.core.management import CommandError, call_command
+from django.urls import reverse
+
+from inventory.catalog import NDC_DIRECTORY, import_ndc_directory
+from inventory.models import AuditLog, Medication, normalize_ndc
+from inventory.search import search_medications
+
+COLUMNS = [
+    "PRODUCTID",
+    "PRODUCTNDC",
+    "PROPRIETARYNAME",
+    "NONPROPRIETARYNAME",
+    "DOSAGEFORMNAME",
+    "ACTIVE_NUMERATOR_STRENGTH",
+    "ACTIVE_INGRED_UNIT",
+]
+HEADER = "\t".join(COLUMNS) + "\n"
+
+
+def directory(*rows):
+    return io.StringIO(HEADER + "".join("\t".join(row) + "\n" for row in rows))
+
+
+AMOXICILLIN = ("1", "0093-4155", "Amoxil", "Amoxicillin", "CAPSULE", "500", "mg/1")
+IBUPROFEN = ("2", "12345-678", "Advil", "Ibuprofen", "TABLET", "200", "mg/1")
+
+
+def test_product_ndcs_normalize_to_labeler_and_product_code():
+    assert normalize_ndc("0093-4155") == "000934155"
+    assert normalize_ndc("12345-678") == "123450678"
+
+
+@pytest.mark.django_db
+def test_import_upserts_and_skips_unchanged_rows(django_assert_max_num_queries):
+    result = import_ndc_directory(directory(AMOXICILLIN, IBUPROFEN, ("3", "", "", "No NDC", "", "", "")))
+    assert (result["created"], result["skipped"]) == (2, 1)
+    amoxicillin = Medication.objects.get(ndc_normalized="000934155")
+    assert (amoxicillin.generic_name, amoxicillin.strength, amoxicillin.form) == ("Amoxicillin", "500 mg/1", "CAPSULE")
+    assert amoxicillin.source == NDC_DIRECTORY
+
+    with django_assert_max_num_queries(6):
+        result = import_ndc_directory(directory(AMOXICILLIN, IBUPROFEN))
+    assert (result["unchanged"], result["created"], result["updated"]) == (2, 0, 0)
+    assert Medication.objects.get(pk=amoxicillin.pk).updated_at == amoxicillin.updated_at
+
+    result = import_ndc_directory(directory(AMOXICILLIN[:5] + ("875", "mg/1"), IBUPROFEN))
+    assert result["updated"] == 1
+    assert Medication.objects.get(pk=amoxicillin.pk).strength == "875 mg/1"
+    assert AuditLog.objects.filter(action=AuditLog.Action.IMPORT).count() == 3
+
+
+@pytest.mark.django_db
+def test_import_deactivates_missing_directory_products_only():
+    manual = Medication.objects.create(generic_name="Compounded cream", ndc="99999-999-99")
+    adopted = Medication.objects.create(generic_name="amoxicillin", ndc="0093-4155", default_unit="capsule")
+    import_ndc_directory(directory(AMOXICILLIN, IBUPROFEN))
+
+    adopted.refresh_from_db()
+    assert (adopted.generic_name, adopted.source, adopted.default_unit) == ("Amoxicillin", NDC_DIRECTORY, "capsule")
+    assert Medication.objects.filter(generic_name="Ibuprofen").count() == 1
+
+    result = import_ndc_directory(directory(AMOXICILLIN))
+    assert result["deactivated"] == 1
+    assert not Medication.objects.get(generic_name="Ibuprofen").is_active
+    assert Medication.objects.get(pk=manual.pk).is_active
+    assert [row["generic_name"] for row in search_medications("ibup")] == []
+
+    import_ndc_directory(directory(AMOXICILLIN, IBUPROFEN))
+    assert [row["generic_name"] for row in search_medications("ibup")] == ["Ibuprofen"]
+
+
+@pytest.mark.django_db
+def test_import_command_reports_throughput(tmp_path):
+    path = tmp_path / "product.txt"
+    rows = (
+        f"{index}\t{10000 + index // 1000}-{index % 1000:03d}\t\tMed {index}\tTABLET\t5\tmg/1" for index in range(20000)
+    )
+    path.write_text(HEADER + "\n".join(rows) + "\n")
+    out = io.StringIO()
+
+    started = time.monotonic()
+    call_command("import_ndc_directory", str(path), chunk_size=2000, stdout=out)
+
+    assert time.monotonic() - started < 10
+    assert Medication.objects.count() == 20000
+    assert "Processed 20000 rows" in out.getvalue()
+    assert "rows/s" in out.getvalue()
+
+    call_command("import_ndc_directory", str(path), stdout=out)
+    assert "0 created, 0 updated, 20000 unchanged" in out.getvalue()
+
+    bad = tmp_path / "bad.txt"
+    bad.write_text("name\tqty\nA\t1\n")
+    with pytest.raises(CommandError):
+        call_command("import_ndc_directory", str(bad), stdout=out)
+
+
+@pytest.mark.django_db
+def test_import_commits_each_chunk(monkeypatch):
+    bulk_create = Medication.objects.bulk_create
+    calls = []
+
+    def failing_bulk_create(chunk, **kwargs):
+        calls.append(chunk)
+        if len(calls) == 2:
+            raise RuntimeError("connection lost")
+        return bulk_create(chunk, **kwargs)
+
+    monkeypatch.setattr(Medication.objects, "bulk_create", failing_bulk_create)
+    with pytest.raises(RuntimeError):
+        import_ndc_directory(directory(AMOXICILLIN, IBUPROFEN), chunk_size=1)
+
+    assert list(Medication.objects.values_list("generic_name", flat=True)) == ["Amoxicillin"]
+    assert AuditLog.objects.get(action=AuditLog.Action.IMPORT).snapshot_json["completed"] is False
+
+
+@pytest.mark.django_db
+def test_unique_ndc_migration_lists_conflicts_instead_of_clearing_them():
+    migration = importlib.import_module("inventory.migrations.0008_medication_source_unique_ndc")
+    first = Medication.objects.create(generic_name="Amoxicillin", ndc="0093-4155")
+    duplicate = Medication.objects.create(generic_name="Amoxil")
+    Medication.objects.filter(pk=duplicate.pk).update(ndc="00093-4155")
+
+    with pytest.raises(RuntimeError) as excinfo:
+        migration.check_unique_ndcs(apps, None)
+
+    assert f"Medication #{duplicate.pk} (Amoxil): NDC 00093-4155 is already used by medication #{first.pk}" in str(
+        excinfo.value
+    )
+    assert Medication.objects.get(pk=duplicate.pk).ndc == "00093-4155"
+
+
+@pytest.mark.django_db
+def test_admin_reports_a_duplicate_ndc_as_a_form_error(admin_client):
+    Medication.objects.create(generic_name="Amoxicillin", ndc="0093-4155")
+    duplicate = Medication.objects.create(generic_name="Amoxil")
+
+    url = reverse("admin:inventory_medication_change", args=[duplicate.pk])
+    response = admin_client.post(url, {"generic_name": "Amoxil", "ndc": "0093-4155", "is_active": "on"})
+    assert response.status_code == 200
+    assert "Another medication already has this NDC." in response.content.decode()
@@ -0,0 +1,163 @@
+import datetime
+import socketserver
+import threading
+import time
+
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from inventory.digests import build_digests, send_digests
+from inventory.models import Lot, Medication, Office, OfficeMedication, OfficeMembership, User
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.active += 1
+            server.peak = max(server.peak, server.active)
+        try:
+            self.session()
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def session(self):
+        server = self.server
+        self.reply("220 localhost test SMTP")
+        recipients = []
+        while line := self.rfile.readline():
+            command = line.decode().strip()
+            verb = command.split(" ", 1)[0].upper()
+            if verb in ("EHLO", "HELO"):
+                self.reply("250 localhost")
+            elif verb == "MAIL":
+                recipients = []
+                self.reply("250 OK")
+            elif verb == "RCPT":
+                address = command.split(":", 1)[1].strip(" <>")
+                with server.lock:
+                    server.attempts[address] = server.attempts.get(address, 0) + 1
+                    attempt = server.attempts[address]
+                if address.startswith("bounce"):
+                    self.reply("550 No such user")
+                elif address.startswith("flaky") and attempt == 1:
+                    self.reply("451 Try again later")
+                else:
+                    recipients.append(address)
+                    self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                while self.rfile.readline() not in (b".\r\n", b""):
+                    pass
+                if server.delay:
+                    time.sleep(server.delay)
+                with server.lock:
+                    server.delivered.extend(recipients)
+                self.reply("250 Queued")
+            elif verb in ("RSET", "NOOP"):
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class SMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, delay=0):
+        super().__init__(("127.0.0.1", 0), SMTPHandler)
+        self.lock = threading.Lock()
+        self.delivered, self.attempts = [], {}
+        self.active = self.peak = 0
+        self.delay = delay
+
+
+@pytest.fixture
+def smtp_server(settings):
+    server = SMTPServer(delay=0.005)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    settings.EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
+    settings.EMAIL_HOST, settings.EMAIL_PORT = server.server_address
+    settings.EMAIL_HOST_USER = settings.EMAIL_HOST_PASSWORD = ""
+    settings.EMAIL_USE_TLS = settings.EMAIL_USE_SSL = False
+    settings.EMAIL_TIMEOUT = 5
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def digests(db):
+    office = Office.objects.create(name="North")
+    med = Medication.objects.create(generic_name="Amoxicillin")
+    office_med = OfficeMedication.objects.create(office=office, medication=med)
+    Lot.objects.create(office_medication=office_med, qty=5, exp_date=datetime.date.today() + datetime.timedelta(days=5))
+
+    def build(emails):
+        users = User.objects.bulk_create(User(email=email) for email in emails)
+        OfficeMembership.objects.bulk_create(OfficeMembership(user=user, office=office) for user in users)
+        return build_digests(30)
+
+    return build
+
+
+def test_parallel_delivery_loses_nothing(smtp_server, digests):
+    emails = [f"staff{index}@example.com" for index in range(60)]
+
+    started = time.monotonic()
+    results = send_digests(digests(emails), workers=4)
+    rate = len(results) / (time.monotonic() - started)
+
+    assert all(result["sent"] for result in results)
+    assert [result["email"] for result in results] == emails
+    assert sorted(smtp_server.delivered) == sorted(emails)
+    assert smtp_server.peak <= 4
+    assert rate > 0
+
+
+def test_parallel_delivery_is_faster_than_sequential(smtp_server, digests):
+    batch = digests([f"staff{index}@example.com" for index in range(40)])
+
+    started = time.monotonic()
+    send_digests(batch)
+    sequential = time.monotonic() - started
+    started = time.monotonic()
+    send_digests(batch, workers=4)
+    parallel = time.monotonic() - started
+
+    assert len(smtp_server.delivered) == 80
+    assert parallel < sequential
+
+
+def test_temporary_failures_are_retried_and_permanent_ones_are_not(smtp_server, digests):
+    results = {
+        result["email"]: result
+        for result in send_digests(
+            digests(["ok@example.com", "flaky@example.com", "bounce@example.com"]), workers=2, retries=2, backoff=0.01
+        )
+    }
+
+    assert (results["ok@example.com"]["sent"], results["ok@example.com"]["attempts"]) == (True, 1)
+    assert (results["flaky@example.com"]["sent"], results["flaky@example.com"]["attempts"]) == (True, 2)
+    assert (results["bounce@example.com"]["sent"], results["bounce@example.com"]["attempts"]) == (False, 1)
+    assert sorted(smtp_server.delivered) == ["flaky@example.com", "ok@example.com"]
+
+
+def test_command_reports_throughput(smtp_server, digests, capsys):
+    digests(["one@example.com", "two@example.com", "three@example.com"])
+    call_command("send_digest_emails", "--days=30", "--workers=2", "--backoff=0.01")
+    assert "msg/s with 2 workers" in capsys.readouterr().out
+
+    digests(["bounce@example.com"])
+    with pytest.raises(CommandError, match="1 failed"):
+        call_command("send_digest_emails", "--days=30", "--workers=2", "--backoff=0.01")
+    assert smtp_server.attempts["bounce@example.com"] == 1
@@ -0,0 +1,162 @@
+import datetime
+import smtplib
+
+import pytest
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from inventory.digests import build_digests, send_digests
+from inventory.models import DigestRun, Lot, Medication, Office, OfficeMedication, OfficeMembership, User
+
+
+class FlakyBackend(EmailBackend):
+    def send_messages(self, messages):
+        if any("bounce" in address for message in messages for address in message.to):
+            raise smtplib.SMTPRecipientsRefused({})
+        if any("flaky" in address for message in messages for address in message.to):
+            raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+        return super().send_messages(messages)
+
+
+@pytest.fixture
+def offices():
+    med = Medication.objects.create(generic_name="Amoxicillin")
+    soon = datetime.date.today() + datetime.timedelta(days=10)
+    created = []
+    for name in ("North", "South"):
+        office = Office.objects.create(name=name)
+        office_med = OfficeMedication.objects.create(office=office, medication=med)
+        Lot.objects.create(office_medication=office_med, lot_number=f"{name[0]}1", qty=5, exp_date=soon)
+        created.append(office)
+    return created
+
+
+def add_staff(email, *offices):
+    user = User.objects.create_user(email=email, password="pass")
+    for office in offices:
+        OfficeMembership.objects.create(user=user, office=office)
+    return user
+
+
+@pytest.mark.django_db
+def test_each_user_only_gets_their_offices(offices):
+    north, south = offices
+    add_staff("north@example.com", north)
+    add_staff("nobody@example.com")
+    User.objects.create_user(email="admin@example.com", password="pass", role=User.Role.ADMIN)
+
+    digests = {digest["email"]: digest for digest in build_digests(30)}
+
+    assert set(digests) == {"north@example.com", "admin@example.com"}
+    assert "Office: North" in digests["north@example.com"]["body"]
+    assert "Office: South" not in digests["north@example.com"]["body"]
+    assert digests["admin@example.com"]["lots"] == 2
+
+
+@pytest.mark.django_db
+def test_digest_queries_do_not_grow_with_users(offices, django_assert_num_queries):
+    for index in range(20):
+        add_staff(f"staff{index}@example.com", offices[index % 2])
+
+    with django_assert_num_queries(3):
+        assert len(build_digests(30)) == 20
+
+
+@pytest.mark.django_db
+def test_failures_are_reported_per_recipient(offices):
+    add_staff("ok@example.com", *offices)
+    add_staff("bounce@example.com", *offices)
+
+    results = send_digests(build_digests(30), connection=FlakyBackend())
+
+    assert {result["email"]: result["sent"] for result in results} == {
+        "ok@example.com": True,
+        "bounce@example.com": False,
+    }
+    assert all(result["seconds"] >= 0 for result in results)
+    assert [message.to for message in mail.outbox] == [["ok@example.com"]]
+
+
+@pytest.mark.django_db
+def test_command_fails_when_any_send_fails(offices, settings):
+    add_staff("ok@example.com", offices[0])
+    call_command("send_digest_emails", "--days=30")
+    assert len(mail.outbox) == 1
+
+    add_staff("bounce@example.com", offices[1])
+    settings.EMAIL_BACKEND = "inventory.tests.test_digests.FlakyBackend"
+    with pytest.raises(CommandError, match="1 failed"):
+        call_command("send_digest_emails", "--days=30")
+
+
+@pytest.mark.django_db
+def test_incremental_run_only_includes_the_delta(offices):
+    north, south = offices
+    add_staff("staff@example.com", north, south)
+    call_command("send_digest_emails", "--days=30", "--incremental")
+    run = DigestRun.watermark(30)
+    assert not run.is_incremental and run.sent == 1
+
+    mail.outbox.clear()
+    call_command("send_digest_emails", "--days=30", "--incremental")
+    assert mail.outbox == []
+
+    lot = Lot.objects.get(lot_number="N1")
+    lot.qty = 2
+    lot.save()
+    DigestRun.objects.update(as_of=datetime.date.today() - datetime.timedelta(days=1))
+    Lot.objects.filter(lot_number="S1").update(exp_date=datetime.date.today() - datetime.timedelta(days=1))
+    med = Medication.objects.get(generic_name="Amoxicillin")
+    Lot.objects.create(
+        office_medication=OfficeMedication.objects.get(office=south, medication=med),
+        lot_number="S2",
+        qty=3,
+        exp_date=datetime.date.today() + datetime.timedelta(days=30),
+    )
+
+    call_command("send_digest_emails", "--days=30", "--incremental")
+
+    body = mail.outbox[0].body
+    assert "lot N1 qty 2" in body
+    assert "lot S1" in body and "(expired)" in body
+    assert "lot S2" in body
+    assert DigestRun.watermark(30).is_incremental
+
+
+@pytest.mark.django_db
+def test_temporary_failure_does_not_advance_the_watermark(offices, settings):
+    add_staff("flaky@example.com", offices[0])
+    settings.EMAIL_BACKEND = "inventory.tests.test_digests.FlakyBackend"
+
+    with pytest.raises(CommandError):
+        call_command("send_digest_emails", "--days=30", "--incremental", "--retries=0")
+
+    assert DigestRun.watermark(30) is None
+
+
+@pytest.mark.django_db
+def test_permanent_failure_still_advances_the_watermark(offices, settings):
+    add_staff("ok@example.com", offices[0])
+    add_staff("bounce@example.com", offices[0])
+    settings.EMAIL_BACKEND = "inventory.tests.test_digests.FlakyBackend"
+
+    with pytest.raises(CommandError, match="1 failed"):
+        call_command("send_digest_emails", "--days=30", "--incremental")
+
+    run = DigestRun.watermark(30)
+    assert (run.sent, run.failed, run.failed_temporarily) == (1, 1, 0)
+
+
+@pytest.mark.django_db
+def test_digest_can_include_reorder_section(offices):
+    north, south = offices
+    OfficeMedication.objects.filter(office=south).update(reorder_threshold=100)
+    add_staff("south@example.com", south)
+
+    call_command("send_digest_emails", "--days=30", "--include-reorder")
+
+    body = mail.outbox[0].body
+    assert "Below reorder threshold:" in body
+    assert "Amoxicillin: 5 usable, reorder threshold 100" in body
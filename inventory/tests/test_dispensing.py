@@ -0,0 +1,181 @@
+import datetime
+import threading
+import time
+
+import pytest
+from django.db import OperationalError, connection, transaction
+from django.urls import reverse
+
+from inventory import audit, dispensing
+from inventory.dispensing import InsufficientStock, dispense
+from inventory.models import AuditLog, InventoryRollup, Lot, Medication, Office, OfficeMedication, User
+
+
+@pytest.fixture
+def office_med():
+    office = Office.objects.create(name="Office")
+    office_med = OfficeMedication.objects.create(office=office, medication=Medication.objects.create(generic_name="Med"))
+    today = datetime.date.today()
+    for number, days, qty in (("LATE", 60, 10), ("EXPIRED", -1, 50), ("SOON", 5, 3), ("MID", 20, 4)):
+        Lot.objects.create(
+            office_medication=office_med, lot_number=number, qty=qty, exp_date=today + datetime.timedelta(days=days)
+        )
+    return office_med
+
+
+def lots_by_number():
+    return {lot.lot_number: lot for lot in Lot.objects.all()}
+
+
+@pytest.mark.django_db
+def test_dispense_draws_first_expiring_lots_first(office_med):
+    result = dispense(office_med, 5)
+
+    assert [(row["lot_number"], row["dispensed"], row["remaining"]) for row in result["lots"]] == [
+        ("SOON", 3, 0),
+        ("MID", 2, 2),
+    ]
+    lots = lots_by_number()
+    assert (lots["SOON"].qty, lots["SOON"].status) == (0, Lot.Status.USED_UP)
+    assert (lots["MID"].qty, lots["MID"].status) == (2, Lot.Status.ACTIVE)
+    assert lots["EXPIRED"].qty == 50
+    assert InventoryRollup.objects.get(office_medication=office_med).total_qty == 62
+    assert AuditLog.objects.filter(entity_type="Lot", action=AuditLog.Action.UPDATE).count() == 2
+
+
+@pytest.mark.django_db
+def test_dispense_is_all_or_nothing(office_med):
+    with pytest.raises(InsufficientStock) as exc:
+        dispense(office_med, 18)
+
+    assert exc.value.available == 17
+    assert {number: lot.qty for number, lot in lots_by_number().items()} == {
+        "LATE": 10,
+        "EXPIRED": 50,
+        "SOON": 3,
+        "MID": 4,
+    }
+
+
+@pytest.mark.django_db
+def test_dispense_api(client, office_med):
+    client.force_login(User.objects.create_user(email="admin@example.com", password="pass", role=User.Role.ADMIN))
+    url = reverse("api-dispense", args=[office_med.pk])
+
+    response = client.post(url, {"qty": 4}, content_type="application/json")
+    assert response.status_code == 200
+    assert response.json()["lots"][0]["lot_number"] == "SOON"
+
+    assert client.post(url, {"qty": 100}, content_type="application/json").status_code == 409
+    assert client.post(url, {"qty": 0}, content_type="application/json").status_code == 400
+
+    client.force_login(User.objects.create_user(email="staff@example.com", password="pass"))
+    assert client.post(url, {"qty": 1}, content_type="application/json").status_code == 404
+
+
+def fail_first_rollup_refresh(monkeypatch):
+    calls = []
+    refresh = dispensing.refresh_inventory_rollups
+
+    def flaky_refresh(ids):
+        calls.append(ids)
+        if len(calls) == 1:
+            raise OperationalError("database is locked")
+        refresh(ids)
+
+    monkeypatch.setattr(dispensing, "refresh_inventory_rollups", flaky_refresh)
+    return calls
+
+
+@pytest.mark.django_db(transaction=True)
+def test_retried_dispense_keeps_no_audit_entries_from_the_failed_attempt(office_med, monkeypatch):
+    calls = fail_first_rollup_refresh(monkeypatch)
+
+    with audit.buffered(max_size=100, max_age=60):
+        dispense(office_med, 5)
+
+    assert len(calls) == 2
+    assert AuditLog.objects.filter(entity_type="Lot", action=AuditLog.Action.UPDATE).count() == 2
+    assert lots_by_number()["MID"].qty == 2
+
+
+@pytest.mark.django_db
+def test_dispense_inside_a_transaction_is_not_retried(office_med, monkeypatch):
+    calls = fail_first_rollup_refresh(monkeypatch)
+
+    with pytest.raises(OperationalError):
+        with transaction.atomic():
+            dispense(office_med, 5)
+
+    assert len(calls) == 1
+
+
+@pytest.mark.skipif(connection.vendor != "postgresql", reason="SQLite locks whole tables, so SKIP LOCKED is a no-op")
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_dispenses_lose_no_updates(office_med, record_property):
+    threads, per_thread = 8, 5
+    successes, failures, errors = [], [], []
+    start = threading.Barrier(threads)
+
+    def worker():
+        try:
+            start.wait()
+            for _ in range(per_thread):
+                try:
+                    successes.append(dispense(office_med, 1))
+                except InsufficientStock:
+                    failures.append(1)
+        except Exception as exc:
+            errors.append(exc)
+        finally:
+            connection.close()
+
+    started = time.monotonic()
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    elapsed = time.monotonic() - started
+    record_property("dispenses_per_second", round(len(successes) / elapsed, 1))
+
+    assert errors == []
+    assert len(successes) == 17
+    assert len(failures) == threads * per_thread - 17
+    lots = lots_by_number()
+    assert sum(lot.qty for number, lot in lots.items() if number != "EXPIRED") == 0
+    assert all(lot.status == Lot.Status.USED_UP for number, lot in lots.items() if number != "EXPIRED")
+
+
+@pytest.mark.skipif(connection.vendor != "sqlite", reason="PostgreSQL runs the row-locking test above")
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_dispenses_lose_no_updates_on_sqlite(office_med):
+    threads, per_thread = 4, 5
+    dispensed, errors = [], []
+    start = threading.Barrier(threads)
+
+    def worker():
+        try:
+            start.wait()
+            for _ in range(per_thread):
+                try:
+                    dispensed.append(dispense(office_med, 1)["dispensed"])
+                except (InsufficientStock, OperationalError):
+                    # SQLite serializes writers; a dispense that stays locked out is rolled back.
+                    continue
+        except Exception as exc:
+            errors.append(exc)
+        finally:
+            connection.close()
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+
+    assert errors == []
+    assert dispensed
+    lots = lots_by_number()
+    assert 17 - sum(lot.qty for number, lot in lots.items() if number != "EXPIRED") == sum(dispensed)
+    assert AuditLog.objects.filter(entity_type="Lot", action=AuditLog.Action.UPDATE).count() == sum(dispensed)
@@ -0,0 +1,74 @@
+import datetime
+import tracemalloc
+
+import pytest
+from django.urls import reverse
+
+from inventory.models import AuditLog, Lot, Medication, Office, OfficeMedication, User
+from inventory.views import OfficeExpirationsExportView
+
+
+def seed_lots(office, count):
+    med = Medication.objects.create(generic_name=f"Med {count}")
+    office_med = OfficeMedication.objects.create(office=office, medication=med)
+    exp_date = datetime.date.today() + datetime.timedelta(days=10)
+    Lot.objects.bulk_create(
+        Lot(office_medication=office_med, lot_number=f"L{index:06d}", qty=index + 1, exp_date=exp_date)
+        for index in range(count)
+    )
+
+
+def export_peak_memory(client, office):
+    tracemalloc.start()
+    try:
+        response = client.get(reverse("office-expiring-export", args=[office.pk]), {"days": 30})
+        lines = sum(chunk.count(b"\n") for chunk in response.streaming_content)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return lines, peak
+
+
+@pytest.mark.django_db
+def test_office_export_streams_csv_rows(role_admin_client):
+    office = Office.objects.create(name="Office")
+    seed_lots(office, 3)
+
+    response = role_admin_client.get(reverse("office-expiring-export", args=[office.pk]))
+
+    assert response.streaming
+    content = b"".join(response.streaming_content).decode().splitlines()
+    assert content[0] == "Medication,Lot,Quantity,Expiration Date"
+    assert content[1].startswith("Med 3,L000000,1,")
+    assert AuditLog.objects.filter(action=AuditLog.Action.EXPORT).count() == 1
+
+
+@pytest.mark.django_db
+def test_office_export_memory_stays_flat_as_rows_grow(role_admin_client, monkeypatch):
+    monkeypatch.setattr(OfficeExpirationsExportView, "chunk_size", 100)
+    small = Office.objects.create(name="Small")
+    large = Office.objects.create(name="Large")
+    seed_lots(small, 500)
+    seed_lots(large, 5000)
+    export_peak_memory(role_admin_client, small)
+
+    small_lines, small_peak = export_peak_memory(role_admin_client, small)
+    large_lines, large_peak = export_peak_memory(role_admin_client, large)
+
+    assert (small_lines, large_lines) == (501, 5001)
+    assert large_peak < small_peak * 2
+
+
+@pytest.mark.django_db
+def test_organization_export_is_admin_only(client, role_admin_client):
+    seed_lots(Office.objects.create(name="North"), 2)
+    seed_lots(Office.objects.create(name="South"), 2)
+
+    response = role_admin_client.get(reverse("expiring-export"))
+    rows = b"".join(response.streaming_content).decode().splitlines()
+    assert rows[0] == "Office,Medication,Lot,Quantity,Expiration Date"
+    assert len(rows) == 5
+
+    staff = User.objects.create_user(email="staff@example.com", password="pass", role=User.Role.STAFF)
+    client.force_login(staff)
+    assert client.get(reverse("expiring-export")).status_code == 403
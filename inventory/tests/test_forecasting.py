@@ -0,0 +1,107 @@
+import datetime
+
+import numpy as np
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from inventory.forecasting import forecast_expiry_waste, project_waste, usage_rates
+from inventory.models import AuditLog, Lot, Medication, Office, OfficeMedication, User
+
+
+def fefo_waste(quantities, days_to_expiry, rate):
+    remaining = list(quantities)
+    for day in range(1, max(days_to_expiry) + 1):
+        need = rate
+        for index, expires in enumerate(days_to_expiry):
+            if expires >= day and need > 0:
+                taken = min(remaining[index], need)
+                remaining[index] -= taken
+                need -= taken
+    return remaining
+
+
+def test_projection_matches_day_by_day_fefo_simulation():
+    rng = np.random.default_rng(7)
+    groups, quantities, days, rates = [], [], [], []
+    for group in range(40):
+        count = int(rng.integers(1, 6))
+        groups += [group] * count
+        quantities += rng.integers(0, 40, count).tolist()
+        days += sorted(rng.integers(0, 90, count).tolist())
+        rates.append(int(rng.integers(0, 4)))
+
+    used, waste = project_waste(groups, quantities, days, rates)
+
+    expected = []
+    for group, rate in enumerate(rates):
+        members = [index for index, value in enumerate(groups) if value == group]
+        expected += fefo_waste([quantities[i] for i in members], [days[i] for i in members], rate)
+    np.testing.assert_allclose(waste, expected, atol=1e-6)
+    np.testing.assert_allclose(used + waste, quantities)
+
+
+@pytest.fixture
+def office_med():
+    office = Office.objects.create(name="Office")
+    return OfficeMedication.objects.create(office=office, medication=Medication.objects.create(generic_name="Med"))
+
+
+def consume(lot, *quantities):
+    for qty in quantities:
+        lot.qty = qty
+        lot.save()
+        AuditLog.log(None, AuditLog.Action.UPDATE, lot)
+
+
+@pytest.mark.django_db
+def test_usage_rate_comes_from_audited_quantity_drops(office_med):
+    lot = Lot.objects.create(office_medication=office_med, qty=100, exp_date=datetime.date.today())
+    AuditLog.log(None, AuditLog.Action.CREATE, lot)
+    consume(lot, 70, 80, 50)
+
+    assert usage_rates([office_med.pk], 30).tolist() == [pytest.approx(60 / 30)]
+
+
+@pytest.mark.django_db
+def test_usage_rate_only_reads_history_of_the_scoped_lots(office_med):
+    other = OfficeMedication.objects.create(
+        office=Office.objects.create(name="Other"), medication=office_med.medication
+    )
+    for office_medication in (office_med, other):
+        lot = Lot.objects.create(office_medication=office_medication, qty=100, exp_date=datetime.date.today())
+        AuditLog.log(None, AuditLog.Action.CREATE, lot)
+        consume(lot, 40)
+
+    with CaptureQueriesContext(connection) as ctx:
+        rates = usage_rates([office_med.pk], 30)
+
+    assert rates.tolist() == [pytest.approx(60 / 30)]
+    (history,) = [query["sql"] for query in ctx.captured_queries if 'FROM "inventory_auditlog"' in query["sql"]]
+    assert 'FROM "inventory_lot"' in history
+
+
+@pytest.mark.django_db
+def test_forecast_flags_lots_that_will_expire_unused(client, office_med):
+    today = datetime.date.today()
+    history = Lot.objects.create(office_medication=office_med, qty=90, exp_date=today + datetime.timedelta(days=200))
+    AuditLog.log(None, AuditLog.Action.CREATE, history)
+    consume(history, 0)
+    soon, _ = (
+        Lot.objects.create(
+            office_medication=office_med, lot_number=number, qty=30, exp_date=today + datetime.timedelta(days=days)
+        )
+        for number, days in (("SOON", 10), ("LATER", 40))
+    )
+
+    forecast = forecast_expiry_waste(horizon_days=60, lookback_days=90)
+
+    row = forecast["medications"][0]
+    assert (row["daily_usage"], row["expiring_qty"]) == (1.0, 60)
+    assert [(lot["lot_id"], lot["projected_waste"]) for lot in forecast["lots"]] == [(soon.pk, 20)]
+
+    client.force_login(User.objects.create_user(email="admin@example.com", password="pass", role=User.Role.ADMIN))
+    assert client.get(reverse("api-report-forecast"), {"horizon": 60}).json()["lots"][0]["lot_number"] == "SOON"
+    assert client.get(reverse("api-report-forecast"), {"horizon": "x"}).status_code == 400
+    assert b"SOON" in client.get(reverse("forecast"), {"horizon": 60}).content
@@ -0,0 +1,133 @@
+import datetime
+import io
+import time
+
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.urls import reverse
+
+from inventory.imports import import_lots_csv
+from inventory.models import AuditLog, InventoryRollup, Lot, Medication, Office, OfficeMedication, User
+
+
+@pytest.fixture
+def office():
+    office = Office.objects.create(name="Office")
+    for name, ndc in (("Amoxicillin", "0093-4155-73"), ("Ibuprofen", "")):
+        OfficeMedication.objects.create(office=office, medication=Medication.objects.create(generic_name=name, ndc=ndc))
+    return office
+
+
+def future(days=30):
+    return (datetime.date.today() + datetime.timedelta(days=days)).isoformat()
+
+
+@pytest.mark.django_db
+def test_import_creates_valid_rows_and_reports_errors(office):
+    csv_text = (
+        "Medication,NDC,Lot Number,Qty,Exp Date\n"
+        f",0093-4155-73,A1,10,{future()}\n"
+        f"ibuprofen,,B2,5,{future(90)}\n"
+        f"Unknown,,C3,5,{future()}\n"
+        f"Ibuprofen,,D4,many,{future()}\n"
+        "Ibuprofen,,E5,5,2000-01-01\n"
+    )
+
+    result = import_lots_csv(office, io.StringIO(csv_text), source="upload.csv")
+
+    assert (result["rows"], result["created"]) == (5, 2)
+    assert [line for line, _ in result["errors"]] == [4, 5, 6]
+    assert sorted(Lot.objects.values_list("lot_number", flat=True)) == ["A1", "B2"]
+    audit = AuditLog.objects.get(action=AuditLog.Action.IMPORT)
+    assert audit.snapshot_json["created"] == 2
+    assert audit.snapshot_json["skipped"] == 3
+    assert sum(InventoryRollup.objects.values_list("total_qty", flat=True)) == 15
+
+
+@pytest.mark.django_db
+def test_import_reports_values_that_do_not_fit_the_columns(office):
+    csv_text = (
+        "Medication,Lot Number,Qty,Exp Date\n"
+        f"Ibuprofen,{'L' * 101},5,{future()}\n"
+        f"Ibuprofen,F6,2147483648,{future()}\n"
+        f"Ibuprofen,G7,2147483647,{future()}\n"
+    )
+
+    result = import_lots_csv(office, io.StringIO(csv_text))
+
+    assert result["created"] == 1
+    assert result["errors"] == [
+        (2, "Lot number cannot be longer than 100 characters."),
+        (3, "Quantity cannot be more than 2147483647."),
+    ]
+
+
+@pytest.mark.django_db
+def test_import_rejects_missing_columns(office):
+    result = import_lots_csv(office, io.StringIO("lot_number,qty\nA1,3\n"))
+    assert result["created"] == 0
+    assert result["errors"][0][0] == 1
+    assert not AuditLog.objects.exists()
+
+
+@pytest.mark.django_db
+def test_import_command_handles_large_files_quickly(office, tmp_path):
+    path = tmp_path / "lots.csv"
+    exp_date = future()
+    path.write_text(
+        "medication,lot_number,qty,exp_date\n"
+        + "".join(f"Amoxicillin,L{index},1,{exp_date}\n" for index in range(20000))
+    )
+
+    started = time.monotonic()
+    call_command("import_lots", str(path), office=office.pk, stdout=io.StringIO())
+
+    assert time.monotonic() - started < 10
+    assert Lot.objects.count() == 20000
+    assert AuditLog.objects.filter(action=AuditLog.Action.IMPORT).count() == 1
+
+
+@pytest.mark.django_db
+def test_import_view_requires_membership(client, office):
+    outsider = User.objects.create_user(email="staff@example.com", password="pass", role=User.Role.STAFF)
+    client.force_login(outsider)
+    upload = SimpleUploadedFile("lots.csv", f"medication,qty,exp_date\nIbuprofen,3,{future()}\n".encode())
+
+    response = client.post(reverse("lot-import", args=[office.pk]), {"file": upload})
+
+    assert response.url == reverse("offices")
+    assert not Lot.objects.exists()
+
+
+@pytest.mark.django_db
+def test_import_view_accepts_upload(client, office):
+    admin = User.objects.create_user(email="admin@example.com", password="pass", role=User.Role.ADMIN)
+    client.force_login(admin)
+    upload = SimpleUploadedFile("lots.csv", f"﻿medication,qty,exp_date\nIbuprofen,3,{future()}\n".encode())
+
+    client.post(reverse("lot-import", args=[office.pk]), {"file": upload})
+
+    assert Lot.objects.get().qty == 3
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "content",
+    [
+        "medication,qty,exp_date\nIbuprofène,3,2031-01-01\n".encode("latin-1"),
+        b"medication,qty,exp_date\n" + b"x" * 200000 + b",3,2031-01-01\n",
+    ],
+    ids=["latin-1", "oversized-field"],
+)
+def test_import_view_reports_unreadable_files(client, office, content):
+    admin = User.objects.create_user(email="admin@example.com", password="pass", role=User.Role.ADMIN)
+    client.force_login(admin)
+    upload = SimpleUploadedFile("lots.csv", content)
+
+    response = client.post(reverse("lot-import", args=[office.pk]), {"file": upload}, follow=True)
+
+    assert response.status_code == 200
+    errors = [str(message) for message in response.context["messages"]]
+    assert any(error.startswith("Could not read lots.csv as a UTF-8 CSV file") for error in errors)
+    assert not Lot.objects.exists()
@@ -0,0 +1,53 @@
+import datetime
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from inventory.models import Lot, Medication, Office, OfficeMedication
+from inventory.services import lots_expired, lots_expiring_within, refresh_inventory_rollups
+
+
+def explain(sql):
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute("EXPLAIN " + sql)
+        else:
+            cursor.execute("EXPLAIN QUERY PLAN " + sql)
+        return "\n".join(str(row) for row in cursor.fetchall())
+
+
+def plan_for(run):
+    with CaptureQueriesContext(connection) as ctx:
+        run()
+    lot_queries = [q["sql"] for q in ctx.captured_queries if "inventory_lot" in q["sql"]]
+    assert len(lot_queries) == 1
+    return explain(lot_queries[0])
+
+
+@pytest.fixture
+def office():
+    office = Office.objects.create(name="Office")
+    med = Medication.objects.create(generic_name="Med")
+    office_med = OfficeMedication.objects.create(office=office, medication=med)
+    today = datetime.date.today()
+    for offset in (-5, 10, 45, 120):
+        Lot.objects.create(office_medication=office_med, qty=5, exp_date=today + datetime.timedelta(days=offset))
+    return office
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "run, index",
+    [
+        (lambda office: list(lots_expiring_within(30)), "lot_active_exp_idx"),
+        (lambda office: list(lots_expiring_within(30, office=office)), "lot_active_om_exp_idx"),
+        (lambda office: list(lots_expiring_within(30, office=Office.objects.filter(pk=office.pk))), "lot_active_om_exp_idx"),
+        (lambda office: list(lots_expired()), "lot_active_exp_idx"),
+        (lambda office: list(lots_expired(office=office)), "lot_active_om_exp_idx"),
+        (lambda office: refresh_inventory_rollups(office.office_medications.values_list("pk", flat=True)), "lot_active_om_exp_idx"),
+    ],
+)
+def test_expiry_reports_use_partial_indexes(office, run, index):
+    assert index in plan_for(lambda: run(office))
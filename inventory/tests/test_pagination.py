@@ -0,0 +1,64 @@
+import datetime
+import json
+from base64 import urlsafe_b64encode
+
+import pytest
+from django.urls import reverse
+
+from inventory.models import Lot, Medication, Office, OfficeMedication
+
+
+@pytest.fixture
+def lots():
+    office = Office.objects.create(name="Office")
+    med = Medication.objects.create(generic_name="Med")
+    office_med = OfficeMedication.objects.create(office=office, medication=med)
+    today = datetime.date.today()
+    created = [
+        Lot.objects.create(office_medication=office_med, qty=1, exp_date=today + datetime.timedelta(days=offset))
+        for offset in (5, 5, 5, 10, 20, 20, 40)
+    ]
+    return office, sorted(created, key=lambda lot: (lot.exp_date, lot.pk))
+
+
+@pytest.mark.django_db
+def test_keyset_pages_walk_forward_and_back_without_gaps(role_admin_client, lots):
+    office, expected = lots
+    url = reverse("api-office-lots", args=[office.pk]) + "?page_size=3"
+
+    pages = []
+    while url:
+        payload = role_admin_client.get(url).json()
+        pages.append([row["id"] for row in payload["results"]])
+        url = payload["next"]
+
+    assert pages == [[lot.pk for lot in expected[i : i + 3]] for i in (0, 3, 6)]
+    assert payload["previous"] is not None
+    back = role_admin_client.get(payload["previous"]).json()
+    assert [row["id"] for row in back["results"]] == pages[1]
+
+
+@pytest.mark.django_db
+def test_report_endpoint_paginates_and_can_opt_out(role_admin_client, lots):
+    _, expected = lots
+    url = reverse("api-report-expiring")
+
+    first = role_admin_client.get(url, {"days": 30, "page_size": 2}).json()
+    assert [row["id"] for row in first["results"]] == [lot.pk for lot in expected[:2]]
+    assert first["previous"] is None
+
+    legacy = role_admin_client.get(url, {"days": 30, "paginate": "false"}).json()
+    assert [row["id"] for row in legacy] == [lot.pk for lot in expected[:6]]
+
+
+def encoded(payload):
+    return urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "cursor", ["not-a-cursor", encoded({"p": ["nope", "x"]}), encoded({"p": ["2030-01-01", "x"], "r": 1})]
+)
+def test_invalid_cursor_returns_404(role_admin_client, lots, cursor):
+    response = role_admin_client.get(reverse("api-report-expired"), {"cursor": cursor})
+    assert response.status_code == 404
@@ -0,0 +1,144 @@
+import datetime
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from inventory.models import AuditLog, InventoryRollup, Lot, Medication, Office, OfficeMembership, User
+from inventory.recalls import quarantine_lots, recall_criteria, recall_rows, recalled_lots
+
+
+@pytest.fixture
+def offices():
+    today = datetime.date.today()
+    amoxicillin = Medication.objects.create(generic_name="Amoxicillin", ndc="0093-4155-73")
+    ibuprofen = Medication.objects.create(generic_name="Ibuprofen", ndc="12345-678-90")
+    north, south = Office.objects.create(name="North"), Office.objects.create(name="South")
+    for office, lot_number, status in (
+        (north, "AB-123", Lot.Status.ACTIVE),
+        (south, "ab 123", Lot.Status.ACTIVE),
+        (south, "AB123", Lot.Status.DISCARDED),
+        (south, "ZZ-9", Lot.Status.ACTIVE),
+    ):
+        office_med, _ = office.office_medications.get_or_create(medication=amoxicillin)
+        Lot.objects.create(
+            office_medication=office_med,
+            lot_number=lot_number,
+            qty=10,
+            exp_date=today + datetime.timedelta(days=30),
+            status=status,
+        )
+    Lot.objects.create(
+        office_medication=north.office_medications.create(medication=ibuprofen),
+        lot_number="AB-123",
+        qty=5,
+        exp_date=today + datetime.timedelta(days=30),
+    )
+    return {"north": north, "south": south}
+
+
+def found(lots):
+    return [(row["office"], row["medication"], row["lot_number"]) for row in recall_rows(lots)]
+
+
+@pytest.mark.django_db
+def test_recall_matches_normalized_lot_numbers_and_ndc_across_offices(offices):
+    criteria = recall_criteria("ab123", "")
+    assert criteria == {"lot_numbers": ["AB123"], "ndc": ""}
+    assert found(recalled_lots(None, **criteria)) == [
+        ("North", "Amoxicillin", "AB-123"),
+        ("North", "Ibuprofen", "AB-123"),
+        ("South", "Amoxicillin", "ab 123"),
+    ]
+    assert found(recalled_lots(None, **recall_criteria("AB-123, zz9", "0093-4155"))) == [
+        ("North", "Amoxicillin", "AB-123"),
+        ("South", "Amoxicillin", "ab 123"),
+        ("South", "Amoxicillin", "ZZ-9"),
+    ]
+    assert found(recalled_lots([offices["north"].pk], **recall_criteria("", "12345-678"))) == [
+        ("North", "Ibuprofen", "AB-123")
+    ]
+    with pytest.raises(ValueError):
+        recall_criteria(" , ", "")
+    with pytest.raises(ValueError):
+        recall_criteria("", "93")
+
+
+@pytest.mark.django_db
+def test_recall_lookup_uses_lot_number_index(offices):
+    with CaptureQueriesContext(connection) as ctx:
+        list(recalled_lots(None, **recall_criteria("AB-123", "")))
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute("EXPLAIN " + ctx.captured_queries[0]["sql"])
+        else:
+            cursor.execute("EXPLAIN QUERY PLAN " + ctx.captured_queries[0]["sql"])
+        plan = "\n".join(str(row) for row in cursor.fetchall())
+    assert "lot_number_norm_idx" in plan
+
+
+@pytest.mark.django_db
+def test_quarantine_flips_matches_in_one_update_and_versions_each_lot(offices):
+    lots = recalled_lots(None, **recall_criteria("AB-123", "0093-4155"))
+
+    with CaptureQueriesContext(connection) as ctx:
+        result = quarantine_lots(lots, criteria={"lot_numbers": ["AB123"]})
+
+    assert result["quarantined"] == 2
+    assert len([q for q in ctx.captured_queries if q["sql"].startswith('UPDATE "inventory_lot"')]) == 1
+    assert Lot.objects.filter(status=Lot.Status.QUARANTINED).count() == 2
+    assert not Lot.objects.active().filter(pk__in=result["lot_ids"]).exists()
+    entry = AuditLog.objects.get(entity_type="system")
+    assert (entry.snapshot_json["type"], entry.snapshot_json["quarantined"]) == ("recall_quarantine", 2)
+    versions = AuditLog.objects.filter(entity_type="Lot").values_list("entity_id", "snapshot_json__status")
+    assert sorted(versions) == sorted((str(pk), Lot.Status.QUARANTINED) for pk in result["lot_ids"])
+    assert InventoryRollup.objects.get(office=offices["south"]).total_qty == 10
+
+    assert [row["status"] for row in recall_rows(lots)] == [Lot.Status.QUARANTINED] * 2
+    assert quarantine_lots(lots)["quarantined"] == 0
+
+
+@pytest.mark.django_db
+def test_recall_api_and_page_are_scoped_to_the_users_offices(client, offices):
+    staff = User.objects.create_user(email="staff@example.com", password="pass")
+    OfficeMembership.objects.create(user=staff, office=offices["south"])
+    client.force_login(staff)
+
+    response = client.get(reverse("api-recalls"), {"lot_numbers": "AB-123"})
+    assert [row["office"] for row in response.json()["results"]] == ["South"]
+    assert client.get(reverse("api-recalls")).status_code == 400
+
+    response = client.post(
+        reverse("api-recall-quarantine"), {"lot_numbers": "AB-123"}, content_type="application/json"
+    )
+    assert response.json()["quarantined"] == 1
+    assert Lot.objects.get(office_medication__office=offices["north"], lot_number="AB-123", qty=10).status == "active"
+
+    page = client.get(reverse("recall"), {"lot_numbers": "zz-9"}).content.decode()
+    assert "ZZ-9" in page and "Quarantine all matches" in page
+
+    response = client.post(reverse("recall"), {"lot_numbers": "zz-9", "ndc": ""})
+    assert response.url == reverse("recall") + "?lot_numbers=zz-9&ndc="
+    assert Lot.objects.get(lot_number="ZZ-9").status == Lot.Status.QUARANTINED
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("ndc", ["0093-4155-73", "00093-4155-73", "0093-4155"])
+def test_package_ndc_matches_product_ndc_in_catalog(ndc):
+    medication = Medication.objects.create(generic_name="Amoxicillin", ndc="0093-4155")
+    office_med = Office.objects.create(name="North").office_medications.create(medication=medication)
+    Lot.objects.create(office_medication=office_med, lot_number="L1", qty=1, exp_date=datetime.date.today())
+
+    assert found(recalled_lots(None, **recall_criteria("", ndc))) == [("North", "Amoxicillin", "L1")]
+
+
+@pytest.mark.django_db
+def test_lots_loaded_from_fixtures_match_recalls():
+    call_command("loaddata", "fixtures/seed.json", verbosity=0)
+
+    lot = Lot.objects.get(lot_number="EPI-991")
+    assert lot.lot_number_normalized == "EPI991"
+    assert [row["lot_id"] for row in recall_rows(recalled_lots(None, **recall_criteria("epi 991", "")))] == [lot.pk]
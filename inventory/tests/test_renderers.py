@@ -0,0 +1,60 @@
+import datetime
+
+import pytest
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework.renderers import JSONRenderer
+
+from inventory import renderers
+from inventory.models import Lot, Medication, Office, OfficeMedication, User
+from inventory.renderers import FastJSONRenderer
+from inventory.serializers import LotSerializer, ReportLotSerializer
+
+
+@pytest.fixture
+def lots():
+    office = Office.objects.create(name="Clínica \"Norte\"\u2029")
+    today = datetime.date.today()
+    for index, name in enumerate(["Amoxicillin", "Ibuprofeno 💊", "Line\u2028sep"]):
+        medication = Medication.objects.create(generic_name=name)
+        office_med = OfficeMedication.objects.create(office=office, medication=medication)
+        Lot.objects.create(
+            office_medication=office_med,
+            lot_number=f"L{index}",
+            qty=index,
+            exp_date=today + datetime.timedelta(days=index),
+            received_date=today if index % 2 else None,
+        )
+    return Lot.objects.order_by("exp_date", "id")
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("serializer_class", [ReportLotSerializer, LotSerializer])
+@pytest.mark.parametrize("encoder", ["orjson", "stdlib"])
+def test_fast_path_matches_serializer_output(lots, serializer_class, encoder, monkeypatch):
+    if encoder == "stdlib":
+        monkeypatch.setattr(renderers, "orjson", None)
+    expected = JSONRenderer().render(serializer_class(lots, many=True).data)
+
+    fast = FastJSONRenderer().render(serializer_class.rows(serializer_class.values(lots)))
+
+    assert fast == expected
+    assert b"\\u2028" in fast
+
+
+@pytest.mark.django_db
+def test_report_endpoint_renders_values_rows(client, lots):
+    client.force_login(User.objects.create_user(email="admin@example.com", password="pass", role=User.Role.ADMIN))
+    expected = JSONRenderer().render(ReportLotSerializer(lots, many=True).data)
+
+    response = client.get(reverse("api-report-expiring"), {"paginate": "false"})
+
+    assert response.content == expected
+
+
+@pytest.mark.django_db
+def test_benchmark_command_checks_output_and_reports_speedup(capsys):
+    call_command("benchmark_report_json", "--lots=200", "--repeat=1")
+
+    assert "Speedup:" in capsys.readouterr().out
+    assert not Lot.objects.exists()
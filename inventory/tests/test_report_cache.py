@@ -0,0 +1,180 @@
+import datetime
+
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from inventory import caching
+from inventory.models import InventoryRollup, Lot, Medication, Office, OfficeMedication, User
+
+
+@pytest.fixture(params=["locmem", "file"])
+def cache_backend(request, settings, tmp_path):
+    backends = {
+        "locmem": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "report-tests"},
+        "file": {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": str(tmp_path)},
+    }
+    settings.CACHES = {"default": backends[request.param]}
+    return request.param
+
+
+@pytest.fixture
+def offices():
+    med = Medication.objects.create(generic_name="Amoxicillin")
+    soon = datetime.date.today() + datetime.timedelta(days=10)
+    lots = {}
+    for name in ("North", "South"):
+        office = Office.objects.create(name=name)
+        office_med = OfficeMedication.objects.create(office=office, medication=med)
+        lots[name] = Lot.objects.create(office_medication=office_med, qty=5, exp_date=soon)
+    return lots
+
+
+def lot_queries(queries):
+    # The conditional-GET validator aggregates the lots; only row queries count here.
+    return [query for query in queries if 'FROM "inventory_lot"' in query["sql"] and "COUNT(" not in query["sql"]]
+
+
+def report_stats():
+    return caching.stats()[caching.REPORTS]
+
+
+@pytest.mark.django_db
+def test_lot_edit_invalidates_only_the_affected_office(cache_backend, client, offices, django_capture_on_commit_callbacks):
+    admin = User.objects.create_user(email="admin@example.com", password="pass", role=User.Role.ADMIN)
+    client.force_login(admin)
+    url = reverse("api-report-expiring")
+    north, south = offices["North"], offices["South"]
+
+    def report(lot):
+        return client.get(url, {"days": 30, "office_id": lot.office_medication.office_id}).json()["results"]
+
+    assert [row["qty"] for row in report(north)] == [5]
+    assert [row["qty"] for row in report(south)] == [5]
+    assert report_stats() == {"hits": 0, "misses": 2}
+
+    with django_capture_on_commit_callbacks(execute=True):
+        north.qty = 7
+        north.save()
+
+    assert [row["qty"] for row in report(north)] == [7]
+    assert report_stats() == {"hits": 0, "misses": 3}
+    assert [row["qty"] for row in report(south)] == [5]
+    assert report_stats() == {"hits": 1, "misses": 3}
+
+
+@pytest.mark.django_db
+def test_cached_reports_skip_lot_queries(cache_backend, client, offices):
+    admin = User.objects.create_user(email="admin@example.com", password="pass", role=User.Role.ADMIN)
+    client.force_login(admin)
+
+    for name in ("api-report-expiring", "api-report-expired", "api-report-inventory", "reports"):
+        first = client.get(reverse(name))
+        with CaptureQueriesContext(connection) as ctx:
+            second = client.get(reverse(name))
+        assert second.status_code == first.status_code == 200
+        assert lot_queries(ctx.captured_queries) == []
+        if name != "reports":
+            assert second.json() == first.json()
+
+
+@pytest.mark.django_db
+def test_report_key_changes_with_date_and_office_version(cache_backend, offices, monkeypatch):
+    office_id = offices["North"].office_medication.office_id
+    key = caching.report_key("api-expiring", [office_id], days=30)
+
+    assert caching.report_key("api-expiring", [office_id], days=30) == key
+    caching.invalidate_offices([office_id])
+    bumped = caching.report_key("api-expiring", [office_id], days=30)
+    assert bumped != key
+
+    tomorrow = datetime.date.today() + datetime.timedelta(days=1)
+    monkeypatch.setattr(caching.timezone, "localdate", lambda: tomorrow)
+    assert caching.report_key("api-expiring", [office_id], days=30) != bumped
+
+
+@pytest.mark.django_db
+def test_unchanged_report_returns_not_modified(client, offices, django_capture_on_commit_callbacks):
+    admin = User.objects.create_user(email="admin@example.com", password="pass", role=User.Role.ADMIN)
+    client.force_login(admin)
+    url = reverse("api-report-expiring")
+    first = client.get(url)
+
+    with CaptureQueriesContext(connection) as ctx:
+        cached = client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+    assert cached.status_code == 304
+    assert cached["ETag"] == first["ETag"]
+    assert lot_queries(ctx.captured_queries) == []
+
+    with django_capture_on_commit_callbacks(execute=True):
+        offices["South"].qty = 1
+        offices["South"].save()
+    changed = client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+    assert changed.status_code == 200
+    assert changed["ETag"] != first["ETag"]
+
+
+@pytest.mark.django_db
+def test_office_lot_list_honours_validators(client, offices):
+    admin = User.objects.create_user(email="admin@example.com", password="pass", role=User.Role.ADMIN)
+    client.force_login(admin)
+    north = offices["North"].office_medication.office
+    url = reverse("api-office-lots", args=[north.pk])
+    first = client.get(url)
+
+    assert client.get(url, HTTP_IF_MODIFIED_SINCE=first["Last-Modified"]).status_code == 304
+    assert client.get(url, HTTP_IF_NONE_MATCH=first["ETag"]).status_code == 304
+
+    south = offices["South"].office_medication.office
+    assert client.get(reverse("api-office-lots", args=[south.pk]), HTTP_IF_NONE_MATCH=first["ETag"]).status_code == 200
+
+
+@pytest.mark.django_db
+def test_validators_see_writes_that_skip_cache_invalidation(client, offices):
+    admin = User.objects.create_user(email="admin@example.com", password="pass", role=User.Role.ADMIN)
+    client.force_login(admin)
+    url = reverse("api-report-expiring")
+    first = client.get(url)
+
+    # Another process (an import or a second worker) never bumps this process's cache.
+    Lot.objects.filter(pk=offices["South"].pk).update(
+        qty=1, updated_at=timezone.now() + datetime.timedelta(seconds=5)
+    )
+
+    changed = client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+    assert changed.status_code == 200
+    assert sorted(row["qty"] for row in changed.json()["results"]) == [1, 5]
+    assert client.get(url, HTTP_IF_MODIFIED_SINCE=first["Last-Modified"]).status_code == 200
+
+
+@pytest.mark.django_db
+def test_validators_do_not_depend_on_process_local_cache_state(client, offices):
+    admin = User.objects.create_user(email="admin@example.com", password="pass", role=User.Role.ADMIN)
+    client.force_login(admin)
+    url = reverse("api-report-expiring")
+    first = client.get(url)
+
+    # A different worker starts with its own empty cache and fresh office versions.
+    cache.clear()
+
+    again = client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+    assert again.status_code == 304
+    assert client.get(url, HTTP_IF_MODIFIED_SINCE=first["Last-Modified"]).status_code == 304
+
+
+@pytest.mark.django_db
+def test_cached_reports_see_writes_that_skip_cache_invalidation(cache_backend, client, offices):
+    admin = User.objects.create_user(email="admin@example.com", password="pass", role=User.Role.ADMIN)
+    client.force_login(admin)
+    url = reverse("api-report-inventory")
+    first = client.get(url).json()
+
+    Lot.objects.filter(pk=offices["South"].pk).update(
+        qty=1, updated_at=timezone.now() + datetime.timedelta(seconds=5)
+    )
+    InventoryRollup.objects.filter(office_medication=offices["South"].office_medication).update(total_qty=1)
+
+    assert client.get(url).json() != first
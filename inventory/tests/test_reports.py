@@ -1,9 +1,18 @@
 import datetime
 
 import pytest
+from django.urls import reverse
 
-from inventory.models import Lot, Medication, Office, OfficeMedication
-from inventory.services import inventory_summary, lots_expired, lots_expiring_within
+from inventory.models import Lot, Medication, Office, OfficeMedication, User
+from inventory.services import (
+    expiry_histogram,
+    expiry_overview,
+    inventory_summary,
+    lots_expired,
+    lots_expiring_within,
+    refresh_inventory_rollups,
+    reorder_report,
+)
 
 
 @pytest.mark.django_db
@@ -54,3 +63,118 @@ def test_inventory_summary_groups_by_office():
     summary = inventory_summary()
     assert office.name in summary
     assert summary[office.name][0]["total_qty"] == 5
+
+
+@pytest.mark.django_db
+def test_expiry_overview_counts_windows_and_flags_offices():
+    today = datetime.date.today()
+    busy = Office.objects.create(name="Busy")
+    quiet = Office.objects.create(name="Quiet")
+    med = Medication.objects.create(generic_name="Med")
+    busy_med = OfficeMedication.objects.create(office=busy, medication=med)
+    quiet_med = OfficeMedication.objects.create(office=quiet, medication=med)
+    for offset in (-3, 5, 45, 80):
+        Lot.objects.create(office_medication=busy_med, qty=1, exp_date=today + datetime.timedelta(days=offset))
+    Lot.objects.create(office_medication=quiet_med, qty=1, exp_date=today + datetime.timedelta(days=200))
+
+    overview = expiry_overview(offices=Office.objects.all())
+
+    assert overview["windows"] == {30: 1, 60: 2, 90: 3}
+    assert overview["expired"] == 1
+    assert overview["attention_offices"] == [{"id": busy.pk, "name": "Busy"}]
+
+
+@pytest.mark.django_db
+def test_dashboard_query_count_is_independent_of_lot_volume(client, django_assert_max_num_queries):
+    admin = User.objects.create_user(email="admin@example.com", password="pass", role=User.Role.ADMIN)
+    med = Medication.objects.create(generic_name="Med")
+    today = datetime.date.today()
+    for index in range(5):
+        office = Office.objects.create(name=f"Office {index}")
+        office_med = OfficeMedication.objects.create(office=office, medication=med)
+        Lot.objects.bulk_create(
+            Lot(office_medication=office_med, qty=1, exp_date=today + datetime.timedelta(days=day))
+            for day in range(40)
+        )
+    refresh_inventory_rollups()
+    client.force_login(admin)
+
+    with django_assert_max_num_queries(7):
+        response = client.get(reverse("dashboard"))
+
+    assert response.status_code == 200
+    assert response.context["expiring_counts"][30] == 5 * 31
+    assert len(response.context["page_obj"]) == 25
+
+
+@pytest.mark.django_db
+def test_expiry_histogram_groups_by_id_in_one_query(django_assert_num_queries):
+    med = Medication.objects.create(generic_name="Med")
+    today = datetime.date.today()
+    offices = [Office.objects.create(name="Clinic") for _ in range(2)]
+    for office, days in zip(offices, ((-3, 5, 30, 31, 200), (61, 90))):
+        office_med = OfficeMedication.objects.create(office=office, medication=med)
+        Lot.objects.bulk_create(
+            Lot(office_medication=office_med, qty=10, exp_date=today + datetime.timedelta(days=day)) for day in days
+        )
+
+    with django_assert_num_queries(1):
+        rows = expiry_histogram()
+
+    assert [row["office_id"] for row in rows] == [office.pk for office in offices]
+    first, second = (row["buckets"] for row in rows)
+    assert list(first) == ["expired", "0-30", "31-60", "61-90", "91+"]
+    assert first["expired"] == {"qty": 10, "lots": 1}
+    assert first["0-30"] == {"qty": 20, "lots": 2}
+    assert (first["31-60"]["lots"], first["91+"]["lots"]) == (1, 1)
+    assert second["61-90"] == {"qty": 20, "lots": 2}
+    assert list(expiry_histogram(buckets=[7])[0]["buckets"]) == ["expired", "0-7", "8+"]
+
+
+@pytest.mark.django_db
+def test_inventory_api_returns_histogram_for_buckets(client):
+    admin = User.objects.create_user(email="admin@example.com", password="pass", role=User.Role.ADMIN)
+    office_med = OfficeMedication.objects.create(
+        office=Office.objects.create(name="Office"), medication=Medication.objects.create(generic_name="Med")
+    )
+    Lot.objects.create(office_medication=office_med, qty=4, exp_date=datetime.date.today() + datetime.timedelta(days=10))
+    client.force_login(admin)
+    url = reverse("api-report-inventory")
+
+    response = client.get(url, {"buckets": "14,60"})
+
+    assert response.status_code == 200
+    assert response.json()["buckets"] == ["expired", "0-14", "15-60", "61+"]
+    assert response.json()["results"][0]["buckets"]["0-14"] == {"qty": 4, "lots": 1}
+    assert client.get(url, {"buckets": "soon"}).status_code == 400
+    assert client.get(url, {"buckets": "0,30"}).status_code == 400
+    assert client.get(url, {"buckets": "999999999"}).status_code == 400
+
+
+@pytest.mark.django_db
+def test_reorder_report_uses_usable_quantity(client, django_assert_num_queries):
+    today = datetime.date.today()
+    office = Office.objects.create(name="Office")
+    low, ok, untracked = (
+        OfficeMedication.objects.create(
+            office=office, medication=Medication.objects.create(generic_name=name), reorder_threshold=threshold
+        )
+        for name, threshold in (("Low", 10), ("Ok", 5), ("Untracked", None))
+    )
+    Lot.objects.bulk_create(
+        [
+            Lot(office_medication=low, qty=4, exp_date=today + datetime.timedelta(days=30)),
+            Lot(office_medication=low, qty=50, exp_date=today - datetime.timedelta(days=1)),
+            Lot(office_medication=low, qty=50, exp_date=today + datetime.timedelta(days=30), status=Lot.Status.DISCARDED),
+            Lot(office_medication=ok, qty=5, exp_date=today + datetime.timedelta(days=30)),
+        ]
+    )
+
+    with django_assert_num_queries(1):
+        rows = reorder_report()
+
+    assert [(row["medication"], row["usable_qty"], row["shortfall"]) for row in rows] == [("Low", 4, 6)]
+
+    client.force_login(User.objects.create_user(email="admin@example.com", password="pass", role=User.Role.ADMIN))
+    assert client.get(reverse("api-report-reorder")).json()[0]["office_medication_id"] == low.pk
+    assert b"Below Reorder Threshold" in client.get(reverse("dashboard")).content
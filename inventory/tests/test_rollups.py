@@ -0,0 +1,106 @@
+import datetime
+
+import pytest
+from django.core.management import call_command
+
+from inventory.models import InventoryRollup, Lot, Medication, Office, OfficeMedication
+from inventory.services import inventory_summary
+
+
+@pytest.fixture
+def office_med():
+    office = Office.objects.create(name="Office")
+    med = Medication.objects.create(generic_name="Med")
+    return OfficeMedication.objects.create(office=office, medication=med)
+
+
+def days(offset):
+    return datetime.date.today() + datetime.timedelta(days=offset)
+
+
+@pytest.mark.django_db
+def test_rollup_tracks_lot_saves_and_deletes(office_med):
+    soon = Lot.objects.create(office_medication=office_med, qty=4, exp_date=days(10))
+    Lot.objects.create(office_medication=office_med, qty=6, exp_date=days(75))
+    Lot.objects.create(office_medication=office_med, qty=1, exp_date=days(-2))
+
+    rollup = InventoryRollup.objects.get(office_medication=office_med)
+    assert (rollup.total_qty, rollup.lot_count, rollup.soonest_exp) == (11, 3, days(-2))
+    assert (rollup.expiring_30, rollup.expiring_60, rollup.expiring_90, rollup.expired_count) == (1, 1, 2, 1)
+
+    soon.status = Lot.Status.USED_UP
+    soon.save()
+    soon.delete()
+    rollup.refresh_from_db()
+    assert (rollup.total_qty, rollup.lot_count, rollup.expiring_90) == (7, 2, 1)
+
+
+@pytest.mark.django_db
+def test_rollup_follows_lot_moved_between_office_medications(office_med):
+    other = OfficeMedication.objects.create(
+        office=office_med.office, medication=Medication.objects.create(generic_name="Other")
+    )
+    lot = Lot.objects.create(office_medication=office_med, qty=5, exp_date=days(20))
+
+    lot = Lot.objects.get(pk=lot.pk)
+    lot.office_medication = other
+    lot.save()
+
+    assert InventoryRollup.objects.get(office_medication=office_med).total_qty == 0
+    assert InventoryRollup.objects.get(office_medication=other).total_qty == 5
+
+
+@pytest.mark.django_db
+def test_rollup_follows_office_medication_moved_between_offices(office_med):
+    Lot.objects.create(office_medication=office_med, qty=5, exp_date=days(20))
+    other = Office.objects.create(name="Other")
+
+    office_med = OfficeMedication.objects.get(pk=office_med.pk)
+    office_med.office = other
+    office_med.save()
+
+    assert InventoryRollup.objects.get(office_medication=office_med).office_id == other.pk
+    assert inventory_summary(other)["Other"][0]["total_qty"] == 5
+    assert "Office" not in inventory_summary()
+
+
+@pytest.mark.django_db
+def test_deleting_office_medication_cascades_rollup(office_med):
+    Lot.objects.create(office_medication=office_med, qty=5, exp_date=days(20))
+    office_med.delete()
+    assert not InventoryRollup.objects.exists()
+
+
+@pytest.mark.django_db
+def test_stale_rollups_are_refreshed_on_read(office_med):
+    Lot.objects.create(office_medication=office_med, qty=5, exp_date=days(20))
+    InventoryRollup.objects.update(as_of=days(-1), expiring_30=0, total_qty=0)
+
+    summary = inventory_summary(office_med.office)
+
+    assert summary["Office"][0]["total_qty"] == 5
+    assert InventoryRollup.objects.get().as_of == days(0)
+
+
+@pytest.mark.django_db
+def test_rebuild_command_backfills_bulk_created_lots(office_med):
+    Lot.objects.bulk_create([Lot(office_medication=office_med, qty=3, exp_date=days(5))])
+    assert not InventoryRollup.objects.exists()
+
+    call_command("rebuild_inventory_rollups")
+
+    assert InventoryRollup.objects.get().expiring_30 == 1
+
+
+@pytest.mark.django_db
+def test_missing_rollups_are_created_on_read():
+    call_command("loaddata", "fixtures/seed.json", verbosity=0)
+    assert not InventoryRollup.objects.exists()
+
+    summary = inventory_summary()
+
+    assert summary
+    assert sum(row["total_qty"] for rows in summary.values() for row in rows) == sum(
+        Lot.objects.active().values_list("qty", flat=True)
+    )
+    assert InventoryRollup.objects.count() == OfficeMedication.objects.count()
@@ -0,0 +1,91 @@
+import pytest
+from django.urls import reverse
+
+from inventory.models import Medication, Office, User, normalize_ndc
+from inventory.search import search_medications
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        ("0093-4155-73", "00093415573"),
+        ("12345-678-90", "12345067890"),
+        ("12345-6789-0", "12345678900"),
+        ("12345 6789 01", "12345678901"),
+        ("1234567890", "1234567890"),
+        ("", ""),
+    ],
+)
+def test_normalize_ndc_pads_to_eleven_digits(value, expected):
+    assert normalize_ndc(value) == expected
+
+
+@pytest.fixture
+def catalog():
+    rows = [
+        ("Amoxicillin", "500 mg", "0093-4155-73"),
+        ("Amoxicillin", "250 mg", "0093-3107-01"),
+        ("Amoxicillin and Clavulanate", "875 mg", ""),
+        ("Ibuprofen", "200 mg", "12345-678-90"),
+        ("Retired amoxicillin", "", ""),
+    ]
+    meds = [Medication.objects.create(generic_name=name, strength=strength, ndc=ndc) for name, strength, ndc in rows]
+    meds[-1].is_active = False
+    meds[-1].save()
+    return meds
+
+
+def names(results):
+    return [(row["generic_name"], row["strength"]) for row in results]
+
+
+@pytest.mark.django_db
+def test_search_matches_prefixes_ndc_and_typos(catalog, django_assert_num_queries):
+    assert names(search_medications("amox")) == [
+        ("Amoxicillin", "500 mg"),
+        ("Amoxicillin", "250 mg"),
+        ("Amoxicillin and Clavulanate", "875 mg"),
+    ]
+    assert names(search_medications("amox 500")) == [("Amoxicillin", "500 mg")]
+    assert names(search_medications("clav")) == [("Amoxicillin and Clavulanate", "875 mg")]
+    assert names(search_medications("0093-4155")) == [("Amoxicillin", "500 mg")]
+    assert names(search_medications("12345-678-90")) == [("Ibuprofen", "200 mg")]
+    assert names(search_medications("ibuprofin")) == [("Ibuprofen", "200 mg")]
+    assert search_medications("  ") == []
+
+    with django_assert_num_queries(0):
+        search_medications("ibu")
+
+
+@pytest.mark.django_db
+def test_search_index_follows_catalog_changes(catalog):
+    assert search_medications("cetirizine") == []
+
+    Medication.objects.create(generic_name="Cetirizine", ndc="0378-3635-01")
+    catalog[0].is_active = False
+    catalog[0].save()
+
+    assert names(search_medications("cetirizine")) == [("Cetirizine", "")]
+    assert names(search_medications("amox 500")) == []
+    assert Medication.objects.get(generic_name="Cetirizine").ndc_normalized == "00378363501"
+
+
+@pytest.mark.django_db
+def test_search_api_and_autocomplete(client, catalog):
+    client.force_login(User.objects.create_superuser(email="admin@example.com", password="pass"))
+
+    response = client.get(reverse("api-medications-search"), {"q": "amox", "limit": 2})
+    assert [row["id"] for row in response.json()] == [catalog[0].pk, catalog[1].pk]
+    assert client.get(reverse("api-medications-search"), {"q": "amox", "limit": 500}).status_code == 400
+
+    fragment = client.get(reverse("medication-search"), {"q": "ibu"}).content.decode()
+    assert f'data-id="{catalog[3].pk}"' in fragment
+    assert "No matching medications" in client.get(reverse("medication-search"), {"q": "zzz"}).content.decode()
+
+    office = Office.objects.create(name="Office")
+    page = client.get(reverse("office-detail", args=[office.pk])).content.decode()
+    assert 'hx-get="/medications/search/"' in page
+    assert "Clavulanate" not in page
+
+    admin_page = client.get(reverse("admin:inventory_medication_changelist"), {"q": "0093-3107-01"})
+    assert list(admin_page.context["cl"].result_list) == [catalog[1]]
@@ -0,0 +1,88 @@
+import datetime
+import io
+
+import pytest
+from django.core.management import call_command
+from django.urls import reverse
+
+from inventory.models import Lot, Medication, Office, OfficeMedication, OfficeMembership, User
+from inventory.transfers import match_transfers, recommend_transfers
+
+
+def test_match_fills_largest_shortfall_from_soonest_lots_first():
+    supply = {1: [(10, 5), (11, 8)], 2: [(20, 3)]}
+    needs = {1: [(100, 4), (101, 7)], 3: [(300, 9)]}
+
+    assert match_transfers(supply, needs) == [(10, 101, 5), (11, 101, 2), (11, 100, 4)]
+
+
+def test_match_stops_when_needs_are_met():
+    assert match_transfers({1: [(10, 2), (11, 2), (12, 2)]}, {1: [(100, 3)]}) == [(10, 100, 2), (11, 100, 1)]
+
+
+@pytest.fixture
+def network():
+    today = datetime.date.today()
+    medication = Medication.objects.create(generic_name="Amoxicillin")
+    other = Medication.objects.create(generic_name="Ibuprofen")
+    north, south, east = (Office.objects.create(name=name) for name in ("North", "South", "East"))
+    donor = north.office_medications.create(medication=medication, reorder_threshold=5)
+    short = south.office_medications.create(medication=medication, reorder_threshold=20)
+    east.office_medications.create(medication=other, reorder_threshold=10)
+    north.office_medications.create(medication=other)
+    Lot.objects.bulk_create(
+        [
+            Lot(office_medication=donor, lot_number="SOON", qty=8, exp_date=today + datetime.timedelta(days=10)),
+            Lot(office_medication=donor, lot_number="LATER", qty=8, exp_date=today + datetime.timedelta(days=20)),
+            Lot(office_medication=donor, lot_number="FAR", qty=30, exp_date=today + datetime.timedelta(days=200)),
+            Lot(office_medication=short, lot_number="OWN", qty=2, exp_date=today + datetime.timedelta(days=10)),
+        ]
+    )
+    return {"north": north, "south": south, "east": east}
+
+
+@pytest.mark.django_db
+def test_recommendations_pair_expiring_surplus_with_short_offices(network, django_assert_num_queries):
+    with django_assert_num_queries(2):
+        plan = recommend_transfers(30)
+
+    assert [(row["lot_number"], row["from_office"], row["to_office"], row["qty"]) for row in plan["results"]] == [
+        ("SOON", "North", "South", 8),
+        ("LATER", "North", "South", 8),
+    ]
+    assert [row["qty"] for row in recommend_transfers(15)["results"]] == [8]
+
+
+@pytest.mark.django_db
+def test_donor_keeps_its_own_reorder_threshold(network):
+    network["north"].office_medications.filter(medication__generic_name="Amoxicillin").update(reorder_threshold=40)
+
+    assert [(row["lot_number"], row["qty"]) for row in recommend_transfers(30)["results"]] == [("SOON", 6)]
+
+
+@pytest.mark.django_db
+def test_transfer_api_and_command(client, network):
+    staff = User.objects.create_user(email="staff@example.com", password="pass")
+    OfficeMembership.objects.create(user=staff, office=network["east"])
+    client.force_login(staff)
+    url = reverse("api-report-transfers")
+
+    assert client.get(url, {"days": 30}).json()["results"] == []
+    assert client.get(url, {"days": 0}).status_code == 400
+
+    OfficeMembership.objects.create(user=staff, office=network["south"])
+    assert [row["to_office"] for row in client.get(url, {"days": 30}).json()["results"]] == ["South", "South"]
+
+    out = io.StringIO()
+    call_command("recommend_transfers", days=30, stdout=out)
+    assert "8 x Amoxicillin lot SOON" in out.getvalue()
+    assert "2 transfers, 16 units expiring within 30 days" in out.getvalue()
+
+
+@pytest.mark.django_db
+def test_benchmark_command_times_recommendations_on_throwaway_data():
+    out = io.StringIO()
+    call_command("benchmark_transfers", offices=20, medications=50, repeat=1, stdout=out)
+    assert "20 offices x 50 medications: 1000 office medications" in out.getvalue()
+    assert "recommend_transfers:" in out.getvalue()
+    assert not OfficeMedication.objects.exists()
@@ -0,0 +1,92 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db.models import F, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Lot, OfficeMedication
+from .services import default_expiry_days
+
+
+def match_transfers(supply, needs):
+    transfers = []
+    for medication_id, lots in supply.items():
+        wanted = sorted(needs.get(medication_id, ()), key=lambda item: (-item[1], item[0]))
+        if not wanted:
+            continue
+        index, remaining = 0, wanted[0][1]
+        for lot_id, qty in lots:
+            while qty and index < len(wanted):
+                moved = min(qty, remaining)
+                transfers.append((lot_id, wanted[index][0], moved))
+                qty -= moved
+                remaining -= moved
+                if not remaining:
+                    index += 1
+                    remaining = wanted[index][1] if index < len(wanted) else 0
+            if index == len(wanted):
+                break
+    return transfers
+
+
+def recommend_transfers(days=None, office_ids=None):
+    days = default_expiry_days() if days is None else days
+    today = timezone.localdate()
+    usable = Q(lots__is_active=True, lots__status=Lot.Status.ACTIVE, lots__exp_date__gte=today)
+    stock = {
+        row["pk"]: row
+        for row in OfficeMedication.objects.filter(is_active=True, office__is_active=True)
+        .values("pk", "office_id", "office__name", "medication_id", "medication__generic_name", "reorder_threshold")
+        .annotate(usable_qty=Coalesce(Sum("lots__qty", filter=usable), 0))
+        .filter(Q(usable_qty__gt=0) | Q(reorder_threshold__gt=F("usable_qty")))
+    }
+    needs = defaultdict(list)
+    spare = {}
+    for pk, row in stock.items():
+        threshold = row["reorder_threshold"] or 0
+        if row["usable_qty"] < threshold:
+            needs[row["medication_id"]].append((pk, threshold - row["usable_qty"]))
+        elif row["usable_qty"] > threshold:
+            spare[pk] = row["usable_qty"] - threshold
+
+    supply = defaultdict(list)
+    lots = {}
+    expiring = (
+        Lot.objects.active()
+        .filter(office_medication_id__in=spare, exp_date__range=(today, today + timedelta(days=days)), qty__gt=0)
+        .filter(office_medication__medication_id__in=needs)
+        .order_by("exp_date", "pk")
+        .values_list("pk", "office_medication_id", "lot_number", "exp_date", "qty")
+    )
+    for lot_id, office_med_id, lot_number, exp_date, qty in expiring.iterator(chunk_size=5000):
+        qty = min(qty, spare[office_med_id])
+        if not qty:
+            continue
+        spare[office_med_id] -= qty
+        lots[lot_id] = (office_med_id, lot_number, exp_date)
+        supply[stock[office_med_id]["medication_id"]].append((lot_id, qty))
+
+    results = []
+    for lot_id, to_office_med_id, qty in match_transfers(supply, needs):
+        from_office_med_id, lot_number, exp_date = lots[lot_id]
+        source, destination = stock[from_office_med_id], stock[to_office_med_id]
+        if office_ids is not None and not {source["office_id"], destination["office_id"]} & office_ids:
+            continue
+        results.append(
+            {
+                "lot_id": lot_id,
+                "lot_number": lot_number,
+                "exp_date": exp_date,
+                "medication_id": source["medication_id"],
+                "medication": source["medication__generic_name"],
+                "from_office_id": source["office_id"],
+                "from_office": source["office__name"],
+                "to_office_id": destination["office_id"],
+                "to_office": destination["office__name"],
+                "to_office_medication_id": to_office_med_id,
+                "qty": qty,
+            }
+        )
+    results.sort(key=lambda row: (row["exp_date"], row["medication"], row["from_office"], row["to_office"]))
+    return {"days": days, "results": results}
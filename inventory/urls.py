@@ -19,6 +19,7 @@ urlpatterns = [
         name="office-medication-edit",
     ),
     path("offices/<int:pk>/lots/", views.LotCreateView.as_view(), name="lot-create"),
+    path("offices/<int:pk>/lots/import/", views.LotImportView.as_view(), name="lot-import"),
     path("lots/<int:pk>/edit/", views.LotUpdateView.as_view(), name="lot-edit"),
     path(
         "offices/<int:pk>/export/",
@@ -26,9 +27,13 @@ urlpatterns = [
         name="office-expiring-export",
     ),
     path("medications/", views.MedicationListView.as_view(), name="medications"),
+    path("medications/search/", views.MedicationSearchView.as_view(), name="medication-search"),
     path("medications/create/", views.MedicationCreateView.as_view(), name="medication-create"),
     path("users/", views.UserListView.as_view(), name="users"),
     path("users/create/", views.UserCreateView.as_view(), name="user-create"),
     path("memberships/create/", views.MembershipCreateView.as_view(), name="membership-create"),
     path("reports/", views.ReportsView.as_view(), name="reports"),
+    path("reports/export/", views.ExpirationsExportView.as_view(), name="expiring-export"),
+    path("reports/forecast/", views.ForecastView.as_view(), name="forecast"),
+    path("reports/recall/", views.RecallView.as_view(), name="recall"),
 ]
@@ -1,32 +1,41 @@
 import csv
-from io import StringIO
+from io import TextIOWrapper
 
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import get_user_model
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.http import HttpResponse
+from django.core.paginator import Paginator
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect
 from django.urls import reverse
+from django.utils.http import urlencode
 from django.views.generic import ListView, TemplateView, UpdateView, View
 
+from . import caching
+from .access import get_access
+from .forecasting import forecast_expiry_waste
 from .forms import (
     LotForm,
+    LotImportForm,
     MedicationForm,
     MembershipForm,
     OfficeForm,
     OfficeMedicationForm,
     UserForm,
 )
+from .imports import import_lots_csv
 from .mixins import AdminRequiredMixin
-from .models import AuditLog, Lot, Medication, Office, OfficeMedication, OfficeMembership
+from .models import AuditLog, Lot, Medication, Office, OfficeMedication
+from .recalls import quarantine_lots, recall_criteria, recall_rows, recalled_lots
+from .search import search_medications
 from .services import (
     default_expiry_days,
-    get_user_offices,
+    expiry_overview,
     inventory_summary,
     lots_expired,
     lots_expiring_within,
-    next_expiring_lots,
+    reorder_report,
 )
 
 User = get_user_model()
@@ -34,19 +43,22 @@ User = get_user_model()
 
 class DashboardView(LoginRequiredMixin, TemplateView):
     template_name = "dashboard.html"
+    paginate_by = 25
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        offices = get_user_offices(self.request.user)
-        context["offices"] = offices
-        context["expiring_sets"] = next_expiring_lots(offices=offices)
-        context["expired_lots"] = lots_expired(offices)
-        context["default_days"] = default_expiry_days()
-        needs_attention = set()
-        for days, qs in context["expiring_sets"].items():
-            for lot in qs:
-                needs_attention.add(lot.office_medication.office)
-        context["attention_offices"] = needs_attention
+        access = get_access(self.request)
+        offices = access.scope
+        default_days = default_expiry_days()
+        overview = expiry_overview(offices=offices)
+        paginator = Paginator(lots_expiring_within(default_days, office=offices), self.paginate_by)
+        context["offices"] = access.offices()
+        context["expiring_counts"] = overview["windows"]
+        context["expired_count"] = overview["expired"]
+        context["attention_offices"] = overview["attention_offices"]
+        context["default_days"] = default_days
+        context["page_obj"] = paginator.get_page(self.request.GET.get("page"))
+        context["reorder"] = reorder_report(offices)
         return context
 
 
@@ -56,10 +68,7 @@ class OfficeListView(LoginRequiredMixin, ListView):
     context_object_name = "offices"
 
     def get_queryset(self):
-        user = self.request.user
-        if user.role == user.Role.ADMIN:
-            return Office.objects.filter(is_active=True)
-        return get_user_offices(user)
+        return get_access(self.request).offices()
 
 
 class OfficeCreateView(AdminRequiredMixin, View):
@@ -97,9 +106,7 @@ class OfficeDetailView(LoginRequiredMixin, TemplateView):
 
     def dispatch(self, request, *args, **kwargs):
         self.office = get_object_or_404(Office, pk=kwargs["pk"], is_active=True)
-        if request.user.role != request.user.Role.ADMIN and not OfficeMembership.objects.filter(
-            office=self.office, user=request.user, is_active=True
-        ).exists():
+        if not get_access(request).can_access(self.office):
             messages.error(request, "You do not have access to this office")
             return redirect("offices")
         return super().dispatch(request, *args, **kwargs)
@@ -120,6 +127,7 @@ class OfficeDetailView(LoginRequiredMixin, TemplateView):
                 "default_days": default_expiry_days(),
                 "office_med_form": self._office_med_form(),
                 "lot_form": self._lot_form(),
+                "lot_import_form": LotImportForm(),
             }
         )
         return context
@@ -177,9 +185,7 @@ class OfficeMedicationUpdateView(AdminRequiredMixin, UpdateView):
 class LotCreateView(LoginRequiredMixin, View):
     def post(self, request, pk):
         office = get_object_or_404(Office, pk=pk, is_active=True)
-        if request.user.role != request.user.Role.ADMIN and not OfficeMembership.objects.filter(
-            office=office, user=request.user, is_active=True
-        ).exists():
+        if not get_access(request).can_access(office):
             messages.error(request, "You do not have access to this office")
             return redirect("offices")
         form = LotForm(request.POST)
@@ -193,6 +199,39 @@ class LotCreateView(LoginRequiredMixin, View):
         return redirect(reverse("office-detail", args=[pk]) + "?tab=lots")
 
 
+class LotImportView(LoginRequiredMixin, View):
+    def post(self, request, pk):
+        office = get_object_or_404(Office, pk=pk, is_active=True)
+        if not get_access(request).can_access(office):
+            messages.error(request, "You do not have access to this office")
+            return redirect("offices")
+        form = LotImportForm(request.POST, request.FILES)
+        result = None
+        if form.is_valid():
+            upload = form.cleaned_data["file"]
+            try:
+                result = import_lots_csv(
+                    office,
+                    TextIOWrapper(upload.file, encoding="utf-8-sig", newline=""),
+                    actor=request.user,
+                    source=upload.name,
+                )
+            except (UnicodeDecodeError, csv.Error) as exc:
+                form.add_error("file", f"Could not read {upload.name} as a UTF-8 CSV file: {exc}")
+        if result is not None:
+            messages.success(request, f"Imported {result['created']} of {result['rows']} lots")
+            for line, error in result["errors"][:10]:
+                messages.error(request, f"Line {line}: {error}")
+            if len(result["errors"]) > 10:
+                messages.error(request, f"{len(result['errors']) - 10} more rows were skipped")
+        elif form.is_bound and form.files:
+            for error in form.errors["file"]:
+                messages.error(request, error)
+        else:
+            messages.error(request, "Choose a CSV file to import")
+        return redirect(reverse("office-detail", args=[pk]) + "?tab=lots")
+
+
 class LotUpdateView(LoginRequiredMixin, UpdateView):
     model = Lot
     form_class = LotForm
@@ -201,9 +240,7 @@ class LotUpdateView(LoginRequiredMixin, UpdateView):
     def dispatch(self, request, *args, **kwargs):
         self.object = self.get_object()
         office = self.object.office_medication.office
-        if request.user.role != request.user.Role.ADMIN and not OfficeMembership.objects.filter(
-            office=office, user=request.user, is_active=True
-        ).exists():
+        if not get_access(request).can_access(office):
             messages.error(request, "You do not have access to this lot")
             return redirect("offices")
         return super().dispatch(request, *args, **kwargs)
@@ -224,31 +261,60 @@ class LotUpdateView(LoginRequiredMixin, UpdateView):
         return reverse("office-detail", args=[self.object.office_medication.office_id]) + "?tab=lots"
 
 
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def stream_csv(header, rows, filename):
+    writer = csv.writer(_Echo())
+
+    def generate():
+        yield writer.writerow(header)
+        for row in rows:
+            yield writer.writerow(row)
+
+    response = StreamingHttpResponse(generate(), content_type="text/csv")
+    response["Content-Disposition"] = f"attachment; filename={filename}"
+    return response
+
+
 class OfficeExpirationsExportView(LoginRequiredMixin, View):
+    chunk_size = 2000
+
     def get(self, request, pk):
         office = get_object_or_404(Office, pk=pk, is_active=True)
-        if request.user.role != request.user.Role.ADMIN and not OfficeMembership.objects.filter(
-            office=office, user=request.user, is_active=True
-        ).exists():
+        if not get_access(request).can_access(office):
             return HttpResponse(status=403)
         days = int(request.GET.get("days", default_expiry_days()))
-        lots = lots_expiring_within(days, office=office)
-        output = StringIO()
-        writer = csv.writer(output)
-        writer.writerow(["Medication", "Lot", "Quantity", "Expiration Date"])
-        for lot in lots:
-            writer.writerow(
-                [
-                    lot.office_medication.medication.generic_name,
-                    lot.lot_number,
-                    lot.qty,
-                    lot.exp_date,
-                ]
-            )
-        response = HttpResponse(output.getvalue(), content_type="text/csv")
-        response["Content-Disposition"] = f"attachment; filename=expiring_{office.pk}.csv"
+        rows = (
+            lots_expiring_within(days, office=office)
+            .values_list("office_medication__medication__generic_name", "lot_number", "qty", "exp_date")
+            .iterator(chunk_size=self.chunk_size)
+        )
         AuditLog.log(request.user, AuditLog.Action.EXPORT, office, {"type": "expiring_csv"})
-        return response
+        return stream_csv(["Medication", "Lot", "Quantity", "Expiration Date"], rows, f"expiring_{office.pk}.csv")
+
+
+class ExpirationsExportView(AdminRequiredMixin, View):
+    chunk_size = 2000
+
+    def get(self, request):
+        days = int(request.GET.get("days", default_expiry_days()))
+        rows = (
+            lots_expiring_within(days, office=get_access(request).scope)
+            .order_by("exp_date", "id")
+            .values_list(
+                "office_medication__office__name",
+                "office_medication__medication__generic_name",
+                "lot_number",
+                "qty",
+                "exp_date",
+            )
+            .iterator(chunk_size=self.chunk_size)
+        )
+        AuditLog.log(request.user, AuditLog.Action.EXPORT, None, {"type": "expiring_csv", "scope": "organization"})
+        return stream_csv(["Office", "Medication", "Lot", "Quantity", "Expiration Date"], rows, "expiring_all.csv")
 
 
 class MedicationListView(AdminRequiredMixin, ListView):
@@ -262,6 +328,16 @@ class MedicationListView(AdminRequiredMixin, ListView):
         return context
 
 
+class MedicationSearchView(LoginRequiredMixin, TemplateView):
+    template_name = "medications/search_results.html"
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        query = self.request.GET.get("q", "")
+        context.update({"query": query, "results": search_medications(query)})
+        return context
+
+
 class MedicationCreateView(AdminRequiredMixin, View):
     def post(self, request):
         form = MedicationForm(request.POST)
@@ -334,18 +410,69 @@ class ReportsView(LoginRequiredMixin, TemplateView):
         days = int(self.request.GET.get("days", default_expiry_days()))
         office_id = self.request.GET.get("office_id")
         office = None
-        offices = get_user_offices(self.request.user)
+        access = get_access(self.request)
         if office_id:
             office = get_object_or_404(Office, pk=office_id, is_active=True)
-            if self.request.user.role != self.request.user.Role.ADMIN and not offices.filter(pk=office.pk).exists():
+            if not access.can_access(office):
                 office = None
-        context.update(
-            {
-                "offices": offices,
-                "days": days,
-                "expiring": lots_expiring_within(days, office=office or offices),
-                "expired": lots_expired(office=office or offices),
-                "inventory": inventory_summary(offices),
-            }
+        reports = caching.cached_report(
+            "reports",
+            access.office_ids,
+            lambda: {
+                "expiring": list(lots_expiring_within(days, office=office or access.scope)),
+                "expired": list(lots_expired(office=office or access.scope)),
+                "inventory": dict(inventory_summary(access.scope)),
+            },
+            days=days,
+            office=office.pk if office else None,
         )
+        context.update({"offices": access.offices(), "days": days, **reports})
         return context
+
+
+class ForecastView(LoginRequiredMixin, TemplateView):
+    template_name = "reports/forecast.html"
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        try:
+            horizon = min(max(int(self.request.GET.get("horizon", settings.FORECAST_HORIZON_DAYS)), 1), 365)
+        except ValueError:
+            horizon = settings.FORECAST_HORIZON_DAYS
+        access = get_access(self.request)
+        context["horizon"] = horizon
+        context["forecast"] = caching.cached_report(
+            "forecast", access.office_ids, lambda: forecast_expiry_waste(access.scope, horizon), horizon=horizon
+        )
+        return context
+
+
+class RecallView(LoginRequiredMixin, TemplateView):
+    template_name = "reports/recall.html"
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        lot_numbers = self.request.GET.get("lot_numbers", "")
+        ndc = self.request.GET.get("ndc", "")
+        context.update({"lot_numbers": lot_numbers, "ndc": ndc, "results": None})
+        if lot_numbers or ndc:
+            try:
+                criteria = recall_criteria(lot_numbers, ndc)
+            except ValueError as exc:
+                context["error"] = str(exc)
+            else:
+                context["results"] = recall_rows(recalled_lots(get_access(self.request).scope, **criteria))
+        return context
+
+    def post(self, request, *args, **kwargs):
+        lot_numbers = request.POST.get("lot_numbers", "")
+        ndc = request.POST.get("ndc", "")
+        try:
+            criteria = recall_criteria(lot_numbers, ndc)
+        except ValueError as exc:
+            messages.error(request, str(exc))
+        else:
+            lots = recalled_lots(get_access(request).scope, **criteria)
+            result = quarantine_lots(lots, actor=request.user, criteria=criteria)
+            messages.success(request, f"Quarantined {result['quarantined']} lots")
+        return redirect(reverse("recall") + "?" + urlencode({"lot_numbers": lot_numbers, "ndc": ndc}))